@@ -0,0 +1,55 @@
+"""Players per second scraped by the sync pipeline and by the async one, against a local mock of the site that answers
+every request after a fixed latency.
+
+Run from the repository root:
+    python -m benchmarks.bench_async [latency_ms] [roster_size]
+"""
+import logging
+import os
+import sys
+import tempfile
+import time
+
+from nfl_fpca import async_core, core
+from nfl_fpca.database import db_handling
+from nfl_fpca.database.db_model import db, init_db
+from nfl_fpca.planner import JobPlanner
+from nfl_fpca.tests.test_async_core import MockSite
+
+START, END = 2010, 2014
+# High enough for the latency to be the bottleneck, as it is with the real site's rate limit
+RATE = 1000
+
+
+def run(label, pipeline, latency, roster_size, path, **kwargs):
+    init_db(path)
+    db_handling.reset()
+    JobPlanner().reset()
+
+    with MockSite(roster_size, latency) as site:
+        start = time.perf_counter()
+        pipeline(START, END, 'crd', rate=RATE, cache_dir=None, **kwargs)
+        elapsed = time.perf_counter() - start
+
+    n_players = len(db_handling.get_stored_pids())
+    db.close()
+    print(f"{label:<30}{len(site.requests):>8} requests{elapsed:>9.2f} s{n_players / elapsed:>12.1f} players/s")
+    return n_players / elapsed
+
+
+def main(latency_ms=50, roster_size=40):
+    logging.disable(logging.INFO)
+    latency = latency_ms / 1000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sync = run('sync', core.run_scraping_pipeline, latency, roster_size, os.path.join(tmp, 'sync.db'))
+        for concurrency in (4, 8):
+            result = run(f'async (concurrency={concurrency})', async_core.run_async_scraping_pipeline, latency,
+                         roster_size, os.path.join(tmp, f'async{concurrency}.db'), concurrency=concurrency)
+            print(f"{'':<30}speedup: {result / sync:.1f}x")
+
+    init_db()
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,72 @@
+"""Rows per second written by add_players, compared with the previous one-create-per-row implementation.
+
+Run from the repository root (the legacy load takes a few minutes at full size):
+    python -m benchmarks.bench_database [n_players]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+from nfl_fpca.database import db_handling
+from nfl_fpca.database.db_model import DB_PRAGMAS, PlayerInfo, SeasonStats, db
+from nfl_fpca.models.player import Player
+
+POSITIONS = ['QB', 'RB', 'WR', 'TE', 'OL', 'IDL', 'DE', 'LB', 'CB', 'S']
+
+
+def synthetic_players(n, seed=0):
+    rng = random.Random(seed)
+    players = []
+    for i in range(n):
+        player = Player(f"Synt{i:05d}")
+        position = rng.choice(POSITIONS)
+        player.set_player_info("Synthetic Player", position, position, rng.randint(170, 205), rng.randint(80, 150))
+
+        start_year = rng.randint(1960, 2020)
+        length = rng.randint(1, 15)
+        stats = {year: {'pos': position, 'gp': rng.randint(0, 17), 'gs': rng.randint(0, 17), 'av': rng.randint(0, 20)}
+                 for year in range(start_year, start_year + length)}
+        player.set_career_info(start_year, rng.randint(21, 25), start_year + length - 1, stats)
+        players.append(player)
+    return players
+
+
+@db.connection_context()
+def legacy_add_players(player_list):
+    """Previous implementation: one autocommit transaction per row"""
+    for player in player_list:
+        PlayerInfo.create(**db_handling.player_info_row(player))
+        for row in db_handling.season_stats_rows(player):
+            SeasonStats.create(**row)
+
+
+def run(label, add, players, path, pragmas):
+    db.init(path, pragmas=pragmas)
+    db_handling.reset()
+
+    rows = len(players) + sum(len(player.stats) for player in players)
+    start = time.perf_counter()
+    add(players)
+    elapsed = time.perf_counter() - start
+    db.close()
+
+    print(f"{label:<30}{rows:>10} rows{elapsed:>10.2f} s{rows / elapsed:>14.0f} rows/s")
+    return rows / elapsed
+
+
+def main(n=20000):
+    players = synthetic_players(n)
+    db_handling.logger.setLevel('WARNING')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        before = run('legacy (per-row autocommit)', legacy_add_players, players, os.path.join(tmp, 'legacy.db'), {})
+        after = run('add_players (bulk upsert)', db_handling.add_players, players, os.path.join(tmp, 'bulk.db'),
+                    DB_PRAGMAS)
+
+    print(f"speedup: {after / before:.1f}x")
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
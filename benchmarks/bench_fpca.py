@@ -0,0 +1,44 @@
+"""FPCA fitting time across population sizes: full eigendecomposition, randomized SVD, and incremental update with one
+new season of players (5% of the population).
+
+Run from the repository root:
+    python -m benchmarks.bench_fpca
+"""
+import time
+
+from nfl_fpca.analysis.fpca import FPCA
+from nfl_fpca.tests.test_analysis import synthetic_matrix
+
+SIZES = [1000, 10000, 100000, 300000]
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main():
+    for n_basis in (12, 120):
+        bench(n_basis)
+
+
+def bench(n_basis):
+    print(f"\n{n_basis} basis functions")
+    print(f"{'players':>10}{'eigh (ms)':>14}{'randomized (ms)':>18}{'update (ms)':>14}")
+    for size in SIZES:
+        matrix = synthetic_matrix(n=size, length=n_basis + 10)
+        new = int(size * 0.05)
+        old, latest = matrix.subset(slice(0, size - new)), matrix.subset(slice(size - new, None))
+
+        eigh = timed(lambda: FPCA(n_basis=n_basis).fit(matrix))
+        randomized = timed(lambda: FPCA(n_basis=n_basis).fit(matrix, method='randomized'))
+
+        model = FPCA(n_basis=n_basis).fit(old)
+        update = timed(lambda: model.partial_fit(latest))
+
+        print(f"{size:>10}{eigh * 1e3:>14.1f}{randomized * 1e3:>18.1f}{update * 1e3:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
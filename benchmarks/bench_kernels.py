@@ -0,0 +1,54 @@
+"""Career matrix preprocessing (injury filter, gap filling, smoothing, age resampling): per-player Python loops against
+the batched kernels, NumPy and Numba when it is installed.
+
+Run from the repository root:
+    python -m benchmarks.bench_kernels [n_players]
+"""
+import sys
+import time
+
+import numpy as np
+
+from nfl_fpca.analysis import kernels
+from nfl_fpca.tests.test_analysis import random_careers
+
+WIDTH = 20
+
+
+def timed(func, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main(n=20000):
+    gp, av, mask = random_careers(n, WIDTH)
+    shifts = np.random.default_rng(0).integers(21, 26, n).astype(float)
+    grid = np.arange(21, 21 + WIDTH + 5, dtype=float)
+
+    steps = {
+        'injury': (kernels._injury_loop, (gp, mask, 3), lambda b: kernels.injury_filter(gp, mask, 3, b)),
+        'fill': (kernels._fill_loop, (av, mask), lambda b: kernels.fill_gaps(av, mask, b)),
+        'smooth': (kernels._smooth_loop, (av, mask, 1.5), lambda b: kernels.smooth(av, mask, 1.5, b)),
+        'resample': (kernels._resample_loop, (av, mask, shifts, grid),
+                     lambda b: kernels.resample(av, mask, shifts, grid, b)),
+    }
+    backends = ['numpy'] + (['numba'] if kernels.njit is not None else [])
+
+    print(f"{n} players, {WIDTH} seasons")
+    print(f"{'kernel':<10}{'python (ms)':>14}" + ''.join(f"{b + ' (ms)':>14}{'speedup':>9}" for b in backends))
+    for name, (loop, args, batched) in steps.items():
+        python = timed(lambda: loop(*args), repeat=1)
+        line = f"{name:<10}{python * 1e3:>14.1f}"
+        for backend in backends:
+            batched(backend)  # Compiles the Numba kernel outside of the timing
+            elapsed = timed(lambda: batched(backend))
+            line += f"{elapsed * 1e3:>14.1f}{python / elapsed:>8.0f}x"
+        print(line)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,35 @@
+"""Per-group FPCA with bootstrap bands on a joblib pool, against the same fits run in the main process.
+
+Run from the repository root:
+    python -m benchmarks.bench_parallel_fpca [n_players] [n_bootstrap]
+"""
+import json
+import sys
+import time
+
+import numpy as np
+
+from nfl_fpca.analysis.parallel import fit_groups_parallel
+from nfl_fpca.tests.test_analysis import synthetic_matrix
+
+
+def main(n=20000, n_bootstrap=50):
+    with open('position.json') as file:
+        groups = sorted(set(json.load(file).values()))
+    matrix = synthetic_matrix(n=n)
+    matrix.meta['position_group'] = np.array(groups)[np.arange(n) % len(groups)]
+    print(f"{n} players, {len(groups)} groups, {n_bootstrap} resamples per group")
+
+    for n_jobs in (1, -1):
+        start = time.perf_counter()
+        results = fit_groups_parallel(matrix, n_bootstrap=n_bootstrap, n_jobs=n_jobs, smoothing=0.1)
+        print(f"\nn_jobs={n_jobs}: {time.perf_counter() - start:.2f} s")
+
+    print(f"{'group':<8}{'players':>10}{'fit (ms)':>12}{'bootstrap (ms)':>16}")
+    for group, fit in results.items():
+        print(f"{group:<8}{len(fit.scores):>10}"
+              f"{fit.seconds['fit'] * 1e3:>12.1f}{fit.seconds['bootstrap'] * 1e3:>16.1f}")
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,91 @@
+"""Per-page parse time of the table lookups, before and after the single-pass page index, and of the full page scrape
+for each parser backend.
+
+Run from the repository root:
+    python -m benchmarks.bench_parsing
+"""
+import glob
+import timeit
+
+from bs4 import BeautifulSoup, Comment
+
+from nfl_fpca.scraping.parsers import available_parsers
+from nfl_fpca.scraping.player_scrapper import scrape_player_page
+from nfl_fpca.scraping.team_scrapper import scrape_player_ids
+from nfl_fpca.scraping.utils import PageIndex, get_career_table
+
+PAGES = sorted(glob.glob("nfl_fpca/tests/test_pages/*/*.html"))
+TITLES = ['passing', 'rushing_and_receiving', 'receiving_and_rushing', 'defense', 'kicking', 'punting', 'returns',
+          'games_played']
+
+
+# ----- PREVIOUS IMPLEMENTATION ----------------------------------------------------------------------------------------
+
+def legacy_find_table(soup, tid):
+    comments = soup.find_all(string=lambda text: isinstance(text, Comment))
+    for comment in comments:
+        if f'id="{tid}"' in comment:
+            return BeautifulSoup(comment, 'html.parser')
+    return None
+
+
+def legacy_get_career_table(soup):
+    for title in TITLES:
+        table = soup.find('table', attrs={'id': title})
+        if (table is not None) and ('AV' in table.text):
+            return table
+    return None
+
+
+def legacy_lookups(soup):
+    legacy_get_career_table(soup)
+    legacy_find_table(soup, "combine")
+    legacy_find_table(soup, "div_roster")
+
+
+# ----- PAGE INDEX -----------------------------------------------------------------------------------------------------
+
+def indexed_lookups(soup):
+    index = PageIndex(soup)
+    get_career_table(soup, index)
+    index.table("combine")
+    index.table("roster")
+
+
+def bench(func, arg, number):
+    return min(timeit.repeat(lambda: func(arg), number=number, repeat=5)) / number
+
+
+def bench_lookups(number):
+    print(f"{'page':<40}{'legacy (us)':>14}{'index (us)':>14}{'speedup':>10}")
+    for path in PAGES:
+        with open(path) as file:
+            soup = BeautifulSoup(file.read(), 'html.parser')
+
+        legacy = bench(legacy_lookups, soup, number)
+        indexed = bench(indexed_lookups, soup, number)
+        print(f"{path.split('test_pages/')[1]:<40}{legacy * 1e6:>14.1f}{indexed * 1e6:>14.1f}{legacy / indexed:>9.2f}x")
+
+
+def bench_backends(number):
+    parsers = available_parsers()
+    print(f"\n{'page':<40}" + "".join(f"{parser + ' (us)':>18}" for parser in parsers))
+    for path in PAGES:
+        with open(path) as file:
+            page = file.read()
+
+        if '/team/' in path:
+            timings = [bench(lambda p: scrape_player_ids(page, set(), parser=p), parser, number) for parser in parsers]
+        else:
+            timings = [bench(lambda p: scrape_player_page(page, 'TEST', parser=p), parser, number)
+                       for parser in parsers]
+        print(f"{path.split('test_pages/')[1]:<40}" + "".join(f"{timing * 1e6:>18.1f}" for timing in timings))
+
+
+def main(number=200):
+    bench_lookups(number)
+    bench_backends(number // 4)
+
+
+if __name__ == '__main__':
+    main()
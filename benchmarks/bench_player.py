@@ -0,0 +1,73 @@
+"""Memory per player and adjust_for_injuries time, for the previous dict-of-dicts Player and the array-backed one.
+
+Run from the repository root:
+    python -m benchmarks.bench_player [n_players]
+"""
+import copy
+import sys
+import time
+import tracemalloc
+
+from nfl_fpca.models.player import adjust_for_injuries_batch
+
+from .bench_database import synthetic_players
+
+
+# ----- PREVIOUS IMPLEMENTATION ----------------------------------------------------------------------------------------
+
+class LegacyPlayer:
+    """The parts of the previous Player that matter here: a __dict__ and a dict of dicts for the seasons"""
+
+    def __init__(self, player):
+        self.pid = player.pid
+        self.first_name, self.last_name = player.first_name, player.last_name
+        self.position, self.position_group = player.position, player.position_group
+        self.height, self.weight = player.height, player.weight
+        self.start_year, self.start_age, self.last_year = player.start_year, player.start_age, player.last_year
+        self.stats = dict(player.stats.items())
+        self.draft_pos, self.dash, self.bench, self.broad = None, 0.0, 0, 0
+        self.shuttle, self.cone, self.vertical = 0.0, 0.0, 0.0
+
+    def adjust_for_injuries(self, threshold=3):
+        gp = [year['gp'] for year in self.stats.values()]
+        time = list(self.stats.keys())
+        for (i, val) in enumerate(gp[:-1]):
+            if (val <= threshold) and (val <= max(gp[i:-1])):
+                del self.stats[time[i]]
+
+
+def measure(build):
+    tracemalloc.start()
+    objects = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return objects, size
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main(n=50000):
+    players = synthetic_players(n)
+    seasons = sum(len(player.seasons) for player in players)
+
+    legacy, legacy_size = measure(lambda: [LegacyPlayer(player) for player in players])
+    current, current_size = measure(lambda: copy.deepcopy(players))
+    print(f"{n} players, {seasons} seasons")
+    print(f"{'memory (legacy)':<32}{legacy_size / n:>10.0f} bytes/player")
+    print(f"{'memory (arrays)':<32}{current_size / n:>10.0f} bytes/player")
+
+    loop = timed(lambda: [player.adjust_for_injuries() for player in legacy])
+    single_players, batch_players = copy.deepcopy(players), copy.deepcopy(players)
+    single = timed(lambda: [player.adjust_for_injuries() for player in single_players])
+    batch = timed(lambda: adjust_for_injuries_batch(batch_players))
+    print(f"{'adjust_for_injuries (legacy)':<32}{loop:>10.3f} s")
+    print(f"{'adjust_for_injuries (arrays)':<32}{single:>10.3f} s")
+    print(f"{'adjust_for_injuries_batch':<32}{batch:>10.3f} s{loop / batch:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,29 @@
+"""Position group lookups per second, reading position.json on every call versus the shared registry.
+
+Run from the repository root:
+    python -m benchmarks.bench_positions
+"""
+import json
+import timeit
+
+from nfl_fpca.scraping.positions import POSITION_FILE, PositionRegistry
+
+# Typical career table: a handful of codes repeated over and over, plus some unusual ones
+POSITIONS = ['QB', 'WR', 'LT', 'C-G', 'RCB', 'FS', 'DE', 'OLB', 'wr', 'LB-S', 'G/T', '', 'XX'] * 10
+
+
+def legacy_get_position_group(position):
+    with open(POSITION_FILE, "r") as file:
+        pos_dict = json.load(file)
+        return pos_dict.get(position, 'N/A')
+
+
+def main(number=200):
+    registry = PositionRegistry()
+    for label, func in (('json per call', legacy_get_position_group), ('registry', registry.group)):
+        elapsed = min(timeit.repeat(lambda: [func(pos) for pos in POSITIONS], number=number, repeat=3))
+        print(f"{label:<16}{number * len(POSITIONS) / elapsed:>14.0f} lookups/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""Startup time of the command line tool, checked against a budget.
+
+Times `python -m nfl_fpca --help` against a bare interpreter, and lists the heavy modules imported on the way (there
+should be none, subcommands import them when they run). Exits with status 1 when over budget.
+
+Run from the repository root:
+    python -m benchmarks.bench_startup [budget_ms]
+"""
+import subprocess
+import sys
+import time
+
+BUDGET_MS = 150  # On top of the interpreter's own startup
+RUNS = 10
+HEAVY_MODULES = ('numpy', 'peewee', 'bs4', 'lxml', 'requests', 'rich', 'joblib', 'skfda')
+
+CHECK_IMPORTS = (
+    "import sys; from nfl_fpca import cli; cli.build_parser().format_help(); "
+    f"print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+)
+
+
+def best_time(args):
+    times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *args], check=True, stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main(budget_ms=BUDGET_MS):
+    bare = best_time(['-c', 'pass'])
+    cli = best_time(['-m', 'nfl_fpca', '--help'])
+    overhead_ms = (cli - bare) * 1e3
+    heavy = subprocess.run([sys.executable, '-c', CHECK_IMPORTS], check=True, capture_output=True, text=True)
+
+    print(f"{'python -c pass':<28}{bare * 1e3:>8.1f} ms")
+    print(f"{'python -m nfl_fpca --help':<28}{cli * 1e3:>8.1f} ms")
+    print(f"{'overhead':<28}{overhead_ms:>8.1f} ms (budget {budget_ms} ms)")
+    print(f"heavy modules imported: {heavy.stdout.strip() or 'none'}")
+
+    return 1 if overhead_ms > budget_ms or heavy.stdout.strip() else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*map(float, sys.argv[1:])))
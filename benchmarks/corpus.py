@@ -0,0 +1,106 @@
+"""Synthetic player and roster pages shaped like the test fixtures, for benchmarks that need more than two pages.
+
+Player pages keep the layout of tests/test_pages/player/player_full.html (header, career table, combine table in a
+comment) with a random name, position, size and career. Roster pages repeat the rows of tests/test_pages/team/team.html.
+A corpus can be saved as a directory of .htm files, and any such directory, including a page cache, can be replayed.
+"""
+import os
+import random
+import re
+
+from nfl_fpca.scraping.saved_pages import iter_saved_pages
+
+PLAYER_FIXTURE = "nfl_fpca/tests/test_pages/player/player_full.html"
+ROSTER_FIXTURE = "nfl_fpca/tests/test_pages/team/team.html"
+
+POSITIONS = ['QB', 'RB', 'WR', 'TE', 'T', 'G', 'C', 'DT', 'DE', 'LB', 'CB', 'S', 'K', 'P']
+
+# One row of each table, used as a template for the generated rows
+CAREER_ROW_RE = re.compile(r'(?P<indent>[ \t]*)<tr id="receiving_and_rushing\.2019".*?</tr>\n', re.S)
+ROSTER_ROW_RE = re.compile(r'(?P<indent>[ \t]*)<tr>\s*<th[^>]*>26</th>.*?</tr>\n', re.S)
+
+
+def _read(path):
+    with open(path) as file:
+        return file.read()
+
+
+class CorpusGenerator:
+    """Generates pages from the fixtures, deterministically for a given seed"""
+
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+
+        page = _read(PLAYER_FIXTURE)
+        tbody_start = page.index('<tbody>', page.index('id="receiving_and_rushing"')) + len('<tbody>\n')
+        tbody_end = page.index('</tbody>', tbody_start)
+        self.player_head = page[:tbody_start]
+        self.player_tail = page[tbody_end:]
+        self.career_row = CAREER_ROW_RE.search(page).group(0)
+
+        roster = _read(ROSTER_FIXTURE)
+        rows = list(ROSTER_ROW_RE.finditer(roster))
+        tbody_start = roster.index('<tbody>') + len('<tbody>\n')
+        tbody_end = roster.index('</tbody>', tbody_start)
+        self.roster_head = roster[:tbody_start]
+        self.roster_tail = roster[tbody_end:]
+        self.roster_row = rows[0].group(0)
+
+    def player_page(self, pid):
+        rng = self.rng
+        position = rng.choice(POSITIONS)
+        start_year = rng.randint(1960, 2020)
+        age = rng.randint(21, 25)
+
+        head = (self.player_head
+                .replace('A.J. Brown', f"Synthetic {pid}")
+                .replace(': WR', f": {position}")
+                .replace('185cm', f"{rng.randint(170, 205)}cm")
+                .replace('102kg', f"{rng.randint(75, 150)}kg"))
+
+        rows = []
+        for i in range(rng.randint(1, 15)):
+            year = start_year + i
+            games = rng.randint(0, 17)
+            rows.append(self.career_row
+                        .replace('2019', str(year))
+                        .replace('>23<', f">{age + i}<")
+                        .replace('>WR<', f">{position}<")
+                        .replace('data-stat="g">10<', f'data-stat="g">{games}<')
+                        .replace('data-stat="gs"><', f'data-stat="gs">{rng.randint(0, games)}<')
+                        .replace('data-stat="av">3<', f'data-stat="av">{rng.randint(0, 20)}<')
+                        .replace('data-row="0"', f'data-row="{i}"'))
+
+        return head + ''.join(rows) + self.player_tail
+
+    def roster_page(self, pids):
+        rows = [self.roster_row
+                .replace('BarkSa00', pid)
+                .replace('Saquon Barkley', f"Synthetic {pid}")
+                .replace('/B/', f"/{pid[0]}/")
+                for pid in pids]
+        return self.roster_head + ''.join(rows) + self.roster_tail
+
+    def players(self, n):
+        """(pid, page) pairs of n players"""
+        return [(pid, self.player_page(pid)) for pid in (f"Synt{i:05d}" for i in range(n))]
+
+    def rosters(self, pids, size=53):
+        return [self.roster_page(pids[i:i + size]) for i in range(0, len(pids), size)]
+
+
+def save_corpus(pages, directory):
+    os.makedirs(directory, exist_ok=True)
+    for pid, page in pages:
+        with open(os.path.join(directory, f"{pid}.htm"), 'w') as file:
+            file.write(page)
+
+
+def load_corpus(source, n=None):
+    """Replays saved player pages: a directory of .htm files, an archive of them or a page cache"""
+    pages = []
+    for pid, page in iter_saved_pages(source):
+        if n is not None and len(pages) >= n:
+            break
+        pages.append((pid, page))
+    return pages
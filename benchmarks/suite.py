@@ -0,0 +1,162 @@
+"""Throughput of the hot paths at several scales, compared with the baseline recorded in benchmarks/baseline.json.
+
+Times scrape_player_page, scrape_player_ids, add_players and load_player over a synthetic corpus (or saved pages with
+--corpus), and exits with status 1 if any of them is slower than the baseline by more than the threshold.
+
+Run from the repository root:
+    python -m benchmarks.suite                      # compare with the baseline
+    python -m benchmarks.suite --update             # record a new baseline
+    python -m benchmarks.suite --scales 100 10000 --threshold 0.3 --corpus data/pages
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+
+from nfl_fpca.database import db_handling
+from nfl_fpca.database.db_model import db, init_db
+from nfl_fpca.scraping.player_scrapper import scrape_player_page
+from nfl_fpca.scraping.team_scrapper import scrape_player_ids
+
+from .corpus import CorpusGenerator, load_corpus
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+DEFAULT_SCALES = (100, 1000)
+DEFAULT_THRESHOLD = 0.25
+REPEAT = 3
+
+
+def best_of(func, repeat=REPEAT, setup=None):
+    """Shortest wall time of several runs, the least noisy estimate"""
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+# ----- BENCHMARKS -----------------------------------------------------------------------------------------------------
+
+def bench_scrape_player_page(pages, **_):
+    elapsed = best_of(lambda: [scrape_player_page(page, pid) for pid, page in pages])
+    return len(pages) / elapsed, 'pages/s'
+
+
+def bench_scrape_player_ids(pages, generator, **_):
+    rosters = generator.rosters([pid for pid, _ in pages])
+    elapsed = best_of(lambda: [scrape_player_ids(page, set()) for page in rosters])
+    return len(rosters) / elapsed, 'rosters/s'
+
+
+def bench_add_players(players, **_):
+    elapsed = best_of(lambda: db_handling.add_players(players), setup=db_handling.reset)
+    return len(players) / elapsed, 'players/s'
+
+
+def bench_load_player(players, **_):
+    db_handling.reset()
+    db_handling.add_players(players)
+    elapsed = best_of(lambda: [db_handling.load_player(player.pid) for player in players])
+    return len(players) / elapsed, 'players/s'
+
+
+BENCHMARKS = {
+    'scrape_player_page': bench_scrape_player_page,
+    'scrape_player_ids': bench_scrape_player_ids,
+    'add_players': bench_add_players,
+    'load_player': bench_load_player,
+}
+
+
+# ----- RUN ------------------------------------------------------------------------------------------------------------
+
+def run_suite(scales=DEFAULT_SCALES, corpus=None, names=None, seed=0):
+    """Returns {"<benchmark>@<scale>": {"throughput": ..., "unit": ...}}"""
+    results = dict()
+    generator = CorpusGenerator(seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        init_db(os.path.join(tmp, 'bench.db'))
+        try:
+            for scale in scales:
+                pages = load_corpus(corpus, scale) if corpus else generator.players(scale)
+                players = [scrape_player_page(page, pid) for pid, page in pages]
+
+                for name, bench in BENCHMARKS.items():
+                    if names and name not in names:
+                        continue
+                    throughput, unit = bench(pages=pages, players=players, generator=generator)
+                    results[f"{name}@{scale}"] = {'throughput': round(throughput, 1), 'unit': unit}
+                    print(f"{name:<22}{scale:>8}{throughput:>14.1f} {unit}", flush=True)
+        finally:
+            db.close()
+            init_db()
+
+    return results
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Benchmarks whose throughput dropped below (1 - threshold) times the baseline, as (key, ratio) pairs"""
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        ratio = result['throughput'] / baseline[key]['throughput']
+        print(f"{key:<30}{baseline[key]['throughput']:>12.1f}{result['throughput']:>12.1f}{ratio:>9.2f}x")
+        if ratio < 1 - threshold:
+            regressions.append((key, ratio))
+    return regressions
+
+
+def load_baseline(path=BASELINE_FILE):
+    if not os.path.exists(path):
+        return dict()
+    with open(path) as file:
+        return json.load(file)['results']
+
+
+def save_baseline(results, path=BASELINE_FILE):
+    with open(path, 'w') as file:
+        json.dump({'machine': {'python': platform.python_version(),
+                               'platform': platform.platform(),
+                               'cpus': os.cpu_count()},
+                   'results': results},
+                  file, indent=2)
+        file.write('\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scales', type=int, nargs='+', default=DEFAULT_SCALES)
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help="benchmarks to run, all by default")
+    parser.add_argument('--corpus', help="saved pages to replay instead of the synthetic corpus")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="largest accepted throughput drop, as a fraction of the baseline")
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--update', action='store_true', help="record the results as the new baseline")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.INFO)
+    results = run_suite(args.scales, args.corpus, args.only)
+
+    if args.update:
+        save_baseline({**load_baseline(args.baseline), **results}, args.baseline)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    print(f"\n{'benchmark':<30}{'baseline':>12}{'current':>12}{'ratio':>10}")
+    regressions = compare(results, load_baseline(args.baseline), args.threshold)
+    for key, ratio in regressions:
+        print(f"REGRESSION: {key} at {ratio:.2f}x of the baseline")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,207 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from ..database import export
+from ..database.db_handling import player_query
+from ..database.db_model import PlayerInfo, SeasonStats, db, default_db_path
+
+CACHE_DIR = os.path.join('data', 'career_matrix')
+
+META_DTYPE = np.dtype([('pid', 'U16'),
+                       ('position_group', 'U8'),
+                       ('start_year', 'i4'),
+                       ('start_age', 'i4'),
+                       ('career_length', 'i4'),
+                       ('height', 'i4'),
+                       ('weight', 'i4')])
+
+
+class CareerMatrix:
+    """Career curves of a set of players as dense arrays.
+
+    Row i holds player meta[i], column j the j-th season of his career (align='year') or his season at age
+    origin + j (align='age'). av, gp and gs are 0 where the player has no season, mask is True where he has one.
+    """
+
+    def __init__(self, meta, av, gp, gs, mask, align='year', origin=0):
+        self.meta = meta
+        self.av = av
+        self.gp = gp
+        self.gs = gs
+        self.mask = mask
+        self.align = align
+        self.origin = origin
+
+    def __len__(self):
+        return len(self.meta)
+
+    def __repr__(self):
+        return f"CareerMatrix({len(self)} players, {self.grid.size} {self.align}s)"
+
+    @property
+    def pids(self):
+        return self.meta['pid']
+
+    @property
+    def grid(self):
+        """Career year (starting at 0) or age of each column"""
+        return self.origin + np.arange(self.av.shape[1])
+
+    def subset(self, rows):
+        """Matrix restricted to some players, given as a boolean mask or indices"""
+        return CareerMatrix(self.meta[rows], self.av[rows], self.gp[rows], self.gs[rows], self.mask[rows],
+                            self.align, self.origin)
+
+    def group(self, position_group):
+        return self.subset(self.meta['position_group'] == position_group)
+
+    def reindex(self, origin, width):
+        """Same players on the columns origin, ..., origin + width - 1 of the grid. Seasons outside of them are dropped,
+        columns the matrix did not have are empty."""
+        shape = (len(self), width)
+        arrays = [np.zeros(shape), np.zeros(shape), np.zeros(shape), np.zeros(shape, dtype=bool)]
+        lo, hi = max(self.origin, origin), min(self.origin + self.av.shape[1], origin + width)
+        if hi > lo:
+            for out, array in zip(arrays, (self.av, self.gp, self.gs, self.mask)):
+                out[:, lo - origin:hi - origin] = array[:, lo - self.origin:hi - self.origin]
+        return CareerMatrix(self.meta, *arrays, self.align, origin)
+
+    # ----- PERSISTENCE ------------------------------------------------------------------------------------------------
+
+    def save(self, path, **extra):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        np.savez_compressed(path, meta=self.meta, av=self.av, gp=self.gp, gs=self.gs, mask=self.mask,
+                            align=self.align, origin=self.origin, **extra)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['meta'], data['av'], data['gp'], data['gs'], data['mask'],
+                       str(data['align']), int(data['origin']))
+
+
+def _fetch_columns(positions, start_year, career_length, retired):
+    """Player metadata and season rows as NumPy arrays, straight from SQLite"""
+    players = player_query(positions, start_year, career_length, retired)
+
+    with db.connection_context():
+        meta_rows = (players
+                     .select(PlayerInfo.pid, PlayerInfo.position_group, PlayerInfo.start_year, PlayerInfo.start_age,
+                             PlayerInfo.career_length, PlayerInfo.height, PlayerInfo.weight)
+                     .order_by(PlayerInfo.pid)
+                     .tuples())
+        meta = np.array([tuple('' if val is None else val for val in row) for row in meta_rows], dtype=META_DTYPE)
+
+        season_rows = (SeasonStats
+                       .select(SeasonStats.pid, SeasonStats.year, SeasonStats.games_played, SeasonStats.games_started,
+                               SeasonStats.approx_value)
+                       .where(SeasonStats.pid.in_(players.select(PlayerInfo.pid)))
+                       .tuples())
+        seasons = list(season_rows)
+
+    if seasons:
+        pids, years, gp, gs, av = zip(*seasons)
+    else:
+        pids, years, gp, gs, av = (), (), (), (), ()
+
+    return meta, np.array(pids, dtype=META_DTYPE['pid']), np.array(years, dtype=int), \
+        np.array(gp, dtype=float), np.array(gs, dtype=float), np.array(av, dtype=float)
+
+
+def _read_export_columns(export_dir, positions, start_year, career_length, retired):
+    """Same as _fetch_columns, from the memory-mapped columns of an export. Partitions of other position groups or of
+    earlier decades are not read at all."""
+    decades = range((start_year // 10) * 10, 10000, 10)
+    players = export.load_columns(export_dir, 'players', positions, decades,
+                                  ['retired', *META_DTYPE.names])
+    keep = ((players['start_year'] >= start_year) & (players['career_length'] >= career_length)
+            & (players['retired'] == retired))
+    order = np.argsort(players['pid'][keep], kind='stable')
+    meta = np.zeros(len(order), dtype=META_DTYPE)
+    for name in META_DTYPE.names:
+        meta[name] = players[name][keep][order]
+
+    seasons = export.load_columns(export_dir, 'seasons', positions, decades,
+                                  ['pid', 'year', 'games_played', 'games_started', 'approx_value'])
+    rows = np.isin(seasons['pid'], meta['pid'])
+
+    return meta, seasons['pid'][rows].astype(META_DTYPE['pid']), seasons['year'][rows].astype(int), \
+        seasons['games_played'][rows].astype(float), seasons['games_started'][rows].astype(float), \
+        seasons['approx_value'][rows].astype(float)
+
+
+def build_career_matrix(positions=None, start_year=1960, career_length=0, retired=1, align='year', max_length=None,
+                        export_dir=None):
+    """Builds the career matrix of the players matching the filters, without creating Player objects.
+
+    align is 'year' to line careers up on their first season, or 'age' to line them up on the players' age. max_length
+    sets the number of columns: longer careers are cut and shorter matrices padded with empty seasons, so that cohorts
+    built with the same max_length share a grid. With export_dir, the data is read from a columnar export (see
+    database.export) instead of the database.
+    """
+    if align not in ('year', 'age'):
+        raise ValueError(f"align must be 'year' or 'age', not {align}")
+
+    if export_dir is not None:
+        meta, pids, years, gp, gs, av = _read_export_columns(export_dir, positions, start_year, career_length, retired)
+    else:
+        meta, pids, years, gp, gs, av = _fetch_columns(positions, start_year, career_length, retired)
+
+    # Row of every season, meta is sorted by pid
+    rows = np.searchsorted(meta['pid'], pids)
+    offsets = years - meta['start_year'][rows]
+
+    if align == 'age':
+        ages = meta['start_age'][rows] + offsets
+        origin = int(ages.min()) if ages.size else 0
+        cols = ages - origin
+    else:
+        origin = 0
+        cols = offsets
+
+    if max_length is not None:
+        width = max_length
+    else:
+        width = int(cols.max()) + 1 if cols.size else 0
+    keep = (cols >= 0) & (cols < width)
+    rows, cols = rows[keep], cols[keep]
+
+    shape = (len(meta), width)
+    matrix = CareerMatrix(meta, np.zeros(shape), np.zeros(shape), np.zeros(shape), np.zeros(shape, dtype=bool),
+                          align, origin)
+    matrix.av[rows, cols] = av[keep]
+    matrix.gp[rows, cols] = gp[keep]
+    matrix.gs[rows, cols] = gs[keep]
+    matrix.mask[rows, cols] = True
+
+    return matrix
+
+
+def _db_signature():
+    """Changes whenever the database file is written to"""
+    path = db.database or default_db_path()
+    stats = [os.stat(path) for path in (path, f"{path}-wal") if os.path.exists(path)]
+    return [[stat.st_size, stat.st_mtime_ns] for stat in stats]
+
+
+def load_career_matrix(positions=None, start_year=1960, career_length=0, retired=1, align='year', max_length=None,
+                       cache_dir=CACHE_DIR, refresh=False):
+    """Same as build_career_matrix, but cached to a .npz file which is reused until the database changes"""
+    params = {'positions': sorted(positions) if positions else None, 'start_year': start_year,
+              'career_length': career_length, 'retired': retired, 'align': align, 'max_length': max_length}
+    key = hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:16]
+    path = os.path.join(cache_dir, f"{key}.npz")
+    signature = json.dumps(_db_signature())
+
+    if not refresh and os.path.exists(path):
+        with np.load(path) as data:
+            cached_signature = str(data['signature']) if 'signature' in data.files else None
+        if cached_signature == signature:
+            return CareerMatrix.load(path)
+
+    matrix = build_career_matrix(positions, start_year, career_length, retired, align, max_length)
+    matrix.save(path, signature=signature)
+    return matrix
@@ -0,0 +1,224 @@
+import numpy as np
+
+
+# ----- BASIS ----------------------------------------------------------------------------------------------------------
+
+def bspline_basis(x, n_basis, order=4, domain=None):
+    """Values of a B-spline basis with equally spaced knots at x, as an array of shape (len(x), n_basis)"""
+    if n_basis < order:
+        raise ValueError(f"A B-spline basis of order {order} needs at least {order} functions")
+
+    x = np.asarray(x, dtype=float)
+    lo, hi = domain if domain is not None else (x.min(), x.max())
+    breaks = np.linspace(lo, hi, n_basis - order + 2)
+    knots = np.concatenate([np.full(order - 1, lo), breaks, np.full(order - 1, hi)])
+
+    # Cox-de Boor recursion, starting from the piecewise constant functions
+    basis = ((knots[:-1] <= x[:, None]) & (x[:, None] < knots[1:])).astype(float)
+    basis[x == hi, n_basis - 1] = 1.0
+
+    for k in range(1, order):
+        left_span = knots[k:-1] - knots[:-k - 1]
+        right_span = knots[k + 1:] - knots[1:-k]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            left = np.where(left_span > 0, (x[:, None] - knots[:-k - 1]) / left_span, 0.0)
+            right = np.where(right_span > 0, (knots[k + 1:] - x[:, None]) / right_span, 0.0)
+        basis = left * basis[:, :-1] + right * basis[:, 1:]
+
+    return basis
+
+
+def difference_penalty(n_basis, degree=2):
+    """P-spline roughness penalty on the basis coefficients"""
+    diff = np.diff(np.eye(n_basis), n=degree, axis=0)
+    return diff.T @ diff
+
+
+def gram_matrix(n_basis, order, domain, resolution=501):
+    """Inner products of the basis functions over the domain, by trapezoidal quadrature"""
+    grid = np.linspace(*domain, resolution)
+    weights = np.full(resolution, grid[1] - grid[0])
+    weights[[0, -1]] /= 2
+    basis = bspline_basis(grid, n_basis, order, domain)
+    return basis.T @ (weights[:, None] * basis)
+
+
+def _sqrtm(matrix):
+    vals, vecs = np.linalg.eigh(matrix)
+    vals = np.clip(vals, 0, None)
+    return (vecs * np.sqrt(vals)) @ vecs.T, (vecs / np.sqrt(vals)) @ vecs.T
+
+
+# ----- DECOMPOSITIONS -------------------------------------------------------------------------------------------------
+
+def randomized_svd(data, n_components, n_oversamples=10, n_iter=4, seed=0):
+    """Truncated SVD by random projection (Halko et al.), for populations too large for a full decomposition"""
+    rng = np.random.default_rng(seed)
+    rank = min(n_components + n_oversamples, *data.shape)
+
+    # Range finder with a few power iterations
+    sample = data @ rng.standard_normal((data.shape[1], rank))
+    q, _ = np.linalg.qr(sample)
+    for _ in range(n_iter):
+        q, _ = np.linalg.qr(data.T @ q)
+        q, _ = np.linalg.qr(data @ q)
+
+    u, s, vt = np.linalg.svd(q.T @ data, full_matrices=False)
+    return (q @ u)[:, :n_components], s[:n_components], vt[:n_components]
+
+
+# ----- FPCA -----------------------------------------------------------------------------------------------------------
+
+class FPCA:
+    """Functional PCA of career curves, smoothed onto a B-spline basis.
+
+    The curves are represented by their basis coefficients, and the principal components are found in that space with
+    the basis Gram matrix as metric. Running sums of the coefficients and of their outer products are kept, so that
+    partial_fit can add new players at the cost of smoothing them only, without going through the previous ones again.
+    """
+
+    def __init__(self, n_components=3, n_basis=8, order=4, smoothing=1.0, stat='av'):
+        self.n_components = n_components
+        self.n_basis = n_basis
+        self.order = order
+        self.smoothing = smoothing
+        self.stat = stat
+
+        self.domain = None
+        self.n_samples = 0
+        self._sum = np.zeros(n_basis)
+        self._outer = np.zeros((n_basis, n_basis))
+
+        self.mean_coefs = None
+        self.components = None
+        self.explained_variance = None
+
+    # ----- SMOOTHING --------------------------------------------------------------------------------------------------
+
+    def _on_domain(self, matrix):
+        """The first matrix sets the domain of the model. Later ones, e.g. a cohort of new players whose careers are
+        shorter, are padded onto the fitted grid, they may only differ from it by empty seasons."""
+        if self.domain is None:
+            self.domain = (float(matrix.grid[0]), float(matrix.grid[-1]))
+            self.gram = gram_matrix(self.n_basis, self.order, self.domain)
+            self._gram_sqrt, self._gram_inv_sqrt = _sqrtm(self.gram)
+            return matrix
+
+        lo, hi = int(self.domain[0]), int(self.domain[1])
+        if (matrix.origin, matrix.av.shape[1]) == (lo, hi - lo + 1):
+            return matrix
+
+        seasons = matrix.grid[matrix.mask.any(axis=0)]
+        if ((seasons < lo) | (seasons > hi)).any():
+            raise ValueError(f"Matrix has seasons over ({seasons.min()}, {seasons.max()}), the model was fitted on "
+                             f"{self.domain}")
+        return matrix.reindex(lo, hi - lo + 1)
+
+    def smooth(self, matrix, observed_only=False):
+        """Basis coefficients of each player's curve, by penalized least squares. By default the seasons a player has
+        no stats for count as 0, with observed_only only the seasons he has are fitted."""
+        matrix = self._on_domain(matrix)
+        basis = bspline_basis(matrix.grid, self.n_basis, self.order, self.domain)
+        penalty = self.smoothing * difference_penalty(self.n_basis)
+        values = getattr(matrix, self.stat)
+
+        if not observed_only:
+            return np.linalg.solve(basis.T @ basis + penalty, basis.T @ values.T).T
+
+        weights = matrix.mask.astype(float)
+        lhs = np.einsum('tk,nt,tl->nkl', basis, weights, basis) + penalty
+        rhs = (weights * values) @ basis
+        return np.linalg.solve(lhs, rhs[..., None])[..., 0]
+
+    # ----- FITTING ----------------------------------------------------------------------------------------------------
+
+    def partial_fit(self, matrix, **kwargs):
+        """Adds players to the model and updates the components once there are at least two of them"""
+        coefs = self.smooth(matrix, **kwargs)
+        self.n_samples += len(coefs)
+        self._sum += coefs.sum(axis=0)
+        self._outer += coefs.T @ coefs
+        if self.n_samples >= 2:
+            self._update_components()
+        return self
+
+    def fit(self, matrix, method='eigh', **kwargs):
+        """Fits the model from scratch. method is 'eigh' to decompose the covariance of the coefficients, or
+        'randomized' to run a truncated SVD of the centered coefficients without forming the covariance, which only
+        pays off when the basis is large compared to the number of components."""
+        self.domain = None
+        self.n_samples = 0
+        self._sum = np.zeros(self.n_basis)
+        self._outer = np.zeros((self.n_basis, self.n_basis))
+
+        if len(matrix) < 2:
+            raise ValueError("At least two players are needed to fit the model")
+        if method == 'eigh':
+            return self.partial_fit(matrix, **kwargs)
+        if method != 'randomized':
+            raise ValueError(f"Unknown method {method}")
+
+        coefs = self.smooth(matrix, **kwargs)
+        self.n_samples = len(coefs)
+        self._sum = coefs.sum(axis=0)
+        self._outer = coefs.T @ coefs
+        self.mean_coefs = self._sum / self.n_samples
+
+        centered = (coefs - self.mean_coefs) @ self._gram_sqrt
+        _, s, vt = randomized_svd(centered, self.n_components)
+        self._set_components(s ** 2 / max(self.n_samples - 1, 1), vt)
+        return self
+
+    def _update_components(self):
+        self.mean_coefs = self._sum / self.n_samples
+        vals, vecs = np.linalg.eigh(self._gram_sqrt @ self.covariance @ self._gram_sqrt)
+        order = np.argsort(vals)[::-1][:self.n_components]
+        self._set_components(np.clip(vals[order], 0, None), vecs[:, order].T)
+
+    def _set_components(self, variance, vecs):
+        components = vecs @ self._gram_inv_sqrt
+        # Eigenvectors are defined up to their sign, make the eigenfunctions integrate positively
+        signs = np.sign(components @ self.gram.sum(axis=1))
+        signs[signs == 0] = 1
+        self.components = components * signs[:, None]
+        self.explained_variance = variance
+
+    # ----- RESULTS ----------------------------------------------------------------------------------------------------
+
+    @property
+    def explained_variance_ratio(self):
+        total = np.trace(self._gram_sqrt @ self.covariance @ self._gram_sqrt)
+        return self.explained_variance / total if total > 0 else np.zeros_like(self.explained_variance)
+
+    @property
+    def covariance(self):
+        return (self._outer - self.n_samples * np.outer(self.mean_coefs, self.mean_coefs)) / (self.n_samples - 1)
+
+    def transform(self, matrix, **kwargs):
+        """Scores of each player on the components"""
+        coefs = self.smooth(matrix, **kwargs)
+        return (coefs - self.mean_coefs) @ self.gram @ self.components.T
+
+    def evaluate(self, coefs, grid=None):
+        grid = np.linspace(*self.domain, 101) if grid is None else grid
+        return np.atleast_2d(coefs) @ bspline_basis(grid, self.n_basis, self.order, self.domain).T
+
+    def eigenfunctions(self, grid=None):
+        """Values of the eigenfunctions on a grid, shape (n_components, len(grid))"""
+        return self.evaluate(self.components, grid)
+
+    def mean_function(self, grid=None):
+        return self.evaluate(self.mean_coefs, grid)[0]
+
+
+def fit_position_groups(matrix, groups=None, min_players=10, **kwargs):
+    """Fits one FPCA per position group, returns {group: (model, scores)}"""
+    groups = groups or sorted(set(matrix.meta['position_group']) - {''})
+    results = dict()
+    for group in groups:
+        sub = matrix.group(group)
+        if len(sub) < max(min_players, 2):
+            continue
+        model = FPCA(**kwargs).fit(sub)
+        results[group] = (model, model.transform(sub))
+    return results
@@ -0,0 +1,255 @@
+"""Batched preprocessing of career matrices: injury filtering, gap filling, smoothing and resampling onto a common grid.
+
+Each kernel has two implementations with the same results: a loop over players written for Numba, compiled when it is
+installed, and a vectorized NumPy one used otherwise. Elastic alignment goes through fdasrsf, when it is installed.
+"""
+import numpy as np
+
+from .career_matrix import CareerMatrix
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+    prange = range
+
+try:
+    import fdasrsf
+except ImportError:
+    fdasrsf = None
+
+BACKENDS = ('auto', 'numba', 'numpy')
+
+
+# ----- LOOP KERNELS ---------------------------------------------------------------------------------------------------
+# Plain Python over players and seasons, compiled by Numba. They also serve as the per-player reference.
+
+def _injury_loop(gp, mask, threshold):
+    n, width = gp.shape
+    keep = mask.copy()
+    for i in prange(n):
+        last = -1
+        for j in range(width - 1, -1, -1):
+            if mask[i, j]:
+                last = j
+                break
+        # Same rule as Player.adjust_for_injuries: every season but the last with few games played is dropped
+        for j in range(last):
+            if mask[i, j] and gp[i, j] <= threshold:
+                keep[i, j] = False
+    return keep
+
+
+def _fill_loop(values, mask):
+    n, width = values.shape
+    filled = values.copy()
+    filled_mask = mask.copy()
+    for i in prange(n):
+        prev = -1
+        for j in range(width):
+            if not mask[i, j]:
+                continue
+            if prev >= 0 and j - prev > 1:
+                step = (values[i, j] - values[i, prev]) / (j - prev)
+                for k in range(prev + 1, j):
+                    filled[i, k] = values[i, prev] + step * (k - prev)
+                    filled_mask[i, k] = True
+            prev = j
+    return filled, filled_mask
+
+
+def _smooth_loop(values, mask, bandwidth):
+    n, width = values.shape
+    smoothed = np.zeros_like(values)
+    for i in prange(n):
+        first, last = width, -1
+        for j in range(width):
+            if mask[i, j]:
+                first = min(first, j)
+                last = j
+        for t in range(first, last + 1):
+            num, den = 0.0, 0.0
+            for j in range(first, last + 1):
+                if mask[i, j]:
+                    w = np.exp(-0.5 * ((t - j) / bandwidth) ** 2)
+                    num += w * values[i, j]
+                    den += w
+            smoothed[i, t] = num / den
+    return smoothed
+
+
+def _resample_loop(values, mask, shifts, grid):
+    n, width = values.shape
+    out = np.zeros((n, len(grid)))
+    out_mask = np.zeros((n, len(grid)), dtype=np.bool_)
+    for i in prange(n):
+        for t in range(len(grid)):
+            pos = grid[t] - shifts[i]
+            lo = int(np.floor(pos))
+            frac = pos - lo
+            if lo < 0 or lo >= width or not mask[i, lo]:
+                continue
+            if frac == 0.0:
+                out[i, t] = values[i, lo]
+            elif lo + 1 < width and mask[i, lo + 1]:
+                out[i, t] = (1 - frac) * values[i, lo] + frac * values[i, lo + 1]
+            else:
+                continue
+            out_mask[i, t] = True
+    return out, out_mask
+
+
+if njit is not None:
+    _LOOPS = {name: njit(parallel=True, cache=True)(func) for name, func in
+              (('injury', _injury_loop), ('fill', _fill_loop), ('smooth', _smooth_loop), ('resample', _resample_loop))}
+else:
+    _LOOPS = None
+
+
+# ----- NUMPY KERNELS --------------------------------------------------------------------------------------------------
+
+def _last_observed(mask):
+    """Column of the last season of each row, -1 for empty rows"""
+    width = mask.shape[1]
+    last = width - 1 - np.argmax(mask[:, ::-1], axis=1)
+    return np.where(mask.any(axis=1), last, -1)
+
+
+def _injury_numpy(gp, mask, threshold):
+    cols = np.arange(gp.shape[1])
+    return mask & ~((gp <= threshold) & (cols < _last_observed(mask)[:, None]))
+
+
+def _fill_numpy(values, mask):
+    width = values.shape[1]
+    cols = np.broadcast_to(np.arange(width), values.shape)
+    # Previous and next observed column of every cell
+    prev = np.maximum.accumulate(np.where(mask, cols, -1), axis=1)
+    nxt = np.minimum.accumulate(np.where(mask, cols, width)[:, ::-1], axis=1)[:, ::-1]
+    gap = ~mask & (prev >= 0) & (nxt < width)
+
+    rows = np.arange(len(values))[:, None]
+    lo = values[rows, np.clip(prev, 0, width - 1)]
+    hi = values[rows, np.clip(nxt, 0, width - 1)]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        interpolated = lo + (hi - lo) * (cols - prev) / (nxt - prev)
+    return np.where(gap, interpolated, values), mask | gap
+
+
+def _smooth_numpy(values, mask, bandwidth):
+    cols = np.arange(values.shape[1])
+    kernel = np.exp(-0.5 * ((cols[:, None] - cols[None, :]) / bandwidth) ** 2)
+    weights = mask.astype(float)
+    num = (weights * values) @ kernel
+    den = weights @ kernel
+
+    # Only inside each career, between its first and last seasons
+    first = np.argmax(mask, axis=1)
+    inside = (cols >= first[:, None]) & (cols <= _last_observed(mask)[:, None])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(inside, num / den, 0.0)
+
+
+def _resample_numpy(values, mask, shifts, grid):
+    n, width = values.shape
+    pos = grid[None, :] - shifts[:, None]
+    lo = np.floor(pos).astype(int)
+    frac = pos - lo
+    rows = np.arange(n)[:, None]
+
+    lo_ok = (lo >= 0) & (lo < width)
+    lo_c = np.clip(lo, 0, width - 1)
+    hi_c = np.clip(lo + 1, 0, width - 1)
+    hi_ok = (lo + 1 < width) & mask[rows, hi_c]
+    exact = frac == 0
+    out_mask = lo_ok & mask[rows, lo_c] & (exact | hi_ok)
+
+    out = np.where(exact, values[rows, lo_c], (1 - frac) * values[rows, lo_c] + frac * values[rows, hi_c])
+    return np.where(out_mask, out, 0.0), out_mask
+
+
+_NUMPY = {'injury': _injury_numpy, 'fill': _fill_numpy, 'smooth': _smooth_numpy, 'resample': _resample_numpy}
+
+
+def _kernel(name, backend):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend}, expected one of {BACKENDS}")
+    if backend == 'numba' and _LOOPS is None:
+        raise ImportError("numba is needed for the numba backend")
+    if backend == 'numpy' or _LOOPS is None:
+        return _NUMPY[name]
+    return _LOOPS[name]
+
+
+# ----- PUBLIC API -----------------------------------------------------------------------------------------------------
+
+def injury_filter(gp, mask, threshold=3, backend='auto'):
+    """Mask without the seasons adjust_for_injuries drops: all but the last one with at most `threshold` games"""
+    return _kernel('injury', backend)(np.asarray(gp, dtype=float), np.asarray(mask, dtype=bool), threshold)
+
+
+def fill_gaps(values, mask, backend='auto'):
+    """Seasons missing within careers filled by linear interpolation, returns (values, mask)"""
+    return _kernel('fill', backend)(np.asarray(values, dtype=float), np.asarray(mask, dtype=bool))
+
+
+def smooth(values, mask, bandwidth=1.0, backend='auto'):
+    """Gaussian kernel smoothing of each career over its observed seasons, 0 outside the career"""
+    return _kernel('smooth', backend)(np.asarray(values, dtype=float), np.asarray(mask, dtype=bool), float(bandwidth))
+
+
+def resample(values, mask, shifts, grid, backend='auto'):
+    """Careers moved onto a common grid: column j of row i sits at shifts[i] + j, values in between two observed seasons
+    are interpolated linearly. Returns (values, mask) of shape (n, len(grid))."""
+    return _kernel('resample', backend)(np.asarray(values, dtype=float), np.asarray(mask, dtype=bool),
+                                        np.asarray(shifts, dtype=float), np.asarray(grid, dtype=float))
+
+
+def elastic_align(values, grid=None, **kwargs):
+    """Elastic (SRSF) alignment of the curves with fdasrsf, returns (aligned curves, warping functions). Curves must be
+    complete, e.g. filled and resampled first."""
+    if fdasrsf is None:
+        raise ImportError("fdasrsf is needed for elastic alignment")
+    values = np.asarray(values, dtype=float)
+    grid = np.arange(values.shape[1], dtype=float) if grid is None else np.asarray(grid, dtype=float)
+    warp = fdasrsf.fdawarp(values.T, grid)
+    warp.srsf_align(**kwargs)
+    return warp.fn.T, warp.gam.T
+
+
+def preprocess(matrix, stat='av', injury_threshold=3, fill=True, bandwidth=None, align=None, backend='auto'):
+    """Runs the kernels over a year-aligned career matrix, returns a new one.
+
+    Seasons dropped by the injury rule (None to skip it) and gaps are filled on `stat`, which is then smoothed with
+    `bandwidth` seasons if given. With align='age', careers are moved onto a common grid of ages from the players'
+    start_age. The other stats of the returned matrix are the ones of the input, resampled the same way.
+    """
+    if matrix.align != 'year':
+        raise ValueError("preprocess expects a matrix aligned on career years")
+
+    mask = matrix.mask
+    if injury_threshold is not None:
+        mask = injury_filter(matrix.gp, mask, injury_threshold, backend)
+
+    values = np.where(mask, getattr(matrix, stat), 0.0)
+    if fill:
+        values, mask = fill_gaps(values, mask, backend)
+    if bandwidth:
+        values = smooth(values, mask, bandwidth, backend)
+
+    arrays = {name: np.where(mask, getattr(matrix, name), 0.0) for name in ('av', 'gp', 'gs')}
+    arrays[stat] = values
+    origin = 0
+
+    if align == 'age' and len(matrix):
+        shifts = matrix.meta['start_age'].astype(float)
+        origin = int(shifts.min())
+        grid = np.arange(origin, int((shifts + matrix.av.shape[1]).max()))
+        resampled = {name: resample(array, mask, shifts, grid, backend) for name, array in arrays.items()}
+        arrays = {name: out for name, (out, _) in resampled.items()}
+        mask = resampled[stat][1]
+    elif align not in (None, 'year', 'age'):
+        raise ValueError(f"align must be 'year' or 'age', not {align}")
+
+    return CareerMatrix(matrix.meta, arrays['av'], arrays['gp'], arrays['gs'], mask,
+                        'age' if align == 'age' else 'year', origin)
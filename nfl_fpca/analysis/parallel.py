@@ -0,0 +1,139 @@
+import os
+import shutil
+import tempfile
+import time
+
+from contextlib import contextmanager
+
+import numpy as np
+
+from joblib import Parallel, delayed
+
+from ..metrics import get_metrics
+from .career_matrix import CareerMatrix
+from .fpca import FPCA
+
+ARRAYS = ('meta', 'av', 'gp', 'gs', 'mask')
+
+
+# ----- SHARED MATRIX --------------------------------------------------------------------------------------------------
+
+class SharedMatrix:
+    """Handle on a career matrix saved as .npy files. Only the handle is sent to the workers, which memory-map the
+    arrays, so every process reads the same pages instead of receiving its own pickled copy."""
+
+    def __init__(self, directory, align, origin):
+        self.directory = directory
+        self.align = align
+        self.origin = origin
+
+    @classmethod
+    def create(cls, matrix, directory):
+        for name in ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(matrix, name))
+        return cls(directory, matrix.align, matrix.origin)
+
+    def open(self):
+        arrays = [np.load(os.path.join(self.directory, f"{name}.npy"), mmap_mode='r') for name in ARRAYS]
+        return CareerMatrix(*arrays, self.align, self.origin)
+
+
+@contextmanager
+def shared_matrix(matrix, directory=None):
+    """SharedMatrix of a matrix, in a temporary directory removed on exit"""
+    tmp_dir = tempfile.mkdtemp(prefix='career_matrix_', dir=directory)
+    try:
+        yield SharedMatrix.create(matrix, tmp_dir)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+# ----- TASKS ----------------------------------------------------------------------------------------------------------
+
+def _fit_task(shared, rows, kwargs):
+    """Fit on the rows of a group, returns (model, scores, seconds)"""
+    start = time.perf_counter()
+    sub = shared.open().subset(rows)
+    model = FPCA(**kwargs).fit(sub)
+    return model, model.transform(sub), time.perf_counter() - start
+
+
+def _bootstrap_task(shared, rows, seed, grid, kwargs):
+    """Fit on a resample of the rows of a group, returns (eigenfunctions on the grid, seconds)"""
+    start = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    sub = shared.open().subset(rng.choice(rows, size=len(rows), replace=True))
+    eigenfunctions = FPCA(**kwargs).fit(sub).eigenfunctions(grid)
+    return eigenfunctions, time.perf_counter() - start
+
+
+# ----- FITTING --------------------------------------------------------------------------------------------------------
+
+class GroupFit:
+    """FPCA of a position group, with the pointwise bootstrap confidence bands of its eigenfunctions on `grid` (None
+    without resamples), and the time spent in the fits, summed over the workers"""
+
+    def __init__(self, group, model, scores, grid):
+        self.group = group
+        self.model = model
+        self.scores = scores
+        self.grid = grid
+        self.lower = None
+        self.upper = None
+        self.n_resamples = 0
+        self.seconds = {'fit': 0.0, 'bootstrap': 0.0}
+
+    def __repr__(self):
+        return f"GroupFit({self.group}, {len(self.scores)} players, {self.n_resamples} resamples)"
+
+
+def fit_groups_parallel(matrix, groups=None, min_players=10, n_bootstrap=0, alpha=0.05, grid=None, n_jobs=-1,
+                        backend='loky', seed=0, tmp_dir=None, **kwargs):
+    """Same fits as fit_position_groups, plus n_bootstrap resamples of each group, all scheduled on a joblib pool.
+
+    The matrix is written once to memory-mapped .npy files shared by the workers, each task only carries the rows of
+    its group. Resample seeds are spawned from `seed`, so results do not depend on the scheduling. Returns
+    {group: GroupFit}, with bands at the alpha / 2 and 1 - alpha / 2 quantiles of the resampled eigenfunctions.
+    """
+    groups = groups or sorted(set(matrix.meta['position_group']) - {''})
+    rows = {group: np.flatnonzero(matrix.meta['position_group'] == group) for group in groups}
+    rows = {group: idx for group, idx in rows.items() if len(idx) >= max(min_players, 2)}
+    grid = np.linspace(matrix.grid[0], matrix.grid[-1], 101) if grid is None else np.asarray(grid)
+    seeds = dict(zip(rows, np.random.SeedSequence(seed).spawn(len(rows))))
+
+    start = time.perf_counter()
+    with shared_matrix(matrix, tmp_dir) as shared:
+        tasks = [delayed(_fit_task)(shared, idx, kwargs) for idx in rows.values()]
+        for group, idx in rows.items():
+            tasks += [delayed(_bootstrap_task)(shared, idx, child, grid, kwargs)
+                      for child in seeds[group].spawn(n_bootstrap)]
+        outputs = Parallel(n_jobs=n_jobs, backend=backend)(tasks)
+    wall = time.perf_counter() - start
+
+    results = dict()
+    for group, (model, scores, seconds) in zip(rows, outputs):
+        results[group] = GroupFit(group, model, scores, grid)
+        results[group].seconds['fit'] = seconds
+
+    resamples = iter(outputs[len(rows):])
+    for group, fit in results.items():
+        if not n_bootstrap:
+            continue
+        reference = fit.model.eigenfunctions(grid)
+        curves = []
+        for eigenfunctions, seconds in (next(resamples) for _ in range(n_bootstrap)):
+            # Eigenfunctions are only defined up to their sign, align each one with the fit on the whole group
+            signs = np.sign(np.sum(eigenfunctions * reference, axis=1))
+            signs[signs == 0] = 1
+            curves.append(eigenfunctions * signs[:, None])
+            fit.seconds['bootstrap'] += seconds
+        fit.lower, fit.upper = np.quantile(np.stack(curves), [alpha / 2, 1 - alpha / 2], axis=0)
+        fit.n_resamples = n_bootstrap
+
+    metrics = get_metrics()
+    for group, fit in results.items():
+        for kind, seconds in fit.seconds.items():
+            metrics.observe('fpca_fit_seconds', seconds, group=group, kind=kind)
+    metrics.observe('fpca_wall_seconds', wall)
+
+    return results
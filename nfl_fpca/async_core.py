@@ -0,0 +1,194 @@
+import asyncio
+import os
+import requests
+
+from concurrent.futures import ProcessPoolExecutor
+
+import nfl_fpca.database.db_handling as db_handling
+
+from .config import setup_logging, setup_progress_bar
+from .core import _timed_scrape_player_page, record_parse_timings
+from .database.writer import DEFAULT_MAX_DELAY, StreamingWriter
+from .metrics import exports_metrics, get_metrics
+from .planner import JobPlanner
+from .scraping.async_client import AsyncFetcher
+from .scraping.cache import DEFAULT_CACHE_DIR, PageCache, page_digest
+from .scraping.client import describe_error
+from .scraping.result_cache import ResultCache
+from .scraping.scheduler import DEFAULT_RATE, HostRateLimiter, StageCounters
+from .scraping.player_scrapper import player_url
+from .scraping.team_scrapper import roster_ttl, roster_url, scrape_player_ids
+
+# Configure module logger from config file
+logger = setup_logging(__name__, 'logs/core.log')
+
+
+class AsyncScraper:
+    """State of an async scraping run: the fetcher, the parsing pool, the stage counters and the parsed result cache"""
+
+    def __init__(self, fetcher, pool, counters, planner, results=None):
+        self.fetcher = fetcher
+        self.pool = pool
+        self.counters = counters
+        self.planner = planner
+        self.results = results
+
+    async def parse(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.pool, func, *args)
+
+    async def roster(self, team, year):
+        """Player IDs on a roster, an empty set if the page could not be fetched. The roster index is used as in
+        team_scrapper.fetch_roster_pids."""
+        pids = self.planner.indexed_roster(team, year)
+        if pids is not None:
+            get_metrics().inc('roster_index', result='immutable')
+            return pids
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        try:
+            page = await self.fetcher.fetch(roster_url(team, year), ttl=roster_ttl(year))
+        except requests.exceptions.RequestException as e:
+            logger.error(f"[{team.upper()}] - Fetching {year} roster page failed with {describe_error(e)}")
+            return set()
+        self.counters.add('roster_fetch', elapsed=loop.time() - start)
+
+        digest = page_digest(page)
+        pids = self.planner.indexed_roster(team, year, digest)
+        if pids is not None:
+            get_metrics().inc('roster_index', result='unchanged')
+        else:
+            get_metrics().inc('roster_index', result='parsed')
+            with self.counters.time('roster_parse'):
+                pids = await self.parse(scrape_player_ids, page, set())
+
+        if pids:
+            self.planner.index_roster(team, year, digest, pids)
+        return pids
+
+    async def player(self, pid, progress=None, task=None):
+        """Fetches and parses a player page, returns None and records the failure in the dead-letter queue if either
+        step fails"""
+        loop = asyncio.get_running_loop()
+        try:
+            start = loop.time()
+            try:
+                page = await self.fetcher.fetch(player_url(pid))
+            except requests.exceptions.RequestException as e:
+                logger.error(f"[{pid}] - Requesting player page failed with {describe_error(e)}")
+                self.planner.players_failed([pid], describe_error(e))
+                return None
+            self.counters.add('player_fetch', elapsed=loop.time() - start)
+
+            digest = page_digest(page) if self.results is not None else None
+            player = self.results.get(digest, pid) if self.results is not None else None
+            if player is not None:
+                return player
+
+            try:
+                player, timings = await self.parse(_timed_scrape_player_page, page, pid)
+            except Exception as e:
+                logger.exception(f"[{pid}] - Parsing failed: {e}")
+                self.planner.players_failed([pid], 'parsing failed')
+                return None
+            record_parse_timings(timings, self.counters)
+            if self.results is not None:
+                self.results.store(digest, player)
+            return player
+        finally:
+            if progress is not None:
+                progress.advance(task)
+
+    async def players(self, pids, progress=None, task=None):
+        """Players that were scraped successfully, the fetcher bounds how many are requested at once"""
+        players = await asyncio.gather(*(self.player(pid, progress, task) for pid in sorted(pids)))
+        return [player for player in players if player is not None]
+
+
+async def scrape_team_async(start, end, team, scraper, pid_set, writer, progress):
+    """Year loop of the async pipeline. The roster of year N+1 is fetched while the players of year N are, and each
+    player is handed to the streaming writer as soon as it is parsed."""
+    loop = asyncio.get_running_loop()
+    team_task = progress.add_task('Scraping teams...', total=(end - start + 1))
+
+    async def scrape(pid, task):
+        player = await scraper.player(pid, progress, task)
+        if player is not None:
+            # put blocks while the writer queue is full, off the event loop
+            await loop.run_in_executor(None, writer.put, pid, player if player.start_year >= 1960 else None)
+
+    next_roster = asyncio.create_task(scraper.roster(team, start))
+    for year in range(start, end + 1):
+        temp_set = (await next_roster) - pid_set
+        if year < end:
+            next_roster = asyncio.create_task(scraper.roster(team, year + 1))
+        pid_set |= temp_set
+        scraper.planner.plan_players(temp_set)
+
+        player_task = progress.add_task('Scraping players...', total=len(temp_set))
+        await asyncio.gather(*(scrape(pid, player_task) for pid in sorted(temp_set)))
+        progress.remove_task(player_task)
+        progress.advance(team_task)
+
+
+async def retry_failed_async(scraper):
+    """Dead-letter pass, as core.retry_failed_players"""
+    failed = scraper.planner.failed_players()
+    if not failed:
+        return 0
+
+    logger.info(f"Retrying {len(failed)} failed players...")
+    players = await scraper.players(failed)
+    with scraper.counters.time('db_write', count=len(players)):
+        db_handling.add_players([player for player in players if player.start_year >= 1960])
+    scraper.planner.players_done([player.pid for player in players])
+    logger.info(f"{len(players)} of {len(failed)} failed players recovered.")
+    return len(players)
+
+
+@exports_metrics
+def run_async_scraping_pipeline(start, end, team, wipe=False, rate=DEFAULT_RATE, workers=None, concurrency=4,
+                                cache_dir=DEFAULT_CACHE_DIR, batch_size=100, max_delay=DEFAULT_MAX_DELAY):
+    """Async counterpart of core.run_scraping_pipeline, with the same arguments and results.
+
+    Up to `concurrency` pages are requested at once, within the same per-host rate limit, and parsed on a pool of
+    worker processes so the event loop never blocks. The roster of the next season is requested while the players of
+    the current one are. Parsed players go through the same streaming writer and ScrapeJob checkpoints as in the sync
+    pipeline.
+    """
+    counters = StageCounters()
+    limiter = HostRateLimiter(rate, counters=counters)
+    cache = PageCache(cache_dir) if cache_dir is not None else None
+    results = ResultCache(cache_dir) if cache_dir is not None else None
+    planner = JobPlanner()
+    progress = setup_progress_bar()
+
+    # Wipe the database if necessary, otherwise skip the players already stored or checkpointed
+    if wipe:
+        db_handling.reset()
+        planner.reset()
+        pid_set = set()
+    else:
+        db_handling.migrate()
+        pid_set = db_handling.get_all_pids() | planner.done_players()
+
+    writer = StreamingWriter(checkpoint=planner.players_done, batch_size=batch_size, max_delay=max_delay,
+                             counters=counters)
+
+    async def main():
+        async with AsyncFetcher(concurrency, limiter=limiter, cache=cache) as fetcher:
+            scraper = AsyncScraper(fetcher, pool, counters, planner, results)
+            with writer:
+                await scrape_team_async(start, end, team, scraper, pid_set, writer, progress)
+            # Once every player of the main pass is checkpointed
+            await retry_failed_async(scraper)
+
+    with progress, ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        asyncio.run(main())
+
+    counters.log(logger)
+    if cache is not None:
+        cache.log_stats()
+        cache.close()
+        results.log_stats()
+        results.close()
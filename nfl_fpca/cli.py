@@ -0,0 +1,181 @@
+"""Command line interface of nfl_fpca.
+
+Only argparse is imported up front: each subcommand imports the modules it needs (bs4, peewee, numpy, joblib...) when
+it runs, so that `python -m nfl_fpca --help` stays fast.
+"""
+import argparse
+import sys
+
+
+def _pipeline_kwargs(args, *names):
+    """Options given on the command line, the ones left out keep the defaults of the pipeline functions"""
+    kwargs = {name: getattr(args, name) for name in names if getattr(args, name, None) is not None}
+    if getattr(args, 'no_cache', False):
+        kwargs['cache_dir'] = None
+    if args.metrics is not None:
+        kwargs['metrics_path'] = args.metrics
+    return kwargs
+
+
+# ----- COMMANDS -------------------------------------------------------------------------------------------------------
+
+def cmd_scrape(args):
+    if args.use_async:
+        from .async_core import run_async_scraping_pipeline
+
+        kwargs = _pipeline_kwargs(args, 'rate', 'workers', 'concurrency', 'batch_size', 'cache_dir')
+        for i, team in enumerate(args.teams):
+            run_async_scraping_pipeline(args.start, args.end, team, wipe=args.wipe and i == 0, **kwargs)
+    else:
+        from .core import run_league_pipeline
+
+        run_league_pipeline(args.start, args.end, args.teams, wipe=args.wipe,
+                            **_pipeline_kwargs(args, 'rate', 'workers', 'batch_size', 'cache_dir'))
+
+
+def cmd_reparse(args):
+    from .core import run_reparse_pipeline
+
+    run_reparse_pipeline(args.source, wipe=args.wipe,
+                         **_pipeline_kwargs(args, 'workers', 'batch_size', 'checkpoint', 'results_dir'))
+
+
+def cmd_update(args):
+    from .core import run_update_pipeline
+
+    written = run_update_pipeline(args.season, args.teams,
+                                  **_pipeline_kwargs(args, 'rate', 'workers', 'batch_size', 'cache_dir'))
+    print(f"{written} seasons written")
+
+
+def cmd_export(args):
+    from .database import db_handling, export
+
+    root = args.root or export.EXPORT_DIR
+    if args.load:
+        print(f"{export.import_db(root)} players imported")
+        return
+
+    db_handling.migrate()
+    report = export.export_db(root, args.format, force=args.force)
+    print(f"{len(report['written'])} partitions written, {len(report['unchanged'])} unchanged, "
+          f"{len(report['removed'])} removed")
+
+
+def cmd_analyze(args):
+    from .analysis.career_matrix import build_career_matrix
+    from .analysis.parallel import fit_groups_parallel
+
+    matrix = build_career_matrix(args.positions, args.start_year, args.career_length, align=args.align,
+                                 max_length=args.max_length, export_dir=args.export_dir)
+    results = fit_groups_parallel(matrix, min_players=args.min_players, n_bootstrap=args.bootstrap,
+                                  n_jobs=args.jobs, n_components=args.components, stat=args.stat)
+
+    print(f"{'group':<8}{'players':>10}{'explained':>12}{'fit (s)':>10}{'bootstrap (s)':>15}")
+    for group, fit in results.items():
+        explained = fit.model.explained_variance_ratio.sum()
+        print(f"{group:<8}{len(fit.scores):>10}{explained:>12.1%}{fit.seconds['fit']:>10.2f}"
+              f"{fit.seconds['bootstrap']:>15.2f}")
+
+    if args.output:
+        import numpy as np
+
+        arrays = dict()
+        for group, fit in results.items():
+            arrays[f"{group}_eigenfunctions"] = fit.model.eigenfunctions(fit.grid)
+            arrays[f"{group}_mean"] = fit.model.mean_function(fit.grid)
+            if fit.n_resamples:
+                arrays[f"{group}_lower"], arrays[f"{group}_upper"] = fit.lower, fit.upper
+        np.savez(args.output, grid=next(iter(results.values())).grid if results else np.zeros(0), **arrays)
+        print(f"Results written to {args.output}")
+
+
+# ----- PARSER ---------------------------------------------------------------------------------------------------------
+
+def _add_fetch_options(parser):
+    parser.add_argument('--teams', nargs='+', help="team ids from teams.json, all of them by default")
+    parser.add_argument('--rate', type=float, help="requests per second to the site")
+    parser.add_argument('--cache-dir', help="page cache directory, data/pages by default")
+    parser.add_argument('--no-cache', action='store_true', help="fetch every page from the site")
+
+
+def _add_pipeline_options(parser):
+    parser.add_argument('--workers', type=int, help="parsing processes, one per core by default")
+    parser.add_argument('--batch-size', type=int, help="players written per transaction")
+    parser.add_argument('--metrics', help="metrics file, logs/metrics.json by default, .prom for Prometheus")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='nfl_fpca', description="Scrapes NFL careers and runs FPCA on them")
+    parser.add_argument('--db', help="database file, data/player.db by default")
+    commands = parser.add_subparsers(dest='command', required=True, metavar='command')
+
+    scrape = commands.add_parser('scrape', help="scrape rosters and players between two seasons")
+    scrape.add_argument('start', type=int)
+    scrape.add_argument('end', type=int)
+    _add_fetch_options(scrape)
+    _add_pipeline_options(scrape)
+    scrape.add_argument('--wipe', action='store_true', help="start from an empty database")
+    scrape.add_argument('--async', dest='use_async', action='store_true',
+                        help="overlap requests, one team at a time (--teams is then required)")
+    scrape.add_argument('--concurrency', type=int, help="requests in flight with --async")
+    scrape.set_defaults(func=cmd_scrape)
+
+    reparse = commands.add_parser('reparse', help="rebuild the database from saved pages")
+    reparse.add_argument('source', help="directory of .htm files, archive of them or page cache")
+    _add_pipeline_options(reparse)
+    reparse.add_argument('--wipe', action='store_true', help="start from an empty database")
+    reparse.add_argument('--checkpoint', help="file of the pids already written")
+    reparse.add_argument('--results', dest='results_dir', help="parsed result cache directory, to skip unchanged pages")
+    reparse.set_defaults(func=cmd_reparse)
+
+    update = commands.add_parser('update', help="refresh the players of the current season")
+    update.add_argument('--season', type=int, help="the current season by default")
+    _add_fetch_options(update)
+    _add_pipeline_options(update)
+    update.set_defaults(func=cmd_update)
+
+    export = commands.add_parser('export', help="columnar export of the database")
+    export.add_argument('--root', help="export directory, data/export by default")
+    export.add_argument('--format', choices=('parquet', 'arrow', 'npy'),
+                        help="parquet if pyarrow is installed, npy otherwise")
+    export.add_argument('--force', action='store_true', help="rewrite every partition")
+    export.add_argument('--load', action='store_true', help="import an export into the database instead")
+    export.set_defaults(func=cmd_export)
+
+    analyze = commands.add_parser('analyze', help="FPCA of the career curves of each position group")
+    analyze.add_argument('--positions', nargs='+', help="position groups, all of them by default")
+    analyze.add_argument('--start-year', type=int, default=1960)
+    analyze.add_argument('--career-length', type=int, default=0)
+    analyze.add_argument('--align', choices=('year', 'age'), default='year')
+    analyze.add_argument('--max-length', type=int)
+    analyze.add_argument('--stat', choices=('av', 'gp', 'gs'), default='av')
+    analyze.add_argument('--components', type=int, default=3)
+    analyze.add_argument('--min-players', type=int, default=10)
+    analyze.add_argument('--bootstrap', type=int, default=0, help="resamples for the confidence bands")
+    analyze.add_argument('--jobs', type=int, default=-1, help="worker processes, all cores by default")
+    analyze.add_argument('--export-dir', help="read the careers from a columnar export instead of the database")
+    analyze.add_argument('--output', help=".npz file for the eigenfunctions and bands")
+    analyze.set_defaults(func=cmd_analyze)
+
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.command == 'scrape' and args.use_async and not args.teams:
+        parser.error("scrape --async needs --teams")
+
+    if args.db:
+        from .database.db_model import init_db
+
+        init_db(args.db)
+
+    args.func(args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
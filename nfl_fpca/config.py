@@ -1,31 +1,30 @@
+import datetime
 import logging
-from rich.logging import RichHandler
-from rich.progress import (
-    Progress,
-    BarColumn,
-    SpinnerColumn,
-    TaskProgressColumn,
-    TextColumn,
-    TimeRemainingColumn,
-)
+import os
+import threading
 
+from logging.handlers import RotatingFileHandler
+
+
+LOG_MAX_BYTES = 10 * 1024 ** 2
+LOG_BACKUPS = 3
+
+# One handler per log file, shared by every logger writing to it, so that a single RotatingFileHandler owns each file
+_handlers = dict()
+_handlers_lock = threading.Lock()
 
-def setup_logging(name, log_file):
-    # Create logger
-    logger = logging.getLogger(name)
-    logger.setLevel(logging.DEBUG)
 
-    # Create handlers
-    file_handler = logging.FileHandler(log_file, mode='w')
+def _build_handlers(log_file):
+    from rich.logging import RichHandler
+
+    # Create handlers, logs are appended to and rotated instead of being wiped on every run
+    os.makedirs(os.path.dirname(log_file) or '.', exist_ok=True)
+    file_handler = RotatingFileHandler(log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS)
     console_handler = RichHandler()
 
     file_handler.setLevel(logging.DEBUG)
     console_handler.setLevel(logging.INFO)
 
-    # Add handlers to logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
-
     # Formatter
     file_formatter = logging.Formatter("{asctime} - {name} - {levelname} - {message}",
                                        style="{",
@@ -40,10 +39,57 @@ def setup_logging(name, log_file):
     file_handler.setFormatter(file_formatter)
     console_handler.setFormatter(console_formatter)
 
+    return [file_handler, console_handler]
+
+
+class DeferredHandler(logging.Handler):
+    """Stands in for the file and console handlers of a logger until its first record. Importing a module that sets up
+    its logger then opens no file, creates no directory and does not import rich."""
+
+    def __init__(self, log_file):
+        super().__init__(logging.DEBUG)
+        self.log_file = log_file
+        self.handlers = None
+
+    def emit(self, record):
+        if self.handlers is None:
+            self.handlers = _build_handlers(self.log_file)
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def close(self):
+        for handler in self.handlers or ():
+            handler.close()
+        self.handlers = None
+        super().close()
+
+
+def get_log_handler(log_file):
+    """The handler of a log file, created on the first call for that file"""
+    path = os.path.abspath(log_file)
+    with _handlers_lock:
+        if path not in _handlers:
+            _handlers[path] = DeferredHandler(log_file)
+        return _handlers[path]
+
+
+def setup_logging(name, log_file):
+    # Create logger
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.DEBUG)
+
+    # Add handlers to logger, they are only created when the logger is first used
+    handler = get_log_handler(log_file)
+    if handler not in logger.handlers:
+        logger.addHandler(handler)
+
     return logger
 
 
 def setup_progress_bar():
+    from rich.progress import BarColumn, Progress, SpinnerColumn, TaskProgressColumn, TextColumn, TimeRemainingColumn
+
     progress = Progress(
         SpinnerColumn(),
         TextColumn("[progress.description]{task.description}"),
@@ -53,3 +99,9 @@ def setup_progress_bar():
     )
 
     return progress
+
+
+def current_season(today=None):
+    """Latest NFL season that has started, seasons kick off in September"""
+    today = today or datetime.date.today()
+    return today.year if today.month >= 9 else today.year - 1
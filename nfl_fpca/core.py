@@ -1,51 +1,401 @@
+import os
 import requests
 import time
 
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
 import nfl_fpca.database.db_handling as db_handling
 
-from .config import setup_progress_bar
-from .scraping.team_scrapper import fetch_and_scrape_player_ids
-from .scraping.player_scrapper import fetch_and_scrape_player_page
+from .config import current_season, setup_logging, setup_progress_bar
+from .database.writer import DEFAULT_MAX_DELAY, StreamingWriter
+from .metrics import exports_metrics, get_metrics
+from .planner import JobPlanner, expand_roster_jobs
+from .scraping.cache import DEFAULT_CACHE_DIR, PageCache, page_digest
+from .scraping.client import describe_error
+from .scraping.result_cache import ResultCache
+from .scraping.scheduler import DEFAULT_RATE, HostRateLimiter, StageCounters
+from .scraping.team_scrapper import fetch_roster_pids
+from .scraping.player_scrapper import fetch_player_page, scrape_player_page
+from .scraping.saved_pages import iter_saved_pages
+
+# Configure module logger from config file
+logger = setup_logging(__name__, 'logs/core.log')
+
+REPARSE_CHECKPOINT = os.path.join('data', 'reparse.checkpoint')
+
+
+def _timed_scrape_player_page(page, pid):
+    """Runs in a worker process: parses a player page and reports how long each step took"""
+    timings = dict()
+    player = scrape_player_page(page, pid, timings=timings)
+    return player, timings
+
+
+def record_parse_timings(timings, counters=None):
+    """Records the timings of a page parsed in a worker process, whose metrics are not visible from the main one"""
+    metrics = get_metrics()
+    for step, seconds in timings.items():
+        metrics.observe('parse_seconds', seconds, step=step)
+    if counters is not None:
+        counters.add('player_parse', elapsed=sum(timings.values()))
+
+
+def parse_in_pool(pool, pages, max_pending, counters=None, results=None):
+    """Parses (pid, page) pairs on a process pool and yields (pid, player) as they are done, player is None when the
+    parsing failed. Pages are only pulled from the iterable when fewer than max_pending are in flight, so that memory
+    use does not grow with the number of pages, and a lazy iterable keeps fetching while the workers parse.
+
+    With a ResultCache as `results`, pages already parsed by the current parser version are not sent to the pool, the
+    stored player is yielded right away, and new results are stored as they come."""
+    pages = iter(pages)
+    pending = dict()
+    exhausted = False
+
+    while pending or not exhausted:
+        while not exhausted and len(pending) < max_pending:
+            try:
+                pid, page = next(pages)
+            except StopIteration:
+                exhausted = True
+                continue
+
+            digest = page_digest(page) if results is not None else None
+            player = results.get(digest, pid) if results is not None else None
+            if player is not None:
+                yield pid, player
+            else:
+                pending[pool.submit(_timed_scrape_player_page, page, pid)] = pid, digest
+
+        if not pending:
+            continue
+        finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in finished:
+            pid, digest = pending.pop(future)
+            try:
+                player, timings = future.result()
+            except Exception as e:
+                logger.exception(f"[{pid}] - Parsing failed: {e}")
+                yield pid, None
+            else:
+                record_parse_timings(timings, counters)
+                if results is not None:
+                    results.store(digest, player)
+                yield pid, player
+
+
+def fetch_player_pages(pids, cache=None, limiter=None, counters=None, on_error=None, refresh=False):
+    """Lazily fetches player pages and yields (pid, page), failed requests are passed to on_error(pid, exception)"""
+    for pid in pids:
+        start = time.perf_counter()
+        try:
+            page = fetch_player_page(pid, cache=cache, limiter=limiter, refresh=refresh)
+        except requests.exceptions.RequestException as e:
+            logger.error(f"[{pid}] - {e}")
+            if on_error is not None:
+                on_error(pid, e)
+        else:
+            if counters is not None:
+                counters.add('player_fetch', elapsed=time.perf_counter() - start)
+            yield pid, page
+
+
+def retry_failed_players(planner, pool, max_pending, cache=None, limiter=None, counters=None, results=None,
+                         write=None, refresh=False):
+    """Second pass over the dead-letter queue: players whose fetch or parse failed are tried once more, and marked done
+    once written with `write` (db_handling.add_players by default). Those that fail again stay in the queue for the next
+    run. Returns the number of players recovered and what `write` returned."""
+    pids = planner.failed_players()
+    if not pids:
+        return 0, None
+
+    logger.info(f"Retrying {len(pids)} failed players...")
+    players, done = [], []
+    pages = fetch_player_pages(pids, cache, limiter, counters, refresh=refresh,
+                               on_error=lambda pid, e: planner.players_failed([pid], describe_error(e)))
 
+    for pid, player in parse_in_pool(pool, pages, max_pending, counters, results):
+        if player is None:
+            continue
+        done.append(pid)
+        if player.start_year >= 1960:
+            players.append(player)
 
-def run_scraping_pipeline(start, end, team, wipe=False):
+    written = (write or db_handling.add_players)(players)
+    planner.players_done(done)
+    logger.info(f"{len(done)} of {len(pids)} failed players recovered.")
+    return len(done), written
 
-    cooldown = 2.1
+
+@exports_metrics
+def run_scraping_pipeline(start, end, team, wipe=False, rate=DEFAULT_RATE, workers=None, cache_dir=DEFAULT_CACHE_DIR,
+                          batch_size=100, max_delay=DEFAULT_MAX_DELAY):
+    """Scrapes the rosters of a team between two seasons, and all the players found on them.
+
+    Pages are fetched one after the other by the main thread, throttled by a per-host token bucket, while the parsing
+    is handed off to a pool of worker processes. Downloaded pages are kept in the page cache in `cache_dir` (None to
+    disable it), so a rerun only hits the network for pages it has never seen, and only parses the pages whose HTML or
+    parser changed since they were last parsed. Parsed players are streamed to the database in micro-batches of
+    `batch_size` players, or every `max_delay` seconds, and checkpointed in the ScrapeJob table, so a rerun skips them.
+    Per-stage throughput is logged at the end of the run.
+    """
+    counters = StageCounters()
+    limiter = HostRateLimiter(rate, counters=counters)
+    cache = PageCache(cache_dir) if cache_dir is not None else None
+    results = ResultCache(cache_dir) if cache_dir is not None else None
+    planner = JobPlanner()
+    max_pending = 2 * (workers or os.cpu_count() or 1)
     pid_set = set()
 
+    def failed(pid, e):
+        planner.players_failed([pid], describe_error(e))
+        progress.advance(player_task)
+
     progress = setup_progress_bar()
 
     # Wipe the database if necessary, otherwise load existing players so they are not scraped again
+    if wipe:
+        db_handling.reset()
+        planner.reset()
+    else:
+        db_handling.migrate()
+        pid_set = pid_set | db_handling.get_all_pids() | planner.done_players()
+
+    writer = StreamingWriter(checkpoint=planner.players_done, batch_size=batch_size, max_delay=max_delay,
+                             counters=counters)
+
+    with progress, ProcessPoolExecutor(max_workers=workers) as pool:
+        with writer:
+            team_task = progress.add_task('Scraping teams...', total=(end - start + 1))
+
+            for year in range(start, end+1):
+                # Roster page, closed seasons come from the roster index
+                temp_set = (fetch_roster_pids(team, year, planner, cache, limiter, counters) or set()) - pid_set
+
+                player_task = progress.add_task('Scraping players...', total=len(temp_set))
+                pid_set = pid_set | temp_set
+                planner.plan_players(temp_set)
+
+                # Pages are fetched at the allowed rate while the workers parse the previous ones
+                pages = fetch_player_pages(temp_set, cache, limiter, counters, on_error=failed)
+                for pid, player in parse_in_pool(pool, pages, max_pending, counters, results):
+                    if player is None:
+                        planner.players_failed([pid], 'parsing failed')
+                    else:
+                        writer.put(pid, player if player.start_year >= 1960 else None)
+
+                    progress.advance(player_task)
+
+                progress.remove_task(player_task)
+                progress.advance(team_task)
+
+        # Once every player of the main pass is checkpointed
+        retry_failed_players(planner, pool, max_pending, cache, limiter, counters, results)
+
+    counters.log(logger)
+    if cache is not None:
+        cache.log_stats()
+        cache.close()
+        results.log_stats()
+        results.close()
+
+
+def _load_checkpoint(path):
+    if not os.path.exists(path):
+        return set()
+    with open(path) as file:
+        return {line.strip() for line in file if line.strip()}
+
+
+def _write_checkpoint(path, pids):
+    with open(path, 'a') as file:
+        file.writelines(f"{pid}\n" for pid in pids)
+
+
+@exports_metrics
+def run_reparse_pipeline(source, wipe=False, workers=None, batch_size=500, checkpoint=REPARSE_CHECKPOINT,
+                         results_dir=None):
+    """Rebuilds the database from saved player pages, without any network access.
+
+    `source` is a directory of .htm files, a zip/tar archive of them, or a page cache directory. Pages are parsed by a
+    pool of worker processes and the players are written to the database in batches of `batch_size`. The pids of every
+    committed batch are appended to the `checkpoint` file, so an interrupted run picks up where it stopped. With a
+    `results_dir`, players are kept in its parsed result cache and pages unchanged since the last parse are not parsed.
+    """
+    if wipe:
+        db_handling.reset()
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+    else:
+        db_handling.migrate()
+
+    done = _load_checkpoint(checkpoint)
+    if done:
+        logger.info(f"Resuming from checkpoint, skipping {len(done)} pages.")
+
+    pages = ((pid, page) for (pid, page) in iter_saved_pages(source) if pid not in done)
+
+    parsed = 0
+    start = time.perf_counter()
+    writer = StreamingWriter(checkpoint=lambda pids: _write_checkpoint(checkpoint, pids), batch_size=batch_size)
+    results = ResultCache(results_dir) if results_dir is not None else None
+
+    with ProcessPoolExecutor(max_workers=workers) as pool, writer:
+        for pid, player in parse_in_pool(pool, pages, 4 * (workers or os.cpu_count() or 1), results=results):
+            if player is None:
+                continue
+
+            parsed += 1
+            writer.put(pid, player if player.start_year >= 1960 else None)
+
+            if parsed % batch_size == 0:
+                elapsed = time.perf_counter() - start
+                logger.info(f"{parsed} pages parsed ({parsed / elapsed:.1f} pages/s)")
+
+    if results is not None:
+        results.log_stats()
+        results.close()
+
+    elapsed = time.perf_counter() - start
+    logger.info(f"Reparse done: {parsed} pages in {elapsed:.1f}s ({parsed / elapsed if elapsed else 0:.1f} pages/s)")
+    return parsed
+
+
+@exports_metrics
+def run_league_pipeline(start, end, teams=None, wipe=False, rate=DEFAULT_RATE, workers=None, batch_size=100,
+                        cache_dir=DEFAULT_CACHE_DIR, max_delay=DEFAULT_MAX_DELAY):
+    """Scrapes every roster of every team in teams.json between two seasons (or only `teams`), then every player found.
+
+    All the rosters are scraped first, so that players who appear on several of them are fetched only once. Each roster
+    and player job is recorded in the ScrapeJob table: a new run with the same arguments skips the rosters and players
+    already done, and retries the ones that failed. Rosters of closed seasons found in the roster index, filled by any
+    previous run, are not requested at all.
+    """
+    counters = StageCounters()
+    limiter = HostRateLimiter(rate, counters=counters)
+    cache = PageCache(cache_dir) if cache_dir is not None else None
+    results = ResultCache(cache_dir) if cache_dir is not None else None
+
     if wipe:
         db_handling.reset()
     else:
-        pid_set = pid_set | db_handling.get_all_pids()
+        db_handling.migrate()
+    planner = JobPlanner()
+    if wipe:
+        planner.reset()
+    max_pending = 2 * (workers or os.cpu_count() or 1)
+
+    progress = setup_progress_bar()
 
     with progress:
-        team_task = progress.add_task('Scraping teams...', total=(end - start + 1))
+        # Rosters
+        keys = planner.plan_rosters(start, end, teams)
+        rosters = planner.pending_rosters(keys)
+        logger.info(f"{len(rosters)} of {len(keys)} rosters left to scrape.")
+        roster_task = progress.add_task('Scraping rosters...', total=len(rosters))
+
+        for team, year in rosters:
+            pids = fetch_roster_pids(team, year, planner, cache, limiter, counters)
+            if pids is None:
+                planner.roster_failed(team, year)
+            else:
+                planner.roster_done(team, year, pids)
+            progress.advance(roster_task)
+
+        progress.remove_task(roster_task)
+
+        # Players, deduplicated across all rosters and skipping the ones already in the database
+        pids = planner.roster_pids(keys) - db_handling.get_stored_pids()
+        planner.plan_players(pids)
+        pending = planner.pending_players(pids)
+        logger.info(f"{len(pending)} players left to scrape.")
+        player_task = progress.add_task('Scraping players...', total=len(pending))
+
+        def failed(pid, e):
+            planner.players_failed([pid], describe_error(e))
+            progress.advance(player_task)
+
+        writer = StreamingWriter(checkpoint=planner.players_done, batch_size=batch_size, max_delay=max_delay,
+                                 counters=counters)
 
-        for year in range(start, end+1):
-            time.sleep(cooldown)
-            player_list = []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            with writer:
+                pages = fetch_player_pages(pending, cache, limiter, counters, on_error=failed)
+                for pid, player in parse_in_pool(pool, pages, max_pending, counters, results):
+                    progress.advance(player_task)
+                    if player is None:
+                        planner.players_failed([pid], 'parsing failed')
+                    else:
+                        writer.put(pid, player if player.start_year >= 1960 else None)
+
+            # Once every player of the main pass is checkpointed
+            retry_failed_players(planner, pool, max_pending, cache, limiter, counters, results)
+
+    counters.log(logger)
+    if cache is not None:
+        cache.log_stats()
+        cache.close()
+        results.log_stats()
+        results.close()
+
+
+@exports_metrics
+def run_update_pipeline(season=None, teams=None, rate=DEFAULT_RATE, workers=None, batch_size=100,
+                        cache_dir=DEFAULT_CACHE_DIR, max_delay=DEFAULT_MAX_DELAY):
+    """Refreshes the players of the current season instead of rebuilding the whole database.
+
+    Players whose last season is the previous or the current one, and every player on a roster of the current season,
+    are fetched again (cached pages are revalidated). Only the seasons that are new or changed are written. Returns the
+    number of season rows written.
+    """
+    season = season or current_season()
+    counters = StageCounters()
+    limiter = HostRateLimiter(rate, counters=counters)
+    cache = PageCache(cache_dir) if cache_dir is not None else None
+    results = ResultCache(cache_dir) if cache_dir is not None else None
+    planner = JobPlanner()
+    max_pending = 2 * (workers or os.cpu_count() or 1)
+
+    pids = db_handling.get_active_pids(season - 1)
+    progress = setup_progress_bar()
+
+    with progress:
+        # Current rosters bring in rookies and players coming back
+        rosters = expand_roster_jobs(season, season, teams)
+        roster_task = progress.add_task('Scraping rosters...', total=len(rosters))
+        for team, year in rosters:
+            pids |= fetch_roster_pids(team, year, planner, cache, limiter, counters) or set()
+            progress.advance(roster_task)
+        progress.remove_task(roster_task)
 
-            temp_set = fetch_and_scrape_player_ids(team, year, pid_set)
+        logger.info(f"Updating {len(pids)} players of the {season} season...")
+        player_task = progress.add_task('Updating players...', total=len(pids))
 
-            player_task = progress.add_task('Scraping players...', total=len(temp_set))
-            pid_set = pid_set | temp_set
+        def failed(pid, e):
+            planner.players_failed([pid], describe_error(e))
+            progress.advance(player_task)
 
-            for pid in temp_set:
-                time.sleep(cooldown)
-                try:
-                    player = fetch_and_scrape_player_page(pid)
-                except requests.exceptions.ConnectionError as e:
-                    print(e)
-                else:
-                    if player.start_year >= 1960:
-                        player_list.append(player)
+        writer = StreamingWriter(db_handling.update_players, batch_size=batch_size, max_delay=max_delay,
+                                 counters=counters)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            with writer:
+                pages = fetch_player_pages(sorted(pids), cache, limiter, counters, on_error=failed, refresh=True)
+                for pid, player in parse_in_pool(pool, pages, max_pending, counters, results):
+                    progress.advance(player_task)
+                    if player is None:
+                        planner.players_failed([pid], 'parsing failed')
+                    elif player.start_year >= 1960:
+                        writer.put(pid, player)
 
-                progress.advance(player_task)
+            # Recovered players are updated like the others, and their pages revalidated as well
+            _, retried = retry_failed_players(planner, pool, max_pending, cache, limiter, counters, results,
+                                              write=db_handling.update_players, refresh=True)
+        written = writer.written + (retried or 0)
 
-            progress.remove_task(player_task)
-            progress.advance(team_task)
+    counters.log(logger)
+    if cache is not None:
+        cache.log_stats()
+        cache.close()
+        results.log_stats()
+        results.close()
 
-            db_handling.add_players(player_list)
+    return written
@@ -1,11 +1,20 @@
+from peewee import chunked
+
 from ..config import setup_logging
-from nfl_fpca.database.db_model import db, PlayerInfo, SeasonStats
+from ..metrics import get_metrics
+from nfl_fpca.database.db_model import SCHEMA_VERSION, db, PlayerInfo, SeasonStats
 from ..models.player import Player
 
 
 # Configure module logger from config file
 logger = setup_logging(__name__, 'logs/database.log')
 
+# Number of players written per transaction
+CHUNK_SIZE = 500
+
+# Most values one statement can bind on SQLite builds with the default limit, bulk inserts are split to stay below it
+SQLITE_MAX_VARIABLE_NUMBER = 32766
+
 
 @db.connection_context()
 def reset():
@@ -13,71 +22,223 @@ def reset():
         logger.info('Wiping database...')
         db.drop_tables([PlayerInfo, SeasonStats], safe=True)
         db.create_tables([PlayerInfo, SeasonStats])
+        db.pragma('user_version', SCHEMA_VERSION)
     except Exception as e:
         logger.exception(e)
     else:
         logger.info('Database wiped!')
 
 
+def schema_version():
+    return db.pragma('user_version')
+
+
+@db.connection_context()
+def migrate():
+    """Brings a database written by an older version up to SCHEMA_VERSION. Missing tables and indexes are created, and
+    the statistics used by the query planner to choose between indexes are refreshed. Returns the previous version."""
+    version = schema_version()
+    if version >= SCHEMA_VERSION:
+        return version
+
+    logger.info(f"Migrating database from schema version {version} to {SCHEMA_VERSION}...")
+    with db.atomic():
+        db.create_tables([PlayerInfo, SeasonStats], safe=True)
+    db.execute_sql('ANALYZE')
+    db.pragma('user_version', SCHEMA_VERSION)
+    logger.info('Database migrated!')
+    return version
+
+
+def player_info_row(player):
+    return {'pid': player.pid,
+            'first_name': player.first_name,
+            'last_name': player.last_name,
+            'position': player.position,
+            'position_group': player.position_group,
+            'height': player.height,
+            'weight': player.weight,
+            'start_year': player.start_year,
+            'start_age': player.start_age,
+            'career_length': player.career_length,
+            'retired': player.retired,
+            'dash': player.dash,
+            'bench': player.bench,
+            'broad': player.broad,
+            'shuttle': player.shuttle,
+            'cone': player.cone,
+            'vertical': player.vertical, }
+
+
+def season_stats_rows(player):
+    return [{'pid': player.pid,
+             'year': year,
+             'position': pos,
+             'games_played': gp,
+             'games_started': gs,
+             'approx_value': av, } for (year, pos, gp, gs, av) in player.seasons.tolist()]
+
+
+def _upsert(model, rows, conflict_target):
+    """Inserts rows, replacing the values of the ones that already exist. Rows are inserted in as many statements as
+    needed to bind fewer than SQLITE_MAX_VARIABLE_NUMBER values each."""
+    if rows:
+        keys = {field.name for field in conflict_target}
+        preserve = [field for field in model._meta.sorted_fields if field.name not in keys]
+        for chunk in chunked(rows, SQLITE_MAX_VARIABLE_NUMBER // len(rows[0])):
+            model.insert_many(chunk).on_conflict(conflict_target=conflict_target, preserve=preserve).execute()
+
+
+def _delete_seasons(pids):
+    for chunk in chunked(pids, SQLITE_MAX_VARIABLE_NUMBER):
+        SeasonStats.delete().where(SeasonStats.pid.in_(chunk)).execute()
+
+
+def _write_players(players):
+    _upsert(PlayerInfo, [player_info_row(player) for player in players], [PlayerInfo.pid])
+    # Seasons are replaced as a whole, so that the ones no longer on a player's page do not linger
+    _delete_seasons([player.pid for player in players])
+    _upsert(SeasonStats, [row for player in players for row in season_stats_rows(player)],
+            [SeasonStats.pid, SeasonStats.year])
+
+
 @db.connection_context()
-def add_players(player_list):
+def add_players(player_list, chunk_size=CHUNK_SIZE):
+    """Writes players and their seasons in one transaction per chunk of players. Players that are already in the
+    database have their rows updated."""
     logger.info(f"Adding {len(player_list)} players to database...")
-    for player in player_list:
-        # PlayerInfo table
-        logger.debug(f"[{player.pid}] - Adding player...")
+    added = 0
+    for chunk in chunked(player_list, chunk_size):
         try:
-            PlayerInfo.create(pid=player.pid,
-                              first_name=player.first_name,
-                              last_name=player.last_name,
-                              position=player.position,
-                              position_group=player.position_group,
-                              height=player.height,
-                              weight=player.weight,
-                              start_year=player.start_year,
-                              start_age=player.start_age,
-                              career_length=player.career_length,
-                              retired=player.retired,
-                              dash=player.dash,
-                              bench=player.bench,
-                              broad=player.broad,
-                              shuttle=player.shuttle,
-                              cone=player.cone,
-                              vertical=player.vertical, )
-
-            # SeasonStats table
-            for year, val in player.stats.items():
-                SeasonStats.create(pid=player.pid,
-                                   year=year,
-                                   position=val['pos'],
-                                   games_played=val['gp'],
-                                   games_started=val['gs'],
-                                   approx_value=val['av'], )
+            with get_metrics().timer('db_write_seconds', op='add'), db.atomic():
+                _write_players(chunk)
         except Exception as e:
+            # Retry the chunk one player at a time so that a single bad player does not drop the others
             logger.exception(e)
+            for player in chunk:
+                logger.debug(f"[{player.pid}] - Adding player...")
+                try:
+                    with db.atomic():
+                        _write_players([player])
+                except Exception as e:
+                    logger.exception(e)
+                else:
+                    added += 1
+        else:
+            added += len(chunk)
+
+    get_metrics().inc('db_players_written', added, op='add')
+    logger.info(f"{added} players added to database!")
+
+
+@db.connection_context()
+def update_players(player_list):
+    """Incremental counterpart of add_players: player info is upserted, but only the seasons that are new or whose
+    stats changed are written, and the ones no longer on the players' pages deleted. Returns the number of season rows
+    written."""
+    pids = [player.pid for player in player_list]
+
+    # Seasons already in the database, in one query per chunk of players
+    stored = dict()
+    for chunk in chunked(pids, CHUNK_SIZE):
+        query = (SeasonStats
+                 .select(SeasonStats.pid, SeasonStats.year, SeasonStats.position, SeasonStats.games_played,
+                         SeasonStats.games_started, SeasonStats.approx_value)
+                 .where(SeasonStats.pid.in_(chunk))
+                 .tuples())
+        for pid, year, *values in query:
+            stored[(pid, year)] = tuple(values)
+
+    rows = [row for player in player_list for row in season_stats_rows(player)]
+    changed = [row for row in rows
+               if stored.get((row['pid'], row['year'])) != (row['position'], row['games_played'],
+                                                            row['games_started'], row['approx_value'])]
+    stale = set(stored) - {(row['pid'], row['year']) for row in rows}
+
+    with get_metrics().timer('db_write_seconds', op='update'), db.atomic():
+        for chunk in chunked(player_list, CHUNK_SIZE):
+            _upsert(PlayerInfo, [player_info_row(player) for player in chunk], [PlayerInfo.pid])
+        for chunk in chunked(changed, CHUNK_SIZE):
+            _upsert(SeasonStats, chunk, [SeasonStats.pid, SeasonStats.year])
+        for pid, year in stale:
+            SeasonStats.delete().where((SeasonStats.pid == pid) & (SeasonStats.year == year)).execute()
 
-    logger.info(f"{len(player_list)} players added to database!")
+    get_metrics().inc('db_players_written', len(player_list), op='update')
+    get_metrics().inc('db_seasons_written', len(changed), op='update')
+    logger.info(f"{len(player_list)} players updated, {len(changed)} seasons written.")
+    return len(changed)
 
 
 # ----- QUERIES --------------------------------------------------------------------------------------------------------
 
+COMBINE_FIELDS = ('dash', 'bench', 'broad', 'shuttle', 'cone', 'vertical')
+
+
+def cohort_query(positions=None, start_year=1960, end_year=None, career_length=0, max_career_length=None, retired=1,
+                 combine=None):
+    """Query of the players of a cohort.
+
+    positions are position groups, start_year and end_year bound the first season of the players (both included),
+    career_length and max_career_length the number of seasons. retired=None keeps both active and retired players.
+    combine maps combine measurements to (min, max) bounds, either of which can be None, e.g. {'dash': (None, 4.5)}.
+    Players without the measurement are left out.
+
+    Position group, retired and start year are served by the indexes of PlayerInfo, the other filters are applied to the
+    rows they select.
+    """
+    query = PlayerInfo.select()
+
+    if positions:
+        query = query.where(PlayerInfo.position_group.in_(positions))
+    if retired is not None:
+        query = query.where(PlayerInfo.retired == retired)
+    if start_year is not None:
+        query = query.where(PlayerInfo.start_year >= start_year)
+    if end_year is not None:
+        query = query.where(PlayerInfo.start_year <= end_year)
+    if career_length:
+        query = query.where(PlayerInfo.career_length >= career_length)
+    if max_career_length is not None:
+        query = query.where(PlayerInfo.career_length <= max_career_length)
+
+    for name, (low, high) in (combine or {}).items():
+        if name not in COMBINE_FIELDS:
+            raise ValueError(f"Unknown combine measurement {name}, expected one of {COMBINE_FIELDS}")
+        column = getattr(PlayerInfo, name)
+        query = query.where(column.is_null(False))
+        if low is not None:
+            query = query.where(column >= low)
+        if high is not None:
+            query = query.where(column <= high)
+
+    return query
+
+
+def player_query(positions=None, start_year=1960, career_length=0, retired=1):
+    """Query of the players matching the filters, shared by all loaders"""
+    return cohort_query(positions, start_year, career_length=career_length, retired=retired)
+
+
+def query_plan(query):
+    """Details of the EXPLAIN QUERY PLAN rows of a query, e.g. 'SEARCH playerinfo USING INDEX ...'"""
+    sql, params = query.sql()
+    return [row[-1] for row in db.execute_sql(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()]
+
+
+@db.connection_context()
+def get_cohort_pids(**filters):
+    """Pids of the players of a cohort, see cohort_query for the filters"""
+    query = cohort_query(**filters).select(PlayerInfo.pid)
+    return {pid for (pid,) in query.tuples()}
+
+
 @db.connection_context()
 def get_all_pids(positions=None, start_year=1960, career_length=0, retired=1):
     all_pids = set()
     try:
         logger.info('Loading players from database...')
-        # Build the query
-        query = (PlayerInfo.select()
-                 .where(PlayerInfo.start_year >= start_year)
-                 .where(PlayerInfo.career_length >= career_length)
-                 .where(PlayerInfo.retired == retired))
-
-        if positions:
-            query = query.where(PlayerInfo.position_group.in_(positions))
-
-        # Iterate through the query
-        for player in query:
-            logger.debug(f"[{player.pid}] - Loading...")
-            all_pids.add(player.pid)
+        query = player_query(positions, start_year, career_length, retired).select(PlayerInfo.pid)
+        all_pids = {pid for (pid,) in query.tuples()}
     except Exception as e:
         logger.exception(e)
     else:
@@ -86,6 +247,20 @@ def get_all_pids(positions=None, start_year=1960, career_length=0, retired=1):
     return all_pids
 
 
+@db.connection_context()
+def get_stored_pids():
+    """Every player in the database, whatever his career"""
+    return {pid for (pid,) in PlayerInfo.select(PlayerInfo.pid).tuples()}
+
+
+@db.connection_context()
+def get_active_pids(since):
+    """Players whose last season is `since` or later"""
+    last_year = PlayerInfo.start_year + PlayerInfo.career_length - 1
+    query = PlayerInfo.select(PlayerInfo.pid).where(last_year >= since)
+    return {pid for (pid,) in query.tuples()}
+
+
 @db.connection_context()
 def load_player(pid):
     """Requests enrties with pid and creates a player object"""
@@ -98,3 +273,70 @@ def load_player(pid):
     player.set_from_db(player_info, season_stats_list)
 
     return player
+
+
+def _iter_player_rows(players):
+    """Yields (player_info, season_stats_list) for every player of a PlayerInfo query.
+
+    Only two queries are run, one for PlayerInfo and one for SeasonStats, both sorted by pid. Their cursors are then
+    walked side by side, so rows are joined in memory without holding the whole result.
+    """
+    info_query = players.order_by(PlayerInfo.pid).namedtuples()
+    stats_query = (SeasonStats
+                   .select(SeasonStats.pid, SeasonStats.year, SeasonStats.position, SeasonStats.games_played,
+                           SeasonStats.games_started, SeasonStats.approx_value)
+                   .where(SeasonStats.pid.in_(players.select(PlayerInfo.pid)))
+                   .order_by(SeasonStats.pid, SeasonStats.year)
+                   .namedtuples())
+
+    stats_rows = iter(stats_query.iterator())
+    stat = next(stats_rows, None)
+
+    for info in info_query.iterator():
+        season_stats_list = []
+        while (stat is not None) and (stat.pid <= info.pid):
+            if stat.pid == info.pid:
+                season_stats_list.append(stat)
+            stat = next(stats_rows, None)
+        yield info, season_stats_list
+
+
+def _to_columns(rows):
+    """Turns a chunk of (player_info, season_stats_list) into two tables of columns"""
+    info_fields = [field.name for field in PlayerInfo._meta.sorted_fields]
+    stats_fields = ['pid', 'year', 'position', 'games_played', 'games_started', 'approx_value']
+
+    info = {name: [getattr(player_info, name) for (player_info, _) in rows] for name in info_fields}
+    seasons = {name: [getattr(stat, name) for (_, stats) in rows for stat in stats] for name in stats_fields}
+    return {'info': info, 'seasons': seasons}
+
+
+def _to_player(player_info, season_stats_list):
+    player = Player(player_info.pid)
+    player.set_from_db(player_info, season_stats_list)
+    return player
+
+
+def load_players(positions=None, start_year=1960, career_length=0, retired=1, chunk_size=CHUNK_SIZE, columnar=False):
+    """Loads every player matching the filters, in chunks of `chunk_size` players.
+
+    Yields lists of Player objects, or with `columnar=True`, dicts holding an 'info' and a 'seasons' table, each a dict
+    of column lists. Memory use is bounded by the chunk size, whatever the number of players.
+    """
+    yield from load_cohort(chunk_size, columnar, positions=positions, start_year=start_year,
+                           career_length=career_length, retired=retired)
+
+
+def load_cohort(chunk_size=CHUNK_SIZE, columnar=False, **filters):
+    """Same as load_players, for the players of a cohort (see cohort_query for the filters)"""
+    with db.connection_context():
+        chunk = []
+        for info, season_stats_list in _iter_player_rows(cohort_query(**filters)):
+            chunk.append((info, season_stats_list))
+            if len(chunk) >= chunk_size:
+                yield _to_columns(chunk) if columnar else [_to_player(*row) for row in chunk]
+                chunk = []
+
+        if chunk:
+            yield _to_columns(chunk) if columnar else [_to_player(*row) for row in chunk]
+
@@ -1,9 +1,44 @@
+import datetime
 import os
 from peewee import *
 
 
-DB_PATH = os.getcwd() + "/data/player.db"
-db = SqliteDatabase(DB_PATH)
+DB_PATH = os.path.join('data', 'player.db')
+
+# Write-ahead logging lets readers work while the scraper writes, and only needs a sync at checkpoints
+DB_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'cache_size': -64 * 1024,  # In KiB when negative, so 64 MiB
+}
+
+
+def default_db_path():
+    """data/player.db in the working directory at the time of the first connection, NFL_FPCA_DB to override it"""
+    return os.path.abspath(os.environ.get('NFL_FPCA_DB', DB_PATH))
+
+
+class LazySqliteDatabase(SqliteDatabase):
+    """Database whose path, unless set with init_db, is only resolved when it is first connected to"""
+
+    def connect(self, reuse_if_open=False):
+        if self.deferred:
+            path = default_db_path()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.init(path, pragmas=self._pragmas)
+        return super().connect(reuse_if_open)
+
+
+db = LazySqliteDatabase(None, pragmas=DB_PRAGMAS)
+
+# Stored in PRAGMA user_version, bumped whenever tables or indexes change (see db_handling.migrate)
+SCHEMA_VERSION = 1
+
+
+def init_db(path=None, **pragmas):
+    """Points the database to another file, with optional pragmas on top of the default ones. Without a path, it goes
+    back to the default one, resolved on the next connection."""
+    db.init(path, pragmas={**DB_PRAGMAS, **pragmas})
 
 
 class BaseModel(Model):
@@ -36,6 +71,14 @@ class PlayerInfo(BaseModel):
     cone = FloatField(null=True)
     vertical = FloatField(null=True)
 
+    class Meta:
+        # Cohort queries filter on position group, retired and an era of start years. SeasonStats needs none, its
+        # (pid, year) primary key already serves lookups by pid sorted by year.
+        indexes = (
+            (('position_group', 'retired', 'start_year'), False),
+            (('retired', 'start_year'), False),
+        )
+
 
 class SeasonStats(BaseModel):
     pid = ForeignKeyField(PlayerInfo)
@@ -47,3 +90,29 @@ class SeasonStats(BaseModel):
 
     class Meta:
         primary_key = CompositeKey('pid', 'year')
+
+
+class ScrapeJob(BaseModel):
+    """State of the roster and player jobs of a scraping run, so that an interrupted run resumes where it stopped"""
+    kind = CharField()  # 'roster' or 'player'
+    key = CharField()  # 'crd/1975' for a roster, the pid for a player
+    status = CharField(default='pending')  # 'pending', 'done' or 'failed'
+    result = TextField(null=True)  # Player IDs found on a roster
+    updated_at = DateTimeField(default=datetime.datetime.now)
+
+    class Meta:
+        primary_key = CompositeKey('kind', 'key')
+
+
+class RosterIndex(BaseModel):
+    """Player IDs found on each team-season roster page, kept across runs. Rosters of closed seasons never change, once
+    indexed they are marked immutable and not requested again."""
+    team = CharField()
+    year = IntegerField()
+    pids = TextField()  # JSON list
+    digest = CharField()  # Hash of the page the pids were parsed from
+    fetched_at = DateTimeField(default=datetime.datetime.now)
+    immutable = BooleanField(default=False)
+
+    class Meta:
+        primary_key = CompositeKey('team', 'year')
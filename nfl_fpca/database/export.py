@@ -0,0 +1,295 @@
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+from peewee import chunked
+
+from ..config import setup_logging
+from .db_handling import CHUNK_SIZE, _upsert
+from .db_model import PlayerInfo, SeasonStats, db
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Configure module logger from config file
+logger = setup_logging(__name__, 'logs/database.log')
+
+EXPORT_DIR = os.path.join('data', 'export')
+MANIFEST = 'manifest.json'
+FORMATS = ('parquet', 'arrow', 'npy')
+EXTENSIONS = {'parquet': '.parquet', 'arrow': '.arrow', 'npy': ''}
+
+PLAYER_COLUMNS = [field.name for field in PlayerInfo._meta.sorted_fields]
+SEASON_COLUMNS = ['pid', 'year', 'position', 'games_played', 'games_started', 'approx_value']
+TABLES = {'players': PLAYER_COLUMNS, 'seasons': SEASON_COLUMNS}
+
+# Columns that can be NULL are stored as floats with NaN in .npy files, strings are stored with '' for NULL
+STRING_COLUMNS = {'pid', 'first_name', 'last_name', 'position', 'position_group'}
+NULLABLE_COLUMNS = {'dash', 'bench', 'broad', 'shuttle', 'cone', 'vertical'}
+
+
+def default_format():
+    """Parquet when pyarrow is installed, plain .npy columns otherwise"""
+    return 'parquet' if pa is not None else 'npy'
+
+
+def _check_format(fmt):
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt}, expected one of {FORMATS}")
+    if fmt != 'npy' and pa is None:
+        raise ImportError(f"pyarrow is needed for the {fmt} format")
+
+
+# ----- PARTITIONS -----------------------------------------------------------------------------------------------------
+
+def _group_name(position_group):
+    # Position groups like N/A cannot be a directory name as they are
+    return (position_group or 'unknown').replace('/', '_')
+
+
+def partition_key(position_group, start_year):
+    """Partitions hold the players of a position group who started in the same decade, along with their seasons"""
+    return _group_name(position_group), (start_year // 10) * 10
+
+
+def partition_dir(root, key):
+    group, decade = key
+    return os.path.join(root, f"position_group={group}", f"decade={decade}")
+
+
+def _partition_name(key):
+    return f"{key[0]}/{key[1]}"
+
+
+def _partition_groups():
+    """{partition key: position groups stored in it}, from the distinct position groups and decades of the players"""
+    decade = (PlayerInfo.start_year / 10) * 10
+    query = PlayerInfo.select(PlayerInfo.position_group, decade).distinct().tuples()
+    keys = dict()
+    for group, start in query:
+        keys.setdefault(partition_key(group, start), set()).add(group)
+    return keys
+
+
+def _fetch_partition(key, groups):
+    """Player and season rows of one partition, as tuples in the column order of TABLES"""
+    decade = key[1]
+    in_groups = PlayerInfo.position_group.in_([group for group in groups if group is not None])
+    if None in groups:
+        in_groups |= PlayerInfo.position_group.is_null()
+    where = in_groups & (PlayerInfo.start_year >= decade) & (PlayerInfo.start_year < decade + 10)
+
+    players = (PlayerInfo
+               .select(*[getattr(PlayerInfo, name) for name in PLAYER_COLUMNS])
+               .where(where)
+               .order_by(PlayerInfo.pid))
+    seasons = (SeasonStats
+               .select(SeasonStats.pid, SeasonStats.year, SeasonStats.position, SeasonStats.games_played,
+                       SeasonStats.games_started, SeasonStats.approx_value)
+               .join(PlayerInfo, on=(SeasonStats.pid == PlayerInfo.pid))
+               .where(where)
+               .order_by(SeasonStats.pid, SeasonStats.year))
+    return list(players.tuples()), list(seasons.tuples())
+
+
+def _iter_partitions():
+    """Yields (partition key, player rows, season rows), one partition in memory at a time"""
+    with db.connection_context():
+        for key, groups in sorted(_partition_groups().items()):
+            yield key, *_fetch_partition(key, groups)
+
+
+def _digest(player_rows, season_rows):
+    return hashlib.sha1(repr((player_rows, season_rows)).encode('utf-8')).hexdigest()
+
+
+# ----- WRITING --------------------------------------------------------------------------------------------------------
+
+def _to_columns(rows, names):
+    """Rows to a dict of NumPy columns"""
+    columns = dict()
+    for i, name in enumerate(names):
+        values = [row[i] for row in rows]
+        if name in STRING_COLUMNS:
+            columns[name] = np.array(['' if val is None else val for val in values], dtype=str)
+        elif name in NULLABLE_COLUMNS:
+            columns[name] = np.array([np.nan if val is None else val for val in values], dtype=float)
+        else:
+            columns[name] = np.array(values, dtype=np.int64)
+    return columns
+
+
+def _to_arrow(rows, names):
+    return pa.table({name: pa.array([row[i] for row in rows]) for i, name in enumerate(names)})
+
+
+def _write_table(directory, table, rows, fmt):
+    names = TABLES[table]
+    path = os.path.join(directory, f"{table}{EXTENSIONS[fmt]}")
+
+    if fmt == 'parquet':
+        pq.write_table(_to_arrow(rows, names), path)
+    elif fmt == 'arrow':
+        # Uncompressed so that the file can be memory-mapped without decoding
+        feather.write_feather(_to_arrow(rows, names), path, compression='uncompressed')
+    else:
+        os.makedirs(path)
+        for name, column in _to_columns(rows, names).items():
+            np.save(os.path.join(path, f"{name}.npy"), column)
+
+
+def _write_partition(root, key, player_rows, season_rows, fmt):
+    """Writes a partition next to the previous one, then swaps them, so that readers never see half of it"""
+    directory = partition_dir(root, key)
+    tmp_dir = f"{directory}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    _write_table(tmp_dir, 'players', player_rows, fmt)
+    _write_table(tmp_dir, 'seasons', season_rows, fmt)
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp_dir, directory)
+
+
+def _remove_partition(root, name):
+    group, decade = name.split('/')
+    shutil.rmtree(partition_dir(root, (group, int(decade))), ignore_errors=True)
+
+
+def read_manifest(root=EXPORT_DIR):
+    path = os.path.join(root, MANIFEST)
+    if not os.path.exists(path):
+        return {'format': None, 'partitions': dict()}
+    with open(path) as file:
+        return json.load(file)
+
+
+def _write_manifest(root, manifest):
+    tmp_path = os.path.join(root, f"{MANIFEST}.tmp")
+    with open(tmp_path, 'w') as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+    os.replace(tmp_path, os.path.join(root, MANIFEST))
+
+
+def export_db(root=EXPORT_DIR, fmt=None, force=False):
+    """Exports PlayerInfo and SeasonStats to `root`, partitioned by position group and decade of the first season.
+
+    fmt is 'parquet', 'arrow' (Arrow IPC/Feather, memory-mappable) or 'npy' (one .npy file per column, which needs no
+    extra dependency). The export is incremental: a digest of each partition's rows is kept in the manifest, and only
+    the partitions whose rows changed are rewritten. Returns {'written': [...], 'unchanged': [...], 'removed': [...]}.
+    """
+    fmt = fmt or default_format()
+    _check_format(fmt)
+    os.makedirs(root, exist_ok=True)
+
+    manifest = read_manifest(root)
+    previous = manifest['partitions']
+    report = {'written': [], 'unchanged': [], 'removed': []}
+
+    # Nothing can be reused from an export in another format
+    if force or manifest['format'] != fmt:
+        for name in previous:
+            _remove_partition(root, name)
+        previous = dict()
+
+    entries = dict()
+    for key, player_rows, season_rows in _iter_partitions():
+        name = _partition_name(key)
+        digest = _digest(player_rows, season_rows)
+        if previous.get(name, {}).get('digest') == digest:
+            report['unchanged'].append(name)
+        else:
+            _write_partition(root, key, player_rows, season_rows, fmt)
+            report['written'].append(name)
+        entries[name] = {'digest': digest, 'players': len(player_rows), 'seasons': len(season_rows)}
+
+    for name in sorted(set(previous) - set(entries)):
+        _remove_partition(root, name)
+        report['removed'].append(name)
+
+    _write_manifest(root, {'format': fmt, 'partitions': entries})
+    logger.info(f"Export to {root}: {len(report['written'])} partitions written, {len(report['unchanged'])} unchanged, "
+                f"{len(report['removed'])} removed")
+    return report
+
+
+# ----- READING --------------------------------------------------------------------------------------------------------
+
+def read_partition(root, key, table='seasons', columns=None, fmt=None):
+    """Columns of one table of a partition as NumPy arrays. Arrow and .npy files are memory-mapped, so numeric columns
+    are read without a copy."""
+    fmt = fmt or read_manifest(root)['format']
+    _check_format(fmt)
+    columns = columns or TABLES[table]
+    path = os.path.join(partition_dir(root, key), f"{table}{EXTENSIONS[fmt]}")
+
+    if fmt == 'npy':
+        return {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r') for name in columns}
+
+    if fmt == 'arrow':
+        arrow_table = feather.read_table(path, columns=columns, memory_map=True)
+    else:
+        # The directory names look like hive partitions, which pyarrow would otherwise turn into extra columns
+        arrow_table = pq.read_table(path, columns=columns, memory_map=True, partitioning=None)
+    return {name: arrow_table.column(name).to_numpy() for name in columns}
+
+
+def iter_partitions(root=EXPORT_DIR, table='seasons', positions=None, decades=None, columns=None):
+    """Yields (key, columns) for the partitions of the given position groups and decades, all of them by default"""
+    manifest = read_manifest(root)
+    if positions is not None:
+        positions = {_group_name(group) for group in positions}
+    for name in sorted(manifest['partitions']):
+        group, decade = name.split('/')
+        if (positions is not None and group not in positions) or (decades is not None and int(decade) not in decades):
+            continue
+        key = (group, int(decade))
+        yield key, read_partition(root, key, table, columns, manifest['format'])
+
+
+def load_columns(root=EXPORT_DIR, table='seasons', positions=None, decades=None, columns=None):
+    """Columns of a table over several partitions, concatenated"""
+    names = columns or TABLES[table]
+    parts = [data for _, data in iter_partitions(root, table, positions, decades, columns)]
+    if not parts:
+        return {name: np.zeros(0) for name in names}
+    return {name: np.concatenate([part[name] for part in parts]) for name in names}
+
+
+def _from_column(name, value):
+    if name in STRING_COLUMNS:
+        return value or None if name in ('position', 'position_group') else value
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    if name in NULLABLE_COLUMNS:
+        return value
+    return int(value)
+
+
+@db.connection_context()
+def import_db(root=EXPORT_DIR):
+    """Writes an export back to the database, player and season rows are upserted. Returns the number of players."""
+    n_players = 0
+    for table, model, conflict_target in (('players', PlayerInfo, [PlayerInfo.pid]),
+                                          ('seasons', SeasonStats, [SeasonStats.pid, SeasonStats.year])):
+        for _, data in iter_partitions(root, table):
+            names = list(data)
+            rows = [{name: _from_column(name, value.item() if hasattr(value, 'item') else value)
+                     for name, value in zip(names, values)}
+                    for values in zip(*(data[name] for name in names))]
+            for chunk in chunked(rows, CHUNK_SIZE):
+                with db.atomic():
+                    _upsert(model, chunk, conflict_target)
+            if table == 'players':
+                n_players += len(rows)
+
+    logger.info(f"{n_players} players imported from {root}")
+    return n_players
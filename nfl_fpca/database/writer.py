@@ -0,0 +1,132 @@
+import queue
+import threading
+import time
+
+from ..config import setup_logging
+from ..metrics import get_metrics
+from . import db_handling
+
+# Configure module logger from config file
+logger = setup_logging(__name__, 'logs/database.log')
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_MAX_DELAY = 30.0  # Seconds, about 15 players at the default request rate
+
+_STOP = object()
+
+
+class StreamingWriter:
+    """Writes parsed players to the database from a thread of its own, as they come.
+
+    Players go through a bounded queue to the writer thread, which commits them in micro-batches: as soon as
+    `batch_size` players are waiting, or `max_delay` seconds after the first of them arrived. After each commit the pids
+    of the batch are passed to `checkpoint`, so that an interrupted run loses at most the batch being written. A full
+    queue blocks the producer, memory use is bounded by the queue and batch sizes whatever the number of players.
+
+    `write` is called with each list of players, db_handling.add_players by default. When it returns a count, like
+    update_players, the counts are summed in `written`.
+    """
+
+    def __init__(self, write=None, checkpoint=None, batch_size=DEFAULT_BATCH_SIZE, max_delay=DEFAULT_MAX_DELAY,
+                 max_queue=None, counters=None):
+        self.write = write or db_handling.add_players
+        self.checkpoint = checkpoint
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.counters = counters
+        self.queue = queue.Queue(maxsize=max_queue or 2 * batch_size)
+
+        self.written = 0
+        self.batches = 0
+        self.error = None
+        self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Players already parsed are written even if the producer failed
+        self.close()
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _put(self, item):
+        while self._thread.is_alive():
+            try:
+                self.queue.put(item, timeout=0.5)
+            except queue.Full:
+                continue
+            return True
+        return False
+
+    def put(self, pid, player=None):
+        """Queues a player. With player None the pid is only checkpointed, for players that are skipped on purpose.
+        Raises the error of the writer thread if it stopped."""
+        if self.error is not None or not self._put((pid, player)):
+            raise self.error or RuntimeError("The writer thread is not running")
+        get_metrics().set('writer_queue_depth', self.queue.qsize())
+
+    def close(self):
+        """Writes what is left and stops the writer thread, raises its error if it stopped on one"""
+        self._put(_STOP)
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+
+    # ----- WRITER THREAD ----------------------------------------------------------------------------------------------
+
+    def _run(self):
+        pids, players = [], []
+        deadline = None
+
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                break
+
+            if item is not None:
+                pid, player = item
+                pids.append(pid)
+                if player is not None:
+                    players.append(player)
+                if deadline is None:
+                    deadline = time.monotonic() + self.max_delay
+
+            if len(pids) >= self.batch_size:
+                reason = 'size'
+            elif deadline is not None and time.monotonic() >= deadline:
+                reason = 'time'
+            else:
+                continue
+
+            if not self._flush(pids, players, reason):
+                return
+            pids, players, deadline = [], [], None
+
+        if pids:
+            self._flush(pids, players, 'close')
+
+    def _flush(self, pids, players, reason):
+        start = time.perf_counter()
+        try:
+            written = self.write(players) if players else None
+            if self.checkpoint is not None:
+                self.checkpoint(pids)
+        except Exception as e:
+            logger.exception(f"Writing a batch of {len(players)} players failed: {e}")
+            self.error = e
+            return False
+
+        if self.counters is not None:
+            self.counters.add('db_write', count=len(players), elapsed=time.perf_counter() - start)
+        if isinstance(written, int):
+            self.written += written
+        self.batches += 1
+        get_metrics().inc('writer_batches', reason=reason)
+        return True
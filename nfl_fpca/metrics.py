@@ -0,0 +1,224 @@
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+
+from contextlib import contextmanager
+
+# Snapshots go next to the logs, a .prom extension switches to the Prometheus text format
+DEFAULT_METRICS_PATH = os.path.join('logs', 'metrics.json')
+PREFIX = 'nfl_fpca'
+
+# Upper bounds of the histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Count, sum, extremes and cumulative bucket counts of the observed values"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            self.bucket_counts[index] += 1
+
+    def cumulative(self):
+        total, counts = 0, []
+        for count in self.bucket_counts:
+            total += count
+            counts.append(total)
+        return counts
+
+    def snapshot(self):
+        return {'count': self.count,
+                'sum': round(self.sum, 6),
+                'mean': round(self.sum / self.count, 6) if self.count else 0.0,
+                'min': self.min,
+                'max': self.max,
+                'buckets': dict(zip(map(str, self.buckets), self.cumulative()))}
+
+
+class MetricsRegistry:
+    """Thread-safe store of counters, gauges and histograms, each identified by a name and a set of labels.
+
+    Snapshots can be exported as JSON or in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters = dict()
+            self.gauges = dict()
+            self.histograms = dict()
+            self.started = time.time()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    # ----- RECORDING --------------------------------------------------------------------------------------------------
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self.gauges[self._key(name, labels)] = value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Observes the time spent in the block, in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    # ----- EXPORT -----------------------------------------------------------------------------------------------------
+
+    def snapshot(self):
+        """All the metrics as a dict: {name: [{'labels': {...}, 'value': ...}]}"""
+        def entries(store, value):
+            result = dict()
+            for (name, labels), metric in sorted(store.items()):
+                result.setdefault(name, []).append({'labels': dict(labels), 'value': value(metric)})
+            return result
+
+        with self._lock:
+            return {'timestamp': time.time(),
+                    'uptime': round(time.time() - self.started, 3),
+                    'counters': entries(self.counters, lambda value: value),
+                    'gauges': entries(self.gauges, lambda value: value),
+                    'histograms': entries(self.histograms, Histogram.snapshot)}
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self):
+        """Snapshot in the Prometheus text exposition format"""
+        def label_str(labels, **extra):
+            labels = {**dict(labels), **extra}
+            if not labels:
+                return ''
+            return '{' + ','.join(f'{key}="{value}"' for key, value in labels.items()) + '}'
+
+        lines = []
+        with self._lock:
+            for kind, store in (('counter', self.counters), ('gauge', self.gauges)):
+                for name in sorted({name for (name, _) in store}):
+                    lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+                    lines.extend(f"{PREFIX}_{name}{label_str(labels)} {value}"
+                                 for (metric, labels), value in sorted(store.items()) if metric == name)
+
+            for name in sorted({name for (name, _) in self.histograms}):
+                lines.append(f"# TYPE {PREFIX}_{name} histogram")
+                for (metric, labels), histogram in sorted(self.histograms.items()):
+                    if metric != name:
+                        continue
+                    for bound, count in zip(histogram.buckets, histogram.cumulative()):
+                        lines.append(f"{PREFIX}_{name}_bucket{label_str(labels, le=bound)} {count}")
+                    lines.append(f"{PREFIX}_{name}_bucket{label_str(labels, le='+Inf')} {histogram.count}")
+                    lines.append(f"{PREFIX}_{name}_sum{label_str(labels)} {histogram.sum}")
+                    lines.append(f"{PREFIX}_{name}_count{label_str(labels)} {histogram.count}")
+
+        return '\n'.join(lines) + '\n'
+
+    def export(self, path):
+        """Writes a snapshot to a file, in the Prometheus format if its extension is .prom, in JSON otherwise"""
+        content = self.to_prometheus() if path.endswith('.prom') else self.to_json()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Written to a temporary file first so that a scraper never reads a half-written snapshot
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as file:
+            file.write(content)
+        os.replace(tmp_path, path)
+
+
+class PeriodicExporter:
+    """Exports the metrics every `interval` seconds from a background thread, and once more when stopped"""
+
+    def __init__(self, registry, path, interval):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='metrics', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.registry.export(self.path)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.registry.export(self.path)
+
+
+_metrics = MetricsRegistry()
+
+
+def get_metrics():
+    """Registry shared by the whole package"""
+    return _metrics
+
+
+@contextmanager
+def export_metrics(path=DEFAULT_METRICS_PATH, interval=None):
+    """Resets the metrics for a run, exports them every `interval` seconds if given, and at the end of the run. Does
+    nothing with a None path."""
+    if path is None:
+        yield _metrics
+        return
+
+    _metrics.reset()
+    exporter = PeriodicExporter(_metrics, path, interval) if interval else None
+    if exporter is not None:
+        exporter.start()
+    try:
+        yield _metrics
+    finally:
+        if exporter is not None:
+            exporter.stop()
+        else:
+            _metrics.export(path)
+
+
+def exports_metrics(func):
+    """Pipeline decorator: adds the metrics_path and metrics_interval keyword arguments of export_metrics"""
+    @functools.wraps(func)
+    def wrapper(*args, metrics_path=DEFAULT_METRICS_PATH, metrics_interval=None, **kwargs):
+        with export_metrics(metrics_path, metrics_interval):
+            return func(*args, **kwargs)
+    return wrapper
@@ -1,35 +1,118 @@
-# TODO: Look into dataclasses
+from collections.abc import MutableMapping
+from dataclasses import dataclass, field, fields
 
+import numpy as np
 
+from ..config import current_season
+
+# One row per season, sorted by year
+SEASON_DTYPE = np.dtype([('year', 'i2'), ('pos', 'U8'), ('gp', 'i2'), ('gs', 'i2'), ('av', 'i2')])
+STAT_FIELDS = ('pos', 'gp', 'gs', 'av')
+
+
+def empty_seasons():
+    return np.zeros(0, dtype=SEASON_DTYPE)
+
+
+def seasons_from_dict(stats):
+    """Season array from the {year: {'pos': ..., 'gp': ..., 'gs': ..., 'av': ...}} layout"""
+    seasons = np.array([(year, val['pos'], val['gp'], val['gs'], val['av']) for year, val in stats.items()],
+                       dtype=SEASON_DTYPE)
+    return np.sort(seasons, order='year')
+
+
+class SeasonStatsView(MutableMapping):
+    """Dict-like view of a player's season array, keyed by year, so that code written for the previous dict of dicts
+    keeps working. Edits are written back to the array."""
+
+    __slots__ = ('player',)
+
+    def __init__(self, player):
+        self.player = player
+
+    def _index(self, year):
+        seasons = self.player.seasons
+        i = np.searchsorted(seasons['year'], year)
+        if (i == len(seasons)) or (seasons['year'][i] != year):
+            raise KeyError(year)
+        return i
+
+    def __getitem__(self, year):
+        row = self.player.seasons[self._index(year)]
+        return {'pos': str(row['pos']), 'gp': int(row['gp']), 'gs': int(row['gs']), 'av': int(row['av'])}
+
+    def __setitem__(self, year, val):
+        seasons = self.player.seasons
+        seasons = seasons[seasons['year'] != year]
+        row = np.array([(year, val['pos'], val['gp'], val['gs'], val['av'])], dtype=SEASON_DTYPE)
+        i = np.searchsorted(seasons['year'], year)
+        self.player.seasons = np.concatenate([seasons[:i], row, seasons[i:]])
+
+    def __delitem__(self, year):
+        self.player.seasons = np.delete(self.player.seasons, self._index(year))
+
+    def __iter__(self):
+        return iter(self.player.seasons['year'].tolist())
+
+    def __len__(self):
+        return len(self.player.seasons)
+
+    def items(self):
+        # Faster than going through __getitem__ for every year
+        for year, pos, gp, gs, av in self.player.seasons.tolist():
+            yield year, {'pos': pos, 'gp': gp, 'gs': gs, 'av': av}
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+@dataclass(slots=True, eq=False, repr=False)
 class Player:
-    def __init__(self, pid):
-        self.pid = pid
-        # Player info
-        self.first_name = None
-        self.last_name = None
-        self.position = None
-        self.position_group = None
-        self.height = 0
-        self.weight = 0
-
-        # Career info
-        self.start_year = 0
-        self.start_age = 0
-        self.last_year = 0
-        self.stats = dict()
-
-        # Combine results
-        self.draft_pos = None
-        self.dash = 0.0
-        self.bench = 0
-        self.broad = 0
-        self.shuttle = 0.0
-        self.cone = 0.0
-        self.vertical = 0.0
+    """A player and his career. Season stats are kept in a structured NumPy array (`seasons`), `stats` gives the same
+    data as a dict of dicts keyed by year."""
+
+    pid: str
+    # Player info
+    first_name: str = None
+    last_name: str = None
+    position: str = None
+    position_group: str = None
+    height: int = 0
+    weight: int = 0
+
+    # Career info
+    start_year: int = 0
+    start_age: int = 0
+    last_year: int = 0
+    seasons: np.ndarray = field(default_factory=empty_seasons)
+
+    # Combine results
+    draft_pos: str = None
+    dash: float = 0.0
+    bench: int = 0
+    broad: int = 0
+    shuttle: float = 0.0
+    cone: float = 0.0
+    vertical: float = 0.0
 
     def __repr__(self):
         return f"Player({self.pid}, {self.first_name}, {self.last_name}, {self.position}, {self.height}, {self.weight})"
 
+    def to_dict(self):
+        """All the attributes, with the seasons as a dict of dicts like `stats`"""
+        attributes = {f.name: getattr(self, f.name) for f in fields(self) if f.name != 'seasons'}
+        attributes['stats'] = dict(self.stats.items())
+        return attributes
+
+    @classmethod
+    def from_dict(cls, attributes):
+        """Player from the output of to_dict, years may be strings if it went through JSON"""
+        attributes = dict(attributes)
+        stats = attributes.pop('stats', {})
+        player = cls(**attributes)
+        player.stats = {int(year): val for year, val in stats.items()}
+        return player
+
     # ----- PROPERTIES -------------------------------------------------------------------------------------------------
 
     @property
@@ -42,7 +125,16 @@ class Player:
 
     @property
     def retired(self):
-        return self.start_year != 2023
+        # A player who took part in the latest season is still active
+        return self.last_year < current_season()
+
+    @property
+    def stats(self):
+        return SeasonStatsView(self)
+
+    @stats.setter
+    def stats(self, stats):
+        self.seasons = seasons_from_dict(stats)
 
     # ----- SETTER METHODS ---------------------------------------------------------------------------------------------
 
@@ -75,11 +167,13 @@ class Player:
         self.first_name = player_info.first_name
         self.last_name = player_info.last_name
         self.position = player_info.position
+        self.position_group = player_info.position_group
         self.height = player_info.height
         self.weight = player_info.weight
 
         self.start_year = player_info.start_year
         self.start_age = player_info.start_age
+        self.last_year = player_info.start_year + player_info.career_length - 1
 
         self.dash = player_info.dash
         self.bench = player_info.bench
@@ -89,32 +183,82 @@ class Player:
         self.vertical = player_info.vertical
 
         # Set stats from SeasonStats objects
-        self.stats = {}
-        for stat in season_stats_list:
-            self.stats[stat.year] = {
-                'pos': stat.position,
-                'gp': stat.games_played,
-                'gs': stat.games_started,
-                'av': stat.approx_value
-            }
-
-    def get_stats_array(self, *args):
-        # TODO: Input handling
-        stats = dict()
-        for arg in args:
-            stats[arg] = [year[arg] for year in self.stats.values()]
-        time = [year for year in self.stats.keys()]
-
-        return stats, time
+        seasons = np.array([(stat.year, stat.position, stat.games_played, stat.games_started, stat.approx_value)
+                            for stat in season_stats_list], dtype=SEASON_DTYPE)
+        self.seasons = np.sort(seasons, order='year')
+
+    def get_stats_array(self, *args, as_arrays=False):
+        """Columns of the season stats given as arguments, and the list of years. Lists by default, NumPy arrays with
+        as_arrays."""
+        invalid = set(args) - set(STAT_FIELDS)
+        if invalid:
+            raise ValueError(f"Unknown stats {sorted(invalid)}, expected some of {STAT_FIELDS}")
+
+        if as_arrays:
+            return {arg: self.seasons[arg] for arg in args}, self.seasons['year']
+        return {arg: self.seasons[arg].tolist() for arg in args}, self.seasons['year'].tolist()
 
     def adjust_for_injuries(self, threshold=3):
         # TODO: For some positions like QB, it should reall look at games started
-        # Get season stats arrays
-        stats, time = self.get_stats_array('gp')
-
         # A season is filtered out if the number of games played is below the threshold AND there are seasons with more
         # games played in the following years. This is to avoid filtering out the decline in games played at the end of
         # players' careers
-        for (i, val) in enumerate(stats['gp'][:-1]):
-            if (val <= threshold) and (val <= max(stats['gp'][i:-1])):
-                del self.stats[time[i]]
+
+        # Single linear scan from the end of the career. Careers are a few seasons long, plain Python beats NumPy calls
+        # on arrays that small, adjust_for_injuries_batch is the vectorized version for many players at once.
+        gp = self.seasons['gp'].tolist()
+        keep = [True] * len(gp)
+        later_max = None
+        for i in range(len(gp) - 2, -1, -1):
+            later_max = gp[i] if later_max is None else max(later_max, gp[i])
+            if (gp[i] <= threshold) and (gp[i] <= later_max):
+                keep[i] = False
+
+        if not all(keep):
+            self.seasons = self.seasons[keep]
+
+
+# ----- BATCH OPERATIONS -----------------------------------------------------------------------------------------------
+
+def injury_mask(gp, threshold=3, segments=None):
+    """Seasons dropped by adjust_for_injuries: the ones, except the last, whose games played are at most `threshold`
+    and at most the maximum of gp[i:-1]. With `segments`, the start offsets of the players in a concatenation of their
+    seasons, each player is handled separately."""
+    n = len(gp)
+    if n == 0:
+        return np.zeros(0, dtype=bool)
+
+    gp = gp.astype(np.int64)
+    starts = np.zeros(1, dtype=np.int64) if segments is None else np.asarray(segments, dtype=np.int64)
+    player = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, n)))
+    last = np.append(starts[1:], n) - 1
+    is_last = np.zeros(n, dtype=bool)
+    is_last[last[last >= starts]] = True
+
+    # Running maximum from the end of each player's career, his last season excluded (0 below). Values are shifted
+    # into a band per player, lower for later players, so that a single accumulate over everything, run backwards,
+    # never carries a maximum from one player into the previous one.
+    low = gp.min()
+    span = gp.max() - low + 2
+    band = (len(starts) - player) * span
+    keyed = np.where(is_last, 0, gp - low + 1) + band
+    later_max = np.maximum.accumulate(keyed[::-1])[::-1] - band + low - 1
+
+    return (~is_last) & (gp <= threshold) & (gp <= later_max)
+
+
+def adjust_for_injuries_batch(players, threshold=3):
+    """adjust_for_injuries over many players, with a single pass over all their games played"""
+    if not players:
+        return
+    lengths = [len(player.seasons) for player in players]
+    bounds = np.concatenate([[0], np.cumsum(lengths)])
+    gp = np.concatenate([player.seasons['gp'] for player in players])
+    drop = injury_mask(gp, threshold, bounds[:-1])
+
+    # Only the players who lose seasons get a new array
+    dropped_before = np.concatenate([[0], np.cumsum(drop)])
+    changed = np.flatnonzero(dropped_before[bounds[1:]] > dropped_before[bounds[:-1]])
+    for i in changed.tolist():
+        player = players[i]
+        player.seasons = player.seasons[~drop[bounds[i]:bounds[i + 1]]]
@@ -0,0 +1,180 @@
+import datetime
+import json
+import os
+
+from peewee import chunked
+
+from .config import current_season
+from .database.db_model import RosterIndex, ScrapeJob, db
+
+# teams.json sits at the root of the repository, next to the package
+TEAMS_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'teams.json')
+
+ROSTER = 'roster'
+PLAYER = 'player'
+
+
+def load_teams(path=TEAMS_FILE):
+    with open(path) as file:
+        return list(json.load(file).values())
+
+
+def roster_key(team, year):
+    return f"{team}/{year}"
+
+
+def parse_roster_key(key):
+    team, year = key.split('/')
+    return team, int(year)
+
+
+def expand_roster_jobs(start, end, teams=None, path=TEAMS_FILE):
+    """Every (team, year) roster between two seasons, within the years each franchise has played"""
+    last_season = current_season()
+    jobs = []
+    for team in load_teams(path):
+        if teams and team['abbrev'] not in teams:
+            continue
+        first = max(start, team['firstYear'])
+        last = min(end, team['lastYear'], last_season)
+        jobs.extend((team['abbrev'], year) for year in range(first, last + 1))
+    return sorted(jobs, key=lambda job: (job[1], job[0]))
+
+
+class JobPlanner:
+    """Keeps track of the roster and player jobs of a scraping run in the ScrapeJob table, and of the players on every
+    roster ever scraped in the RosterIndex table"""
+
+    def __init__(self):
+        with db.connection_context():
+            db.create_tables([ScrapeJob, RosterIndex], safe=True)
+
+    @staticmethod
+    def _add(kind, keys):
+        with db.connection_context():
+            for chunk in chunked(keys, 500):
+                with db.atomic():
+                    (ScrapeJob
+                     .insert_many([{'kind': kind, 'key': key} for key in chunk])
+                     .on_conflict_ignore()
+                     .execute())
+
+    @staticmethod
+    def _keys(kind, statuses, keys=None):
+        with db.connection_context():
+            query = (ScrapeJob
+                     .select(ScrapeJob.key)
+                     .where((ScrapeJob.kind == kind) & ScrapeJob.status.in_(statuses))
+                     .order_by(ScrapeJob.key))
+            found = [key for (key,) in query.tuples()]
+        return [key for key in found if key in keys] if keys is not None else found
+
+    @staticmethod
+    def mark(kind, keys, status, result=None):
+        now = datetime.datetime.now()
+        with db.connection_context():
+            for chunk in chunked(keys, 500):
+                (ScrapeJob
+                 .update(status=status, result=result, updated_at=now)
+                 .where((ScrapeJob.kind == kind) & ScrapeJob.key.in_(chunk))
+                 .execute())
+
+    @staticmethod
+    def reset(kind=None):
+        with db.connection_context():
+            query = ScrapeJob.delete()
+            if kind is not None:
+                query = query.where(ScrapeJob.kind == kind)
+            query.execute()
+
+    # ----- ROSTERS ----------------------------------------------------------------------------------------------------
+
+    def plan_rosters(self, start, end, teams=None):
+        """Registers the roster jobs of a run, returns their keys. Jobs already done in a previous run are kept."""
+        keys = [roster_key(team, year) for (team, year) in expand_roster_jobs(start, end, teams)]
+        self._add(ROSTER, keys)
+        return keys
+
+    def pending_rosters(self, keys):
+        """Rosters of a run left to scrape, failed ones are retried"""
+        keys = set(keys)
+        return sorted((parse_roster_key(key) for key in self._keys(ROSTER, ['pending', 'failed'], keys)),
+                      key=lambda job: (job[1], job[0]))
+
+    def roster_done(self, team, year, pids):
+        self.mark(ROSTER, [roster_key(team, year)], 'done', json.dumps(sorted(pids)))
+
+    def roster_failed(self, team, year):
+        self.mark(ROSTER, [roster_key(team, year)], 'failed')
+
+    def roster_pids(self, keys):
+        """Player IDs found on the rosters of a run, deduplicated across all teams and seasons"""
+        keys = set(keys)
+        pids = set()
+        with db.connection_context():
+            query = (ScrapeJob
+                     .select(ScrapeJob.key, ScrapeJob.result)
+                     .where((ScrapeJob.kind == ROSTER) & (ScrapeJob.status == 'done'))
+                     .tuples())
+            for key, result in query:
+                if key in keys and result:
+                    pids.update(json.loads(result))
+        return pids
+
+    # ----- ROSTER INDEX -----------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def indexed_roster(team, year, digest=None):
+        """Player IDs of a roster taken from the index: the ones of a closed season, which do not need to be requested
+        again, or the ones of the page with this digest, which does not need to be parsed again. None otherwise."""
+        with db.connection_context():
+            entry = RosterIndex.get_or_none((RosterIndex.team == team) & (RosterIndex.year == year))
+        if entry is None or not (entry.immutable or entry.digest == digest):
+            return None
+        return set(json.loads(entry.pids))
+
+    @staticmethod
+    def index_roster(team, year, digest, pids):
+        """Records the players found on a roster page. A season is closed once the next one has started, from then on
+        its roster is immutable."""
+        with db.connection_context():
+            (RosterIndex
+             .insert(team=team, year=year, pids=json.dumps(sorted(pids)), digest=digest,
+                     fetched_at=datetime.datetime.now(), immutable=year < current_season())
+             .on_conflict_replace()
+             .execute())
+
+    @staticmethod
+    def reset_roster_index():
+        with db.connection_context():
+            RosterIndex.delete().execute()
+
+    # ----- PLAYERS ----------------------------------------------------------------------------------------------------
+
+    def plan_players(self, pids):
+        self._add(PLAYER, sorted(pids))
+
+    def pending_players(self, pids=None):
+        return self._keys(PLAYER, ['pending', 'failed'], set(pids) if pids is not None else None)
+
+    def done_players(self):
+        return set(self._keys(PLAYER, ['done']))
+
+    def players_done(self, pids):
+        self.mark(PLAYER, pids, 'done')
+
+    def players_failed(self, pids, error=None):
+        """Puts players in the dead-letter queue, whether they were planned or not, so that a later pass retries them"""
+        now = datetime.datetime.now()
+        with db.connection_context():
+            for chunk in chunked(pids, 500):
+                (ScrapeJob
+                 .insert_many([{'kind': PLAYER, 'key': pid, 'status': 'failed', 'result': error, 'updated_at': now}
+                               for pid in chunk])
+                 .on_conflict(conflict_target=[ScrapeJob.kind, ScrapeJob.key],
+                              preserve=[ScrapeJob.status, ScrapeJob.result, ScrapeJob.updated_at])
+                 .execute())
+
+    def failed_players(self):
+        """Dead-letter queue: players whose fetch or parse failed"""
+        return self._keys(PLAYER, ['failed'])
@@ -0,0 +1,130 @@
+import asyncio
+import functools
+
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+
+from requests.structures import CaseInsensitiveDict
+
+from ..config import setup_logging
+from ..metrics import get_metrics
+from .client import RETRY_STATUSES, CircuitOpenError, get_client, record_response
+from .utils import fetch_page
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+# Configure module logger from config file
+logger = setup_logging(__name__, 'logs/scraping.log')
+
+
+def _to_response(url, status, headers, text):
+    """Wraps an aiohttp result in a requests Response, so that the cache and the error handling work the same way"""
+    response = requests.Response()
+    response.url = url
+    response.status_code = status
+    response.headers = CaseInsensitiveDict(headers)
+    response.encoding = 'utf-8'
+    response._content = text.encode('utf-8')
+    return response
+
+
+class AsyncFetcher:
+    """Fetches pages from coroutines, with at most `concurrency` requests in flight.
+
+    With aiohttp installed, requests go through one aiohttp session, with the retry policy and circuit breakers of the
+    shared HttpClient. Without it, the blocking fetch_page runs on a pool of `concurrency` threads, which keeps the
+    event loop free all the same. Either way the rate limiter and the page cache are the ones of the sync pipeline.
+    """
+
+    def __init__(self, concurrency=4, limiter=None, cache=None, client=None, use_aiohttp=None):
+        self.concurrency = concurrency
+        self.limiter = limiter
+        self.cache = cache
+        self.client = client or get_client()
+        self.use_aiohttp = (aiohttp is not None) if use_aiohttp is None else use_aiohttp
+
+        self._semaphore = None
+        self._session = None
+        self._executor = None
+
+    async def __aenter__(self):
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        if self.use_aiohttp:
+            timeout = self.client.timeout
+            connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+            self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.concurrency),
+                                                  timeout=aiohttp.ClientTimeout(sock_connect=connect, sock_read=read),
+                                                  headers=dict(self.client.session.headers))
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='fetch')
+        return self
+
+    async def __aexit__(self, *exc):
+        if self._session is not None:
+            await self._session.close()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+    async def fetch(self, url, ttl=None, refresh=False):
+        """Returns the HTML of a page, raises requests exceptions like fetch_page"""
+        async with self._semaphore:
+            if not self.use_aiohttp:
+                call = functools.partial(fetch_page, url, cache=self.cache, limiter=self.limiter, ttl=ttl,
+                                         refresh=refresh, client=self.client)
+                return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+
+            if self.cache is None:
+                response = await self._get(url)
+                response.raise_for_status()
+                return response.text
+
+            entry, content = self.cache.lookup(url, refresh)
+            if content is not None:
+                return content
+            headers = self.cache.conditional_headers(entry) if entry is not None else dict()
+            response = await self._get(url, headers)
+            return self.cache.resolve(url, entry, response, ttl)
+
+    async def _get(self, url, headers=None):
+        """Async version of HttpClient.get"""
+        host = urlsplit(url).netloc
+        breaker = self.client.breaker(host)
+        if breaker.is_open:
+            raise CircuitOpenError(f"Too many failures, not requesting {url}")
+
+        metrics = get_metrics()
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.client.max_retries + 1):
+            if self.limiter is not None:
+                await self.limiter.acquire_async(url)
+            if attempt > 0:
+                metrics.inc('fetch_retries', host=host)
+
+            start = loop.time()
+            try:
+                async with self._session.get(url, headers=headers) as resp:
+                    response = _to_response(url, resp.status, resp.headers, await resp.text())
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                metrics.inc('fetch_errors', host=host, error=type(e).__name__)
+                if attempt == self.client.max_retries:
+                    breaker.record_failure()
+                    raise requests.exceptions.ConnectionError(f"{url}: {e!r}") from e
+                delay = self.client._delay(attempt)
+                logger.warning(f"{url} failed ({type(e).__name__}), retrying in {delay:.1f}s")
+            else:
+                record_response(host, response, loop.time() - start)
+                if response.status_code not in RETRY_STATUSES:
+                    breaker.record_success()
+                    return response
+                if attempt == self.client.max_retries:
+                    breaker.record_failure()
+                    return response
+                delay = self.client._delay(attempt, response)
+                logger.warning(f"{url} returned {response.status_code}, retrying in {delay:.1f}s")
+
+            await asyncio.sleep(delay)
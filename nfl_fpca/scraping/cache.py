@@ -0,0 +1,253 @@
+import hashlib
+import os
+import time
+import zlib
+
+from peewee import CharField, FloatField, IntegerField, Model, SqliteDatabase
+
+from ..config import setup_logging
+from ..metrics import get_metrics
+from .client import get_client
+
+# Configure module logger from config file
+logger = setup_logging(__name__, 'logs/scraping.log')
+
+DEFAULT_CACHE_DIR = os.path.join('data', 'pages')
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+ROSTER_TTL = 24 * 3600
+
+
+def page_digest(page):
+    """Hash of the HTML of a page, the name of its blob in the cache"""
+    return hashlib.sha256(page.encode('utf-8')).hexdigest()
+
+
+def bound_model(model, database):
+    """Subclass of a model bound to a database of its own. Binding the model itself would point every store opened
+    before at the last database."""
+    bound = type(model.__name__, (model,), {'__module__': model.__module__})
+    database.bind([bound])
+    return bound
+
+
+class CachedPage(Model):
+    """Index entry of the page cache, the page content itself is stored in a compressed blob named after its hash"""
+    url = CharField(primary_key=True)
+    digest = CharField(index=True)
+    size = IntegerField()
+
+    # Revalidation
+    etag = CharField(null=True)
+    last_modified = CharField(null=True)
+    expires_at = FloatField(null=True)
+
+    # LRU bookkeeping
+    fetched_at = FloatField()
+    accessed_at = FloatField(index=True)
+
+
+class PageCache:
+    """Persistent, content-addressed store of downloaded pages.
+
+    Pages are zlib-compressed and stored under their SHA-256, so identical pages are only kept once. A small SQLite
+    index maps each URL to its blob, along with the ETag/Last-Modified headers used to revalidate it. Entries without an
+    expiry are served without touching the network, expired ones are revalidated with a conditional request. The store
+    is capped to `max_bytes`, least recently used pages are evicted first.
+    """
+
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self._bytes = None  # Running total of the blob sizes, counted once on first use
+
+        os.makedirs(os.path.join(root, 'objects'), exist_ok=True)
+        self.db = SqliteDatabase(os.path.join(root, 'index.db'))
+        self.model = bound_model(CachedPage, self.db)
+        self.db.create_tables([self.model], safe=True)
+
+    # ----- BLOBS ------------------------------------------------------------------------------------------------------
+
+    def _blob_path(self, digest):
+        return os.path.join(self.root, 'objects', digest[:2], digest)
+
+    def _write_blob(self, content):
+        data = content.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(digest)
+
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as file:
+                file.write(zlib.compress(data))
+            os.replace(tmp_path, path)
+
+        return digest, os.path.getsize(path)
+
+    def _read_blob(self, digest):
+        with open(self._blob_path(digest), 'rb') as file:
+            return zlib.decompress(file.read()).decode('utf-8')
+
+    def _delete_blob(self, digest, size):
+        # Blobs are shared between URLs with identical content
+        if self.model.select().where(self.model.digest == digest).exists():
+            return
+        try:
+            os.remove(self._blob_path(digest))
+        except FileNotFoundError:
+            pass
+        if self._bytes is not None:
+            self._bytes -= size
+
+    # ----- ENTRIES ----------------------------------------------------------------------------------------------------
+
+    def get(self, url):
+        """Returns the cache entry of a URL, or None"""
+        return self.model.get_or_none(self.model.url == url)
+
+    def read(self, entry):
+        """Returns the content of an entry and marks it as recently used"""
+        self.model.update(accessed_at=time.time()).where(self.model.url == entry.url).execute()
+        return self._read_blob(entry.digest)
+
+    def store(self, url, content, etag=None, last_modified=None, ttl=None):
+        now = time.time()
+        total = self.total_bytes
+        previous = self.get(url)
+        digest, size = self._write_blob(content)
+        new_blob = not self.model.select().where(self.model.digest == digest).exists()
+
+        with self.db.atomic():
+            (self.model
+             .insert(url=url, digest=digest, size=size, etag=etag, last_modified=last_modified,
+                     expires_at=now + ttl if ttl is not None else None, fetched_at=now, accessed_at=now)
+             .on_conflict_replace()
+             .execute())
+
+        self._bytes = total + size if new_blob else total
+        if (previous is not None) and (previous.digest != digest):
+            self._delete_blob(previous.digest, previous.size)
+
+        # Only scan for pages to evict once the store outgrows its cap
+        if self._bytes > self.max_bytes:
+            self.evict()
+
+    def touch(self, entry, ttl=None):
+        """Marks an entry as fresh after a successful revalidation"""
+        now = time.time()
+        (self.model
+         .update(fetched_at=now, accessed_at=now, expires_at=now + ttl if ttl is not None else None)
+         .where(self.model.url == entry.url)
+         .execute())
+
+    def invalidate(self, url):
+        entry = self.get(url)
+        if entry is not None:
+            entry.delete_instance()
+            self._delete_blob(entry.digest, entry.size)
+
+    def __contains__(self, url):
+        return self.model.select().where(self.model.url == url).exists()
+
+    def __iter__(self):
+        """Iterates over the cached URLs"""
+        for (url,) in self.model.select(self.model.url).tuples():
+            yield url
+
+    # ----- SIZE MANAGEMENT --------------------------------------------------------------------------------------------
+
+    @property
+    def total_bytes(self):
+        """Size of the stored blobs, the index is only scanned the first time, then the total is kept up to date"""
+        if self._bytes is None:
+            # Blobs shared between several URLs are only counted once
+            query = self.model.select(self.model.digest, self.model.size).distinct()
+            self._bytes = sum(size for (_, size) in query.tuples())
+        return self._bytes
+
+    def evict(self):
+        """Removes least recently used pages until the store fits in max_bytes"""
+        if self.total_bytes <= self.max_bytes:
+            return
+
+        for entry in self.model.select().order_by(self.model.accessed_at):
+            if self._bytes <= self.max_bytes:
+                break
+            entry.delete_instance()
+            self._delete_blob(entry.digest, entry.size)
+            logger.debug(f"Evicted {entry.url} from page cache")
+
+    # ----- FETCHING ---------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def is_fresh(entry):
+        return (entry.expires_at is None) or (entry.expires_at > time.time())
+
+    @staticmethod
+    def conditional_headers(entry):
+        headers = dict()
+        if entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def lookup(self, url, refresh=False):
+        """Returns the entry of a URL and its content if it can be served without a request, or (entry, None) if it has
+        to be fetched or revalidated"""
+        entry = self.get(url)
+        if (entry is not None) and self.is_fresh(entry) and not refresh:
+            self.hits += 1
+            get_metrics().inc('cache_requests', result='hit')
+            return entry, self.read(entry)
+        return entry, None
+
+    def resolve(self, url, entry, response, ttl=None):
+        """Returns the content of a URL from the response to a (conditional) request, and updates the cache with it"""
+        if (entry is not None) and (response.status_code == 304):
+            logger.debug(f"{url} not modified")
+            self.revalidated += 1
+            get_metrics().inc('cache_requests', result='revalidated')
+            self.touch(entry, ttl)
+            return self.read(entry)
+
+        response.raise_for_status()
+        self.misses += 1
+        get_metrics().inc('cache_requests', result='miss')
+        self.store(url, response.text,
+                   etag=response.headers.get('ETag'),
+                   last_modified=response.headers.get('Last-Modified'),
+                   ttl=ttl)
+        return response.text
+
+    def fetch(self, url, ttl=None, limiter=None, refresh=False, client=None):
+        """Returns the content of a URL, from the cache when possible.
+
+        Fresh entries are served from disk. Expired entries, or every entry if refresh is True, are revalidated with a
+        conditional request through the shared HTTP client. Raises requests exceptions like requests.get would.
+        """
+        entry, content = self.lookup(url, refresh)
+        if content is not None:
+            return content
+
+        headers = self.conditional_headers(entry) if entry is not None else dict()
+        response = (client or get_client()).get(url, headers=headers, limiter=limiter)
+        return self.resolve(url, entry, response, ttl)
+
+    @property
+    def hit_ratio(self):
+        total = self.hits + self.revalidated + self.misses
+        return (self.hits + self.revalidated) / total if total else 0.0
+
+    def log_stats(self):
+        get_metrics().set('cache_hit_ratio', round(self.hit_ratio, 4))
+        get_metrics().set('cache_bytes', self.total_bytes)
+        logger.info(f"Page cache: {self.hits} hits, {self.revalidated} revalidated, {self.misses} downloaded "
+                    f"({self.hit_ratio:.0%} served from disk)")
+
+    def close(self):
+        self.db.close()
+
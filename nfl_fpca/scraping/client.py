@@ -0,0 +1,181 @@
+import email.utils
+import random
+import threading
+import time
+
+from urllib.parse import urlsplit
+
+import requests
+
+from requests.adapters import HTTPAdapter
+
+from ..config import setup_logging
+from ..metrics import get_metrics
+
+# Configure module logger from config file
+logger = setup_logging(__name__, 'logs/scraping.log')
+
+DEFAULT_TIMEOUT = (5, 30)  # Connect and read timeouts, in seconds
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+USER_AGENT = "nfl-fpca (+https://github.com/TheSquareRoot/nfl-fpca)"
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised instead of sending a request to a host that keeps failing"""
+
+
+class CircuitBreaker:
+    """Stops requests to a host after `threshold` consecutive failures, and lets one through again after `cooldown`
+    seconds to check whether it recovered."""
+
+    def __init__(self, threshold=5, cooldown=300):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        with self._lock:
+            if self.opened_at is None:
+                return False
+            # Half-open: after the cooldown, let the next request through
+            return time.monotonic() - self.opened_at < self.cooldown
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+def retry_after(response):
+    """Delay asked by the server in a Retry-After header, in seconds, or None"""
+    value = response.headers.get('Retry-After')
+    if value is None:
+        return None
+    if value.strip().isdigit():
+        return float(value)
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - time.time())
+
+
+def describe_error(e):
+    """Status code of a failed request, or the kind of error when no response came back"""
+    response = getattr(e, 'response', None)
+    return f"code {response.status_code}" if response is not None else type(e).__name__
+
+
+def record_response(host, response, elapsed):
+    """Latency, status and size of a response in the metrics"""
+    metrics = get_metrics()
+    metrics.observe('fetch_seconds', elapsed, host=host)
+    metrics.inc('http_responses', host=host, status=response.status_code)
+    metrics.inc('bytes_downloaded', len(response.content), host=host)
+
+
+class HttpClient:
+    """Shared HTTP client: one keep-alive connection pool, timeouts, and retries with exponential backoff.
+
+    Connection errors, timeouts, 429 and 5xx responses are retried up to `max_retries` times, waiting for the delay
+    given by the server's Retry-After header if any, or backoff * 2^attempt seconds otherwise. Each host has a circuit
+    breaker, so that a site that is down is not hammered with requests.
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, max_retries=4, backoff=2.0, max_backoff=120.0, pool_size=8,
+                 breaker_threshold=5, breaker_cooldown=300, sleep=time.sleep):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.sleep = sleep
+
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = USER_AGENT
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._breakers = dict()
+        self._lock = threading.Lock()
+
+    def breaker(self, host):
+        with self._lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker(self.breaker_threshold, self.breaker_cooldown)
+            return self._breakers[host]
+
+    def _delay(self, attempt, response=None):
+        delay = retry_after(response) if response is not None else None
+        if delay is None:
+            # Full jitter so that parallel clients do not retry in lockstep
+            delay = random.uniform(0.5, 1.0) * self.backoff * 2 ** attempt
+        return min(delay, self.max_backoff)
+
+    def get(self, url, headers=None, limiter=None):
+        """Sends a GET request and returns the response. Raises requests exceptions like requests.get, or
+        CircuitOpenError if the host is failing."""
+        host = urlsplit(url).netloc
+        breaker = self.breaker(host)
+        if breaker.is_open:
+            raise CircuitOpenError(f"Too many failures, not requesting {url}")
+
+        metrics = get_metrics()
+        for attempt in range(self.max_retries + 1):
+            if limiter is not None:
+                limiter.acquire(url)
+            if attempt > 0:
+                metrics.inc('fetch_retries', host=host)
+
+            start = time.perf_counter()
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                metrics.inc('fetch_errors', host=host, error=type(e).__name__)
+                if attempt == self.max_retries:
+                    breaker.record_failure()
+                    raise
+                delay = self._delay(attempt)
+                logger.warning(f"{url} failed ({type(e).__name__}), retrying in {delay:.1f}s")
+            else:
+                record_response(host, response, time.perf_counter() - start)
+                if response.status_code not in RETRY_STATUSES:
+                    breaker.record_success()
+                    return response
+                if attempt == self.max_retries:
+                    breaker.record_failure()
+                    return response
+                delay = self._delay(attempt, response)
+                logger.warning(f"{url} returned {response.status_code}, retrying in {delay:.1f}s")
+
+            self.sleep(delay)
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+
+
+def get_client():
+    """Client shared by all the fetchers, created on first use"""
+    global _client
+    if _client is None:
+        _client = HttpClient()
+    return _client
+
+
+def set_client(client):
+    global _client
+    _client = client
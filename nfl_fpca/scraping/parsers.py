@@ -0,0 +1,44 @@
+import importlib.util
+import os
+
+from bs4 import BeautifulSoup
+
+# Parser backends by order of preference, lxml is C-backed and several times faster than Python's html.parser
+PARSERS = ('lxml', 'html.parser')
+FALLBACK_PARSER = 'html.parser'
+
+_parser = None
+
+
+def available_parsers():
+    """Backends that can be used in this environment"""
+    return [name for name in PARSERS if (name == FALLBACK_PARSER) or importlib.util.find_spec(name) is not None]
+
+
+def set_parser(name):
+    """Selects the backend used by the scrapers, None goes back to the default one"""
+    global _parser
+    if (name is not None) and (name not in available_parsers()):
+        raise ValueError(f"Parser {name} is not available, pick one of {available_parsers()}")
+    _parser = name
+
+
+def get_parser():
+    """Backend used by the scrapers: the one set with set_parser, the NFL_FPCA_PARSER environment variable, or the
+    fastest one available."""
+    if _parser is not None:
+        return _parser
+    name = os.environ.get('NFL_FPCA_PARSER')
+    if name in available_parsers():
+        return name
+    return available_parsers()[0]
+
+
+def make_soup(page, parser=None):
+    """Parses an HTML page with the given backend, or the current one"""
+    return BeautifulSoup(page, parser or get_parser())
+
+
+def parser_of(soup):
+    """Backend a soup was built with, so that related fragments are parsed the same way"""
+    return soup.builder.NAME if soup.builder.NAME in PARSERS else FALLBACK_PARSER
@@ -1,11 +1,14 @@
 import re
 import requests
-
-from bs4 import BeautifulSoup
+import time
 
 from ..config import setup_logging
 from ..models.player import Player
-from .utils import (find_table,
+from .client import describe_error
+from .parsers import make_soup
+from .utils import (PageIndex,
+                    fetch_page,
+                    get_base_url,
                     get_career_table,
                     get_position_group,
                     get_position_group_from_history,
@@ -57,9 +60,9 @@ def scrape_player_header(soup, player):
         logger.debug(f"[{player.pid}] - No player header")
 
 
-def scrape_career_table(soup, player):
+def scrape_career_table(soup, player, index=None):
     # Extract career table from page
-    table = get_career_table(soup)
+    table = get_career_table(soup, index)
 
     if table:
         logger.debug(f"[{player.pid}] - Career info found in {table['id']}")
@@ -79,11 +82,11 @@ def scrape_career_table(soup, player):
 
             # Number of games played
             gp_tag = line.find('td', attrs={'data-stat': 'games'}) or line.find('td', attrs={'data-stat': 'g'})
-            gp = int(gp_tag.text) or 0
+            gp = int(gp_tag.text or 0)
 
             # Number of games started
             gs_tag = line.find('td', attrs={'data-stat': 'games_started'}) or line.find('td', attrs={'data-stat': 'gs'})
-            gs = int(gs_tag.text) or 0
+            gs = int(gs_tag.text or 0)
 
             # Approximate value
             av = int(line.find('td', attrs={'data-stat': 'av'}).text or 0)
@@ -104,11 +107,11 @@ def scrape_career_table(soup, player):
         logger.debug(f"[{player.pid}] - No career table")
 
 
-def scrape_combine_table(soup, player):
+def scrape_combine_table(soup, player, index=None):
     # TODO: Error handling
     # TODO: Get combine year
     # Extract combine table from page
-    table = find_table(soup, "combine")
+    table = (index or PageIndex(soup)).table("combine")
 
     if table:
         # Extract combine data from table
@@ -137,34 +140,62 @@ def scrape_combine_table(soup, player):
         logger.debug(f"[{player.pid}] - No combine table")
 
 
-def fetch_and_scrape_player_page(pid):
-    # Create player page URL from player ID
-    url = f"https://www.pro-football-reference.com/players/{pid[0].upper()}/{pid}.htm"
+def player_url(pid):
+    """Creates player page URL from player ID"""
+    return f"{get_base_url()}/players/{pid[0].upper()}/{pid}.htm"
+
+
+def fetch_player_page(pid, cache=None, limiter=None, refresh=False):
+    """Requests a player page and returns its HTML, refresh revalidates the cached page of an active player"""
+    url = player_url(pid)
 
     # Request page
     try:
-        response = requests.get(url)
-        response.raise_for_status()
+        page = fetch_page(url, cache=cache, limiter=limiter, refresh=refresh)
     except requests.exceptions.RequestException as e:
-        logger.error(f"[{pid}] - Requesting player page failed with code {e.response.status_code}")
+        logger.error(f"[{pid}] - Requesting player page failed with {describe_error(e)}")
         raise
     else:
         logger.info(f"[{pid}] - Requested {url} successfully.")
-        logger.info(f"[{pid}] - Scraping...")
-        return scrape_player_page(response.text, pid)
+        return page
+
 
+def fetch_and_scrape_player_page(pid, cache=None, limiter=None):
+    page = fetch_player_page(pid, cache=cache, limiter=limiter)
+    logger.info(f"[{pid}] - Scraping...")
+    return scrape_player_page(page, pid)
+
+
+def scrape_player_page(page, pid, parser=None, timings=None):
+    """Builds a player from the HTML of his page. If a dict is passed as timings, the time spent on each step (soup,
+    index, header, career, combine) is added to it, in seconds."""
+    timings = timings if timings is not None else dict()
+    last = time.perf_counter()
+
+    def lap(step):
+        nonlocal last
+        now = time.perf_counter()
+        timings[step] = timings.get(step, 0.0) + now - last
+        last = now
 
-def scrape_player_page(page, pid):
     # Parse HTML file
-    soup = BeautifulSoup(page, 'html.parser')
+    soup = make_soup(page, parser)
+    lap('soup')
 
     # Instanciate the player
     player = Player(pid)
 
+    # Index the page tables once for all the scrapers
+    index = PageIndex(soup)
+    lap('index')
+
     # Scrape the page
     scrape_player_header(soup, player)
-    scrape_career_table(soup, player)
-    scrape_combine_table(soup, player)
+    lap('header')
+    scrape_career_table(soup, player, index)
+    lap('career')
+    scrape_combine_table(soup, player, index)
+    lap('combine')
 
     # Sort out player position
     if (player.position is None) and player.draft_pos:
@@ -0,0 +1,74 @@
+import functools
+import json
+import os
+import re
+import threading
+
+# position.json sits at the root of the repository, next to the package
+POSITION_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                             'position.json')
+UNKNOWN_GROUP = 'N/A'
+
+# Multi-position codes are written like C-G-T, G/T or "LB, DE"
+SEPARATOR_RE = re.compile(r"[\s/,-]+")
+
+
+class PositionRegistry:
+    """Position to position group mapping, loaded once from position.json.
+
+    Codes missing from the file are normalized and split into single positions, the group of the first known one is
+    used. Lookups go through a bounded cache, which is cleared when the mapping is reloaded.
+    """
+
+    def __init__(self, path=POSITION_FILE, cache_size=1024):
+        self.path = path
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self.reload()
+
+    def reload(self, path=None):
+        """Reads the mapping file again, so that edits are picked up without a restart"""
+        with open(path or self.path, 'r') as file:
+            mapping = json.load(file)
+
+        with self._lock:
+            self.path = path or self.path
+            self._mapping = mapping
+            self.group = functools.lru_cache(maxsize=self.cache_size)(self._resolve)
+
+    def _resolve(self, position):
+        if position in self._mapping:
+            return self._mapping[position]
+        if not isinstance(position, str):
+            return UNKNOWN_GROUP
+
+        normalized = position.strip().upper()
+        if normalized in self._mapping:
+            return self._mapping[normalized]
+
+        for part in SEPARATOR_RE.split(normalized):
+            if part in self._mapping:
+                return self._mapping[part]
+        return UNKNOWN_GROUP
+
+    @property
+    def groups(self):
+        return sorted(set(self._mapping.values()))
+
+    def __contains__(self, position):
+        return self.group(position) != UNKNOWN_GROUP
+
+
+_registry = None
+
+
+def get_registry():
+    """Shared registry, loaded on first use"""
+    global _registry
+    if _registry is None:
+        _registry = PositionRegistry()
+    return _registry
+
+
+def reload_positions(path=None):
+    get_registry().reload(path)
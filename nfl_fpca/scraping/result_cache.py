@@ -0,0 +1,105 @@
+import functools
+import hashlib
+import inspect
+import json
+import os
+import time
+
+from peewee import CharField, FloatField, Model, SqliteDatabase, TextField
+
+from ..config import setup_logging
+from ..metrics import get_metrics
+from ..models import player as player_model
+from ..models.player import Player
+from . import parsers, player_scrapper, positions, utils
+from .cache import DEFAULT_CACHE_DIR, bound_model
+
+# Configure module logger from config file
+logger = setup_logging(__name__, 'logs/scraping.log')
+
+# Bump to invalidate every parsed result when the output changes for a reason the sources below do not show
+PARSER_REVISION = 1
+PARSER_MODULES = (player_scrapper, utils, positions, parsers, player_model)
+
+
+@functools.lru_cache(maxsize=None)
+def _sources_digest():
+    digest = hashlib.sha256(str(PARSER_REVISION).encode())
+    for module in PARSER_MODULES:
+        digest.update(inspect.getsource(module).encode('utf-8'))
+    with open(positions.POSITION_FILE, 'rb') as file:
+        digest.update(file.read())
+    return digest.hexdigest()
+
+
+def parser_version(parser=None):
+    """Stamp of the code and data a player is built with: the sources of the scraping modules and of Player, the
+    position mapping and the parser backend (the current one by default), since lxml and html.parser do not always
+    build the same tree. Any change to them gives a new version, and results parsed by the previous one go stale."""
+    digest = hashlib.sha256(_sources_digest().encode())
+    digest.update((parser or parsers.get_parser()).encode())
+    return digest.hexdigest()[:16]
+
+
+class ParsedResult(Model):
+    """A player parsed from a page, keyed by the hash of the page. The player is stored as the JSON of its fields."""
+    digest = CharField(primary_key=True)
+    version = CharField(index=True)
+    fields = TextField()
+    parsed_at = FloatField()
+
+
+class ResultCache:
+    """Persistent store of parsed players, next to the page cache.
+
+    A page whose HTML was already parsed by the current parser version is turned back into a Player without building its
+    soup. Entries of other versions are never served, prune() deletes them.
+    """
+
+    def __init__(self, root=DEFAULT_CACHE_DIR, version=None):
+        self.version = version or parser_version()
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(root, exist_ok=True)
+        self.db = SqliteDatabase(os.path.join(root, 'parsed.db'))
+        self.model = bound_model(ParsedResult, self.db)
+        self.db.create_tables([self.model], safe=True)
+
+    def get(self, digest, pid):
+        """The player parsed from the page with this digest, under the given pid, or None"""
+        entry = self.model.get_or_none((self.model.digest == digest) & (self.model.version == self.version))
+        if entry is None:
+            self.misses += 1
+            get_metrics().inc('parse_cache', result='miss')
+            return None
+
+        self.hits += 1
+        get_metrics().inc('parse_cache', result='hit')
+        return Player.from_dict({**json.loads(entry.fields), 'pid': pid})
+
+    def store(self, digest, player):
+        fields = player.to_dict()
+        del fields['pid']
+        (self.model
+         .insert(digest=digest, version=self.version, fields=json.dumps(fields), parsed_at=time.time())
+         .on_conflict_replace()
+         .execute())
+
+    def prune(self):
+        """Deletes the results of other parser versions, returns how many there were"""
+        deleted = self.model.delete().where(self.model.version != self.version).execute()
+        if deleted:
+            logger.info(f"Pruned {deleted} parsed results of previous parser versions")
+        return deleted
+
+    def __len__(self):
+        return self.model.select().where(self.model.version == self.version).count()
+
+    def log_stats(self):
+        total = self.hits + self.misses
+        logger.info(f"Parsed results: {self.hits} reused, {self.misses} parsed "
+                    f"({self.hits / total if total else 0:.0%} of the parses skipped)")
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,60 @@
+import os
+import re
+import tarfile
+import zipfile
+
+from .cache import PageCache
+
+PAGE_EXTENSIONS = ('.htm', '.html')
+PLAYER_URL_RE = re.compile(r"/players/\w/(\w+)\.htm$")
+
+
+def pid_from_name(name):
+    """Player ID from a saved page name, i.e. 'players/B/BrowAJ00.htm' -> 'BrowAJ00'"""
+    return os.path.splitext(os.path.basename(name))[0]
+
+
+def _iter_directory(path):
+    for dirpath, _, filenames in os.walk(path):
+        for filename in sorted(filenames):
+            if filename.endswith(PAGE_EXTENSIONS):
+                with open(os.path.join(dirpath, filename), encoding='utf-8') as file:
+                    yield pid_from_name(filename), file.read()
+
+
+def _iter_zip(path):
+    with zipfile.ZipFile(path) as archive:
+        for name in archive.namelist():
+            if name.endswith(PAGE_EXTENSIONS):
+                yield pid_from_name(name), archive.read(name).decode('utf-8')
+
+
+def _iter_tar(path):
+    with tarfile.open(path) as archive:
+        for member in archive:
+            if member.isfile() and member.name.endswith(PAGE_EXTENSIONS):
+                yield pid_from_name(member.name), archive.extractfile(member).read().decode('utf-8')
+
+
+def _iter_cache(path):
+    cache = PageCache(path)
+    try:
+        for url in list(cache):
+            match = PLAYER_URL_RE.search(url)
+            if match:
+                yield match.group(1), cache.read(cache.get(url))
+    finally:
+        cache.close()
+
+
+def iter_saved_pages(source):
+    """Yields (pid, html) for every player page saved in a directory, a zip/tar archive or a page cache"""
+    if os.path.isdir(source):
+        if os.path.exists(os.path.join(source, 'index.db')):
+            return _iter_cache(source)
+        return _iter_directory(source)
+    if zipfile.is_zipfile(source):
+        return _iter_zip(source)
+    if tarfile.is_tarfile(source):
+        return _iter_tar(source)
+    raise ValueError(f"{source} is not a directory, a zip or a tar archive")
@@ -0,0 +1,126 @@
+import asyncio
+import threading
+import time
+
+from collections import defaultdict
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from ..metrics import get_metrics
+
+
+# pro-football-reference allows roughly 30 requests per minute, stay safely below
+DEFAULT_RATE = 1 / 2.1
+
+
+class TokenBucket:
+    """Thread-safe token bucket that hands out `rate` tokens per second, with bursts of up to `capacity` tokens."""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def try_acquire(self, tokens=1):
+        """Takes tokens if available, returns the number of seconds to wait otherwise (0 on success)"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens=1):
+        """Blocks until the tokens are available"""
+        wait = self.try_acquire(tokens)
+        while wait > 0:
+            time.sleep(wait)
+            wait = self.try_acquire(tokens)
+
+    async def acquire_async(self, tokens=1):
+        """Waits for the tokens without blocking the event loop"""
+        wait = self.try_acquire(tokens)
+        while wait > 0:
+            await asyncio.sleep(wait)
+            wait = self.try_acquire(tokens)
+
+
+class HostRateLimiter:
+    """Keeps one token bucket per host so that every site is throttled independently."""
+
+    def __init__(self, rate=DEFAULT_RATE, capacity=1, counters=None):
+        self.rate = rate
+        self.capacity = capacity
+        self.counters = counters
+        self._buckets = dict()
+        self._lock = threading.Lock()
+
+    def bucket(self, host):
+        with self._lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(self.rate, self.capacity)
+            return self._buckets[host]
+
+    def acquire(self, url):
+        start = time.perf_counter()
+        self.bucket(urlsplit(url).netloc).acquire()
+        if self.counters is not None:
+            self.counters.add('throttle', elapsed=time.perf_counter() - start)
+
+    async def acquire_async(self, url):
+        """Same as acquire for coroutines, the buckets are shared so sync and async fetches draw from the same budget"""
+        start = time.perf_counter()
+        await self.bucket(urlsplit(url).netloc).acquire_async()
+        if self.counters is not None:
+            self.counters.add('throttle', elapsed=time.perf_counter() - start)
+
+
+class StageCounters:
+    """Item counts and busy time for each stage of the pipeline, to see where the time goes."""
+
+    def __init__(self):
+        self.counts = defaultdict(int)
+        self.busy = defaultdict(float)
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def add(self, stage, count=1, elapsed=0.0):
+        with self._lock:
+            self.counts[stage] += count
+            self.busy[stage] += elapsed
+        metrics = get_metrics()
+        metrics.inc('stage_items', count, stage=stage)
+        metrics.inc('stage_busy_seconds', elapsed, stage=stage)
+
+    @contextmanager
+    def time(self, stage, count=1):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, count, time.perf_counter() - start)
+
+    def throughput(self, stage):
+        """Items per second of busy time for a stage"""
+        busy = self.busy[stage]
+        return self.counts[stage] / busy if busy > 0 else 0.0
+
+    def summary(self):
+        wall = time.monotonic() - self.started
+        return {stage: {'count': self.counts[stage],
+                        'busy': round(self.busy[stage], 3),
+                        'share': round(self.busy[stage] / wall, 3) if wall > 0 else 0.0,
+                        'per_second': round(self.throughput(stage), 3)}
+                for stage in self.counts}
+
+    def log(self, logger):
+        for stage, stats in self.summary().items():
+            logger.info(f"{stage}: {stats['count']} items, {stats['busy']}s busy "
+                        f"({stats['share']:.0%} of wall time), {stats['per_second']}/s")
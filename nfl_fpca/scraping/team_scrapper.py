@@ -1,39 +1,90 @@
+import contextlib
 import requests
 
-from bs4 import BeautifulSoup
-
-from ..config import setup_logging
-from .utils import find_table
+from ..config import current_season, setup_logging
+from ..metrics import get_metrics
+from .client import describe_error
+from .parsers import make_soup
+from .cache import ROSTER_TTL, page_digest
+from .utils import PageIndex, fetch_page, get_base_url
 
 # Configure module logger from config file
 logger = setup_logging(__name__, 'logs/scraping.log')
 
 
-def fetch_and_scrape_player_ids(team, year, pid_set):
-    """Wrapper for scrape_player_ids that handles the page request from a URL"""
-    # Create team page URL
-    url = f"https://www.pro-football-reference.com/teams/{team}/{year}_roster.htm"
+def roster_url(team, year):
+    """Creates team roster page URL"""
+    return f"{get_base_url()}/teams/{team}/{year}_roster.htm"
+
+
+def roster_ttl(year):
+    """Past rosters never change, only the current season's needs to be refreshed"""
+    return ROSTER_TTL if year >= current_season() else None
+
+
+def fetch_roster_page(team, year, cache=None, limiter=None):
+    """Requests a team roster page and returns its HTML, or None if the request failed"""
+    url = roster_url(team, year)
 
-    # Request URL and parse the content
     try:
-        response = requests.get(url)
-        response.raise_for_status()
+        page = fetch_page(url, cache=cache, limiter=limiter, ttl=roster_ttl(year))
     except requests.exceptions.RequestException as e:
-        logger.error(f"[{team.upper()}] - Fetching {year} roster page failed with code {e.response.status_code}")
-        return set()
+        logger.error(f"[{team.upper()}] - Fetching {year} roster page failed with {describe_error(e)}")
+        return None
     else:
         logger.debug(f"[{team.upper()}] - Requested {url} successfully")
-        logger.info(f"[{team.upper()}] - Scraping {year} roster...")
-        return scrape_player_ids(response.text, pid_set)
+        return page
+
+
+def fetch_roster_pids(team, year, index=None, cache=None, limiter=None, counters=None):
+    """Player IDs on a team roster, or None if the page could not be fetched.
+
+    With a roster index (see JobPlanner), a roster of a closed season that was already indexed is not requested again,
+    and a page identical to the one indexed is not parsed again. Fetch and parse times are added to `counters`.
+    """
+    def timed(stage):
+        return counters.time(stage) if counters is not None else contextlib.nullcontext()
+
+    if index is not None:
+        pids = index.indexed_roster(team, year)
+        if pids is not None:
+            get_metrics().inc('roster_index', result='immutable')
+            return pids
+
+    with timed('roster_fetch'):
+        page = fetch_roster_page(team, year, cache=cache, limiter=limiter)
+    if page is None:
+        return None
+
+    digest = page_digest(page)
+    pids = index.indexed_roster(team, year, digest) if index is not None else None
+    if pids is not None:
+        get_metrics().inc('roster_index', result='unchanged')
+    else:
+        get_metrics().inc('roster_index', result='parsed')
+        with timed('roster_parse'):
+            pids = scrape_player_ids(page, set())
+
+    # An empty roster is most likely a page that did not render properly, it is requested again next time
+    if index is not None and pids:
+        index.index_roster(team, year, digest, pids)
+    return pids
+
+
+def fetch_and_scrape_player_ids(team, year, pid_set, cache=None, limiter=None, index=None):
+    """Player IDs on a team roster that are not in pid_set, an empty set if the page could not be fetched"""
+    logger.info(f"[{team.upper()}] - Scraping {year} roster...")
+    pids = fetch_roster_pids(team, year, index, cache, limiter)
+    return pids - pid_set if pids is not None else set()
 
 
-def scrape_player_ids(page, pid_set):
+def scrape_player_ids(page, pid_set, parser=None):
     """Parse player IDs from the roster table of a team page"""
     # Parse html file
-    soup = BeautifulSoup(page, 'html.parser')
+    soup = make_soup(page, parser)
 
-    # The roster table is in a comment, so it needs to be extracted first to be searched
-    table = find_table(soup, "div_roster")
+    # The roster table is in a comment, the page index parses it along with the rest of the page
+    table = PageIndex(soup).table("roster")
     if table is None:
         logger.error(f'No roster table found')
         return pid_set
@@ -1,43 +1,101 @@
 from collections import defaultdict
-import json
 
-from bs4 import BeautifulSoup, Comment
+from bs4 import Comment
+
+from .client import get_client
+from .parsers import make_soup, parser_of
+from .positions import get_registry
+
+# Site every page is requested from, tests and benchmarks point it to a local server
+BASE_URL = "https://www.pro-football-reference.com"
+_base_url = BASE_URL
+
+
+def get_base_url():
+    return _base_url
+
+
+def set_base_url(url=BASE_URL):
+    global _base_url
+    _base_url = url.rstrip('/')
+
+
+def fetch_page(url, cache=None, limiter=None, ttl=None, refresh=False, client=None):
+    """Requests a page and returns its HTML, going through the page cache if one is given. With refresh, a cached page
+    is revalidated even if it has not expired."""
+    client = client or get_client()
+    if cache is not None:
+        return cache.fetch(url, ttl=ttl, limiter=limiter, refresh=refresh, client=client)
+
+    response = client.get(url, limiter=limiter)
+    response.raise_for_status()
+    return response.text
+
+
+class PageIndex:
+    """Maps the id of every table on a page to its node, including the tables hidden in HTML comments.
+
+    The document is walked once and each comment containing a table is parsed once, so that looking up several tables
+    on the same page does not rescan it every time.
+    """
+
+    def __init__(self, soup):
+        self.soup = soup
+        self.tables = dict()
+        parser = parser_of(soup)
+
+        for node in soup.descendants:
+            if isinstance(node, Comment):
+                if '<table' in node:
+                    for table in make_soup(node, parser).find_all('table'):
+                        self._add(table)
+            elif node.name == 'table':
+                self._add(node)
+
+    def _add(self, table):
+        tid = table.get('id')
+        if tid and tid not in self.tables:
+            self.tables[tid] = table
+
+    def table(self, tid):
+        """Returns the table with the given id, table containers ids ('div_<id>') are accepted too"""
+        if tid.startswith('div_') and tid not in self.tables:
+            tid = tid[len('div_'):]
+        return self.tables.get(tid)
+
+    def __contains__(self, tid):
+        return self.table(tid) is not None
 
 
 def find_table(soup, tid):
-    # Find all comments on the page
-    comments = soup.find_all(string=lambda text: isinstance(text, Comment))
+    return PageIndex(soup).table(tid)
 
-    # Search the comments for the table
-    for comment in comments:
-        if f'id="{tid}"' in comment:
-            return BeautifulSoup(comment, 'html.parser')
-    return None
+
+def has_av_column(table):
+    """Checks the table header for an approximate value column"""
+    header = table.thead or table
+    return header.find('th', attrs={'data-stat': 'av'}) is not None
 
 
-def get_career_table(soup):
+def get_career_table(soup, index=None):
     """ Finds and returns the table on a player's page which contains his AV for each year."""
     # TODO: speed function up with position based assumptions (i.e. a QB won't have his AV in a defense table)
     titles = ['passing', 'rushing_and_receiving', 'receiving_and_rushing', 'defense', 'kicking', 'punting', 'returns',
               'games_played']  # All possible table names
 
+    index = index or PageIndex(soup)
+
     # Load each table and if it exists, check if there is an AV column in it
     for title in titles:
-        table = soup.find('table', attrs={'id': title})
-        if (table is not None) and ('AV' in table.text):
+        table = index.table(title)
+        if (table is not None) and has_av_column(table):
             return table
     return None
 
 
 def get_position_group(position):
     """ Groups all positions into groups for simpler data handling. """
-    with open("position.json", "r") as file:
-        pos_dict = json.load(file)
-
-        if position in pos_dict:
-            return pos_dict[position]
-        else:
-            return 'N/A'
+    return get_registry().group(position)
 
 
 def get_position_group_from_history(pos_list, av_list):
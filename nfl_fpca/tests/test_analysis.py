@@ -0,0 +1,257 @@
+import os
+import unittest
+
+import numpy as np
+
+from ..analysis.career_matrix import META_DTYPE, CareerMatrix, build_career_matrix, load_career_matrix
+from ..analysis import kernels
+from ..analysis.fpca import FPCA, bspline_basis, fit_position_groups
+from ..analysis.parallel import fit_groups_parallel, shared_matrix
+from ..database import db_handling
+from .test_database import DatabaseTestCase, make_player
+
+
+class TestCareerMatrix(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        qb = make_player("QB000001", av=(3, 6, 12), start_year=2000, position_group='QB')
+        wr = make_player("WR000001", av=(1, 8), start_year=2005, position_group='WR')
+        # Missed the 2006 season
+        del wr.stats[2006]
+        wr.stats[2007] = {'pos': 'WR', 'gp': 16, 'gs': 16, 'av': 9}
+        wr.last_year = 2007
+        db_handling.add_players([qb, wr])
+
+    def test_year_alignment(self):
+        matrix = build_career_matrix()
+
+        self.assertEqual(list(matrix.pids), ["QB000001", "WR000001"])
+        np.testing.assert_array_equal(matrix.av, [[3, 6, 12], [1, 0, 9]])
+        np.testing.assert_array_equal(matrix.mask, [[True, True, True], [True, False, True]])
+        np.testing.assert_array_equal(matrix.grid, [0, 1, 2])
+
+    def test_age_alignment(self):
+        matrix = build_career_matrix(align='age', max_length=2)
+
+        # Both players start at 22
+        self.assertEqual(matrix.origin, 22)
+        np.testing.assert_array_equal(matrix.av, [[3, 6], [1, 0]])
+
+    def test_group(self):
+        matrix = build_career_matrix().group('QB')
+        self.assertEqual(len(matrix), 1)
+        self.assertEqual(matrix.meta['career_length'][0], 3)
+
+    def test_npz_cache(self):
+        cache_dir = os.path.join(self.tmp, 'cache')
+        matrix = load_career_matrix(cache_dir=cache_dir)
+        self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+        cached = load_career_matrix(cache_dir=cache_dir)
+        self.assertIsInstance(cached, CareerMatrix)
+        np.testing.assert_array_equal(cached.av, matrix.av)
+        np.testing.assert_array_equal(cached.meta, matrix.meta)
+
+
+def synthetic_matrix(n=200, length=15, seed=0):
+    """Career curves made of a mean curve and two modes of variation"""
+    rng = np.random.default_rng(seed)
+    t = np.linspace(0, 1, length)
+    mean = 10 * np.sin(np.pi * t)
+    modes = np.stack([np.sin(np.pi * t), np.sin(2 * np.pi * t)])
+    scores = rng.normal(size=(n, 2)) * [4.0, 1.5]
+    av = mean + scores @ modes + rng.normal(scale=0.1, size=(n, length))
+
+    meta = np.zeros(n, dtype=META_DTYPE)
+    meta['pid'] = [f"P{i:05d}" for i in range(n)]
+    meta['position_group'] = np.where(np.arange(n) % 2, 'QB', 'WR')
+    shape = av.shape
+    return CareerMatrix(meta, av, np.zeros(shape), np.zeros(shape), np.ones(shape, dtype=bool))
+
+
+class TestFPCA(unittest.TestCase):
+
+    def setUp(self):
+        self.matrix = synthetic_matrix()
+
+    def test_basis(self):
+        basis = bspline_basis(np.linspace(0, 14, 50), n_basis=8)
+        self.assertEqual(basis.shape, (50, 8))
+        np.testing.assert_allclose(basis.sum(axis=1), 1.0)
+
+    def test_components(self):
+        model = FPCA(n_components=3, smoothing=0.1).fit(self.matrix)
+
+        self.assertEqual(model.eigenfunctions().shape, (3, 101))
+        # Two modes of variation in the data
+        self.assertGreater(model.explained_variance_ratio[:2].sum(), 0.99)
+        self.assertEqual(model.transform(self.matrix).shape, (200, 3))
+
+    def test_incremental(self):
+        full = FPCA(smoothing=0.1).fit(self.matrix)
+        incremental = FPCA(smoothing=0.1)
+        incremental.partial_fit(self.matrix.subset(slice(0, 120)))
+        incremental.partial_fit(self.matrix.subset(slice(120, None)))
+
+        np.testing.assert_allclose(incremental.components, full.components, atol=1e-8)
+        np.testing.assert_allclose(incremental.explained_variance, full.explained_variance)
+
+    def test_randomized(self):
+        exact = FPCA(n_components=2, smoothing=0.1).fit(self.matrix)
+        randomized = FPCA(n_components=2, smoothing=0.1).fit(self.matrix, method='randomized')
+
+        np.testing.assert_allclose(randomized.components, exact.components, atol=1e-6)
+        np.testing.assert_allclose(randomized.explained_variance, exact.explained_variance)
+
+    def test_position_groups(self):
+        results = fit_position_groups(self.matrix, n_components=2)
+        self.assertEqual(set(results), {'QB', 'WR'})
+        self.assertEqual(results['QB'][1].shape, (100, 2))
+
+
+class TestIncrementalCohorts(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        rng = np.random.default_rng(0)
+        # Veterans with full careers first, then a cohort of players who only have a few seasons
+        veterans = [make_player(f"WR{i:06d}", av=tuple(rng.integers(0, 15, 8)), start_year=2000 + i % 5)
+                    for i in range(20)]
+        rookies = [make_player(f"QB{i:06d}", av=tuple(rng.integers(0, 15, 2 + i % 2)), start_year=2015,
+                               position_group='QB') for i in range(10)]
+        db_handling.add_players(veterans + rookies)
+
+    def test_new_cohort(self):
+        veterans = build_career_matrix(positions=['WR'], max_length=8)
+        rookies = build_career_matrix(positions=['QB'], max_length=8)
+        np.testing.assert_array_equal(rookies.grid, veterans.grid)
+
+        incremental = FPCA(n_components=2).partial_fit(veterans).partial_fit(rookies)
+        full = FPCA(n_components=2).fit(build_career_matrix(max_length=8))
+        np.testing.assert_allclose(incremental.explained_variance, full.explained_variance)
+
+    def test_shorter_grid(self):
+        model = FPCA(n_components=2).partial_fit(build_career_matrix(positions=['WR'], align='age'))
+        rookies = build_career_matrix(positions=['QB'], align='age')
+        self.assertLess(rookies.grid.size, 8)
+
+        model.partial_fit(rookies)
+        self.assertEqual(model.n_samples, 30)
+        self.assertEqual(model.transform(rookies).shape, (10, 2))
+
+    def test_seasons_outside_domain(self):
+        model = FPCA(n_components=2).partial_fit(build_career_matrix(positions=['QB']))
+        with self.assertRaises(ValueError):
+            model.partial_fit(build_career_matrix(positions=['WR']))
+
+
+class TestParallelFits(unittest.TestCase):
+
+    def setUp(self):
+        self.matrix = synthetic_matrix()
+
+    def test_shared_matrix(self):
+        with shared_matrix(self.matrix) as shared:
+            matrix = shared.open()
+            self.assertIsInstance(matrix.av, np.memmap)
+            np.testing.assert_array_equal(matrix.meta, self.matrix.meta)
+        self.assertFalse(os.path.exists(shared.directory))
+
+    def test_same_as_serial(self):
+        serial = fit_position_groups(self.matrix, n_components=2, smoothing=0.1)
+        parallel = fit_groups_parallel(self.matrix, n_jobs=2, n_components=2, smoothing=0.1)
+
+        self.assertEqual(set(parallel), set(serial))
+        for group, (model, scores) in serial.items():
+            np.testing.assert_allclose(parallel[group].model.components, model.components)
+            np.testing.assert_allclose(parallel[group].scores, scores)
+            self.assertGreater(parallel[group].seconds['fit'], 0)
+
+    def test_bootstrap(self):
+        results = fit_groups_parallel(self.matrix, n_bootstrap=20, n_jobs=2, n_components=2, smoothing=0.1)
+        again = fit_groups_parallel(self.matrix, n_bootstrap=20, n_jobs=1, n_components=2, smoothing=0.1)
+
+        fit = results['WR']
+        self.assertEqual(fit.lower.shape, (2, 101))
+        self.assertTrue(np.all(fit.lower <= fit.upper))
+        # The first eigenfunction of the whole group lies within its band
+        first = fit.model.eigenfunctions(fit.grid)[0]
+        self.assertTrue(np.all((fit.lower[0] - 1e-9 <= first) & (first <= fit.upper[0] + 1e-9)))
+        # Seeds do not depend on the scheduling
+        np.testing.assert_allclose(again['WR'].upper, fit.upper)
+
+
+def random_careers(n=300, width=12, seed=0):
+    """gp, av and mask of careers of random lengths, with a few missing seasons"""
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(0, width + 1, n)
+    mask = (np.arange(width) < lengths[:, None]) & (rng.random((n, width)) > 0.15)
+    gp = np.where(mask, rng.integers(0, 17, (n, width)), 0).astype(float)
+    av = np.where(mask, rng.integers(0, 15, (n, width)), 0).astype(float)
+    return gp, av, mask
+
+
+class TestKernels(unittest.TestCase):
+
+    def setUp(self):
+        self.gp, self.av, self.mask = random_careers()
+
+    def test_injury_filter(self):
+        keep = kernels.injury_filter(self.gp, self.mask, backend='numpy')
+        np.testing.assert_array_equal(keep, kernels._injury_loop(self.gp, self.mask, 3))
+
+        # Same seasons as the Player method
+        for i in range(20):
+            years = np.flatnonzero(self.mask[i])
+            player = make_player("P0001", start_year=2000)
+            player.stats = {2000 + int(j): {'pos': 'WR', 'gp': int(self.gp[i, j]), 'gs': 0, 'av': 0} for j in years}
+            player.adjust_for_injuries()
+            self.assertEqual(player.get_stats_array()[1], (2000 + np.flatnonzero(keep[i])).tolist())
+
+    def test_fill_gaps(self):
+        values, mask = kernels.fill_gaps(self.av, self.mask, backend='numpy')
+        expected_values, expected_mask = kernels._fill_loop(self.av, self.mask)
+        np.testing.assert_allclose(values, expected_values)
+        np.testing.assert_array_equal(mask, expected_mask)
+
+        values, mask = kernels.fill_gaps([[2, 0, 0, 8, 0]], [[True, False, False, True, False]])
+        np.testing.assert_allclose(values, [[2, 4, 6, 8, 0]])
+        np.testing.assert_array_equal(mask, [[True, True, True, True, False]])
+
+    def test_smooth(self):
+        smoothed = kernels.smooth(self.av, self.mask, bandwidth=1.5, backend='numpy')
+        np.testing.assert_allclose(smoothed, kernels._smooth_loop(self.av, self.mask, 1.5))
+
+    def test_resample(self):
+        shifts = np.random.default_rng(1).integers(21, 26, len(self.av)) + 0.5
+        grid = np.arange(20, 40, dtype=float)
+        values, mask = kernels.resample(self.av, self.mask, shifts, grid, backend='numpy')
+        expected_values, expected_mask = kernels._resample_loop(self.av, self.mask, shifts, grid)
+        np.testing.assert_allclose(values, expected_values)
+        np.testing.assert_array_equal(mask, expected_mask)
+
+    def test_backends(self):
+        with self.assertRaises(ValueError):
+            kernels.smooth(self.av, self.mask, backend='cuda')
+        if kernels.njit is None:
+            with self.assertRaises(ImportError):
+                kernels.smooth(self.av, self.mask, backend='numba')
+
+
+class TestPreprocess(DatabaseTestCase):
+
+    def test_age_alignment(self):
+        db_handling.add_players([make_player("QB000001", av=(3, 6, 12), position_group='QB'),
+                                 make_player("WR000001", av=(1, 8), position_group='WR')])
+        expected = build_career_matrix(align='age')
+        matrix = kernels.preprocess(build_career_matrix(), injury_threshold=None, align='age')
+
+        self.assertEqual((matrix.align, matrix.origin), ('age', expected.origin))
+        width = expected.av.shape[1]
+        np.testing.assert_array_equal(matrix.av[:, :width], expected.av)
+        np.testing.assert_array_equal(matrix.mask[:, :width], expected.mask)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import re
+import threading
+import time
+import unittest
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .. import async_core, core
+from ..database import db_handling
+from ..planner import JobPlanner
+from ..scraping.utils import set_base_url
+from .test_database import DatabaseTestCase
+
+PLAYER_PAGE = "nfl_fpca/tests/test_pages/player/player_full.html"
+
+ROSTER_RE = re.compile(r"^/teams/(\w+)/(\d{4})_roster\.htm$")
+PLAYER_RE = re.compile(r"^/players/\w/(\w+)\.htm$")
+
+
+def roster_html(pids):
+    """Minimal roster page, with the table hidden in a comment like on the site"""
+    rows = "".join(f'<tr><td data-append-csv="{pid}" csk="{pid}">{pid}</td></tr>' for pid in pids)
+    return (f'<html><body><div class="table_container" id="div_roster"><!--'
+            f'<table id="roster"><tbody>{rows}</tbody></table>--></div></body></html>')
+
+
+class MockSite:
+    """Local stand-in for the site: `roster_size` players per roster, half of them new every season, each request
+    answered after `latency` seconds. Every player gets the same page."""
+
+    def __init__(self, roster_size=6, latency=0.0, missing=()):
+        with open(PLAYER_PAGE) as page:
+            self.player_page = page.read().encode('utf-8')
+        self.roster_size = roster_size
+        self.latency = latency
+        self.missing = set(missing)
+        self.requests = []
+
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                site.requests.append(self.path)
+                time.sleep(site.latency)
+                body = site.page(self.path)
+                self.send_response(200 if body is not None else 404)
+                self.send_header('Content-Length', str(len(body or b"")))
+                self.end_headers()
+                self.wfile.write(body or b"")
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def roster(self, team, year):
+        first = (year - 2000) * self.roster_size // 2
+        return [f"{team.capitalize()}{i:04d}" for i in range(first, first + self.roster_size)]
+
+    def page(self, path):
+        match = ROSTER_RE.match(path)
+        if match:
+            return roster_html(self.roster(match.group(1), int(match.group(2)))).encode('utf-8')
+        match = PLAYER_RE.match(path)
+        if match and match.group(1) not in self.missing:
+            return self.player_page
+        return None
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        set_base_url(self.url)
+        return self
+
+    def __exit__(self, *exc):
+        set_base_url()
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TestAsyncPipeline(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        JobPlanner().reset()
+
+    def run_pipeline(self, site, pipeline, **kwargs):
+        with site:
+            pipeline(2010, 2012, 'crd', rate=1000, workers=1, cache_dir=None, **kwargs)
+
+    def test_same_players_as_sync_pipeline(self):
+        site = MockSite()
+        self.run_pipeline(site, async_core.run_async_scraping_pipeline, concurrency=4)
+        async_pids = db_handling.get_stored_pids()
+
+        # Three seasons of six players, three of them new each season
+        self.assertEqual(len(async_pids), 12)
+        self.assertEqual(len([path for path in site.requests if path.startswith('/players')]), 12)
+
+        db_handling.reset()
+        JobPlanner().reset()
+        self.run_pipeline(MockSite(), core.run_scraping_pipeline)
+        self.assertEqual(db_handling.get_stored_pids(), async_pids)
+
+    def test_failed_players_are_dead_lettered(self):
+        # 404 is not retried, the player goes to the dead-letter queue and the retry pass fails again
+        self.run_pipeline(MockSite(missing={'Crd0031'}), async_core.run_async_scraping_pipeline)
+
+        self.assertNotIn('Crd0031', db_handling.get_stored_pids())
+        self.assertEqual(len(db_handling.get_stored_pids()), 11)
+        self.assertEqual(JobPlanner().failed_players(), ['Crd0031'])
+
+    def test_players_are_checkpointed(self):
+        self.run_pipeline(MockSite(), async_core.run_async_scraping_pipeline, batch_size=5)
+        self.assertEqual(JobPlanner().done_players(), db_handling.get_stored_pids())
+
+        # Checkpointed players are skipped by the next run, even if they are not in the database
+        db_handling.reset()
+        site = MockSite()
+        self.run_pipeline(site, async_core.run_async_scraping_pipeline)
+        self.assertEqual([path for path in site.requests if path.startswith('/players')], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
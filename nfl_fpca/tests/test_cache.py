@@ -0,0 +1,161 @@
+import os
+import tempfile
+import unittest
+
+from unittest import mock
+
+from ..models.player import Player
+from ..scraping.cache import PageCache, page_digest
+from ..scraping.result_cache import ResultCache, parser_version
+
+
+def fake_response(status_code=200, text='', headers=None):
+    response = mock.Mock(status_code=status_code, text=text, headers=headers or {})
+    response.raise_for_status = mock.Mock()
+    return response
+
+
+class TestPageCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = PageCache(self.tmp.name)
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmp.cleanup()
+
+    def test_store_and_read(self):
+        self.cache.store('https://a/1', '<html>one</html>')
+        self.assertIn('https://a/1', self.cache)
+        self.assertEqual(self.cache.read(self.cache.get('https://a/1')), '<html>one</html>')
+
+    def test_content_addressed(self):
+        self.cache.store('https://a/1', '<html>same</html>')
+        self.cache.store('https://a/2', '<html>same</html>')
+        self.assertEqual(self.cache.get('https://a/1').digest, self.cache.get('https://a/2').digest)
+
+        blobs = [name for _, _, names in os.walk(os.path.join(self.tmp.name, 'objects')) for name in names]
+        self.assertEqual(len(blobs), 1)
+
+    def test_lru_eviction(self):
+        self.cache.store('https://a/1', 'a' * 1000)
+        size = self.cache.total_bytes
+        self.cache.max_bytes = 2 * size + 10
+
+        self.cache.store('https://a/2', 'b' * 1000)
+        self.cache.read(self.cache.get('https://a/1'))
+        self.cache.store('https://a/3', 'c' * 1000)
+
+        self.assertIn('https://a/1', self.cache)
+        self.assertNotIn('https://a/2', self.cache)
+        self.assertIn('https://a/3', self.cache)
+
+    def test_running_total(self):
+        self.cache.store('https://a/1', 'a' * 1000)
+        self.cache.store('https://a/2', 'a' * 1000)
+        self.cache.store('https://a/3', 'b' * 1000)
+        self.cache.store('https://a/3', 'c' * 1000)
+        self.cache.invalidate('https://a/1')
+
+        with mock.patch.object(self.cache, 'evict') as evict:
+            self.cache.store('https://a/4', 'd' * 1000)
+        # No eviction scan below the cap, and the total matches a full count
+        evict.assert_not_called()
+        total = self.cache.total_bytes
+        self.cache._bytes = None
+        self.assertEqual(self.cache.total_bytes, total)
+
+    def test_separate_caches(self):
+        with tempfile.TemporaryDirectory() as other:
+            second = PageCache(other)
+            self.cache.store('https://a/1', 'first')
+            second.store('https://a/2', 'second')
+
+            self.assertIn('https://a/1', self.cache)
+            self.assertNotIn('https://a/2', self.cache)
+            self.assertNotIn('https://a/1', second)
+            self.assertEqual(list(second), ['https://a/2'])
+            second.close()
+
+    def test_fresh_entry_skips_network(self):
+        self.cache.store('https://a/1', 'cached')
+        client = mock.Mock()
+        self.assertEqual(self.cache.fetch('https://a/1', client=client), 'cached')
+        client.get.assert_not_called()
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_revalidation(self):
+        self.cache.store('https://a/1', 'cached', etag='"v1"', ttl=-1)
+        client = mock.Mock()
+        client.get.return_value = fake_response(304)
+        self.assertEqual(self.cache.fetch('https://a/1', ttl=-1, client=client), 'cached')
+        self.assertEqual(client.get.call_args.kwargs['headers'], {'If-None-Match': '"v1"'})
+        self.assertEqual(self.cache.revalidated, 1)
+
+        client.get.return_value = fake_response(200, 'new', {'ETag': '"v2"'})
+        self.assertEqual(self.cache.fetch('https://a/1', client=client), 'new')
+        self.assertEqual(self.cache.get('https://a/1').etag, '"v2"')
+        self.assertTrue(self.cache.is_fresh(self.cache.get('https://a/1')))
+
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.results = ResultCache(self.tmp.name)
+        self.player = Player('BrowAJ00', 'A.J.', 'Brown', 'WR', 'WR', 185, 102, 2019, 22, 2020,
+                             draft_pos='WR', dash=4.49)
+        self.player.stats = {2019: {'pos': 'WR', 'gp': 16, 'gs': 11, 'av': 9},
+                             2020: {'pos': 'WR', 'gp': 14, 'gs': 14, 'av': 11}}
+
+    def tearDown(self):
+        self.results.close()
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        self.results.store(page_digest('<html>aj</html>'), self.player)
+        player = self.results.get(page_digest('<html>aj</html>'), 'BrowAJ00')
+
+        self.assertEqual(player.to_dict(), self.player.to_dict())
+        self.assertEqual((self.results.hits, self.results.misses), (1, 0))
+
+    def test_keyed_by_content(self):
+        self.results.store(page_digest('<html>aj</html>'), self.player)
+
+        self.assertIsNone(self.results.get(page_digest('<html>aj, one more season</html>'), 'BrowAJ00'))
+        # Same HTML under another pid, e.g. a page saved twice
+        self.assertEqual(self.results.get(page_digest('<html>aj</html>'), 'BrowAJ01').pid, 'BrowAJ01')
+
+    def test_parser_change(self):
+        self.results.store(page_digest('<html>aj</html>'), self.player)
+        self.results.close()
+        self.results = ResultCache(self.tmp.name, version='next')
+
+        # Stale results are never served, and only them are pruned
+        self.assertIsNone(self.results.get(page_digest('<html>aj</html>'), 'BrowAJ00'))
+        self.results.store(page_digest('<html>other</html>'), self.player)
+        self.assertEqual(self.results.prune(), 1)
+        self.assertEqual(len(self.results), 1)
+
+    def test_version_is_stable(self):
+        self.assertEqual(self.results.version, parser_version())
+        self.assertEqual(len(parser_version()), 16)
+
+    def test_version_depends_on_backend(self):
+        self.assertNotEqual(parser_version('lxml'), parser_version('html.parser'))
+        with mock.patch.dict(os.environ, {'NFL_FPCA_PARSER': 'html.parser'}):
+            self.assertEqual(parser_version(), parser_version('html.parser'))
+
+    def test_separate_caches(self):
+        with tempfile.TemporaryDirectory() as other:
+            second = ResultCache(other)
+            second.store(page_digest('<html>aj</html>'), self.player)
+
+            self.assertIsNone(self.results.get(page_digest('<html>aj</html>'), 'BrowAJ00'))
+            self.assertEqual(len(second), 1)
+            second.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from .. import cli
+from ..database import db_handling, export
+from .test_database import DatabaseTestCase, make_player
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def run_python(code, cwd):
+    """Runs code in a fresh interpreter, so that modules imported by other tests do not count"""
+    env = {**os.environ, 'PYTHONPATH': REPO_ROOT}
+    env.pop('NFL_FPCA_DB', None)
+    result = subprocess.run([sys.executable, '-c', code], cwd=cwd, env=env, capture_output=True, text=True, check=True)
+    return result.stdout.strip()
+
+
+class TestStartup(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_help_is_light(self):
+        code = ("import sys; from nfl_fpca import cli; cli.build_parser().format_help(); "
+                "print(sorted(m for m in ('numpy', 'peewee', 'bs4', 'requests', 'rich') if m in sys.modules))")
+        self.assertEqual(run_python(code, self.tmp.name), '[]')
+
+    def test_import_has_no_side_effects(self):
+        code = "import nfl_fpca.core; from nfl_fpca.database.db_model import db; print(db.database)"
+        self.assertEqual(run_python(code, self.tmp.name), 'None')
+        # No log file or database until they are used
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+    def test_database_path_resolved_on_connect(self):
+        code = "from nfl_fpca.database import db_handling; db_handling.reset(); print(db_handling.db.database)"
+        path = run_python(code, self.tmp.name).splitlines()[-1]
+
+        self.assertEqual(path, os.path.join(os.path.realpath(self.tmp.name), 'data', 'player.db'))
+        self.assertTrue(os.path.exists(path))
+
+
+class TestCommands(DatabaseTestCase):
+
+    def run_cli(self, *argv):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            self.assertEqual(cli.main(['--db', os.path.join(self.tmp, 'player.db'), *argv]), 0)
+        return out.getvalue()
+
+    def test_export(self):
+        db_handling.add_players([make_player("WR000001"), make_player("QB000001", position_group='QB')])
+        root = os.path.join(self.tmp, 'export')
+
+        self.assertIn('2 partitions written', self.run_cli('export', '--root', root, '--format', 'npy'))
+        self.assertIn('0 partitions written', self.run_cli('export', '--root', root, '--format', 'npy'))
+        self.assertEqual(len(export.read_manifest(root)['partitions']), 2)
+
+    def test_pipeline_defaults(self):
+        args = cli.build_parser().parse_args(['scrape', '2000', '2001', '--rate', '2', '--no-cache'])
+        self.assertEqual(cli._pipeline_kwargs(args, 'rate', 'workers', 'batch_size', 'cache_dir'),
+                         {'rate': 2.0, 'cache_dir': None})
+
+    def test_async_needs_teams(self):
+        with contextlib.redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+            cli.main(['scrape', '2000', '2001', '--async'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import socket
+import threading
+import unittest
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from ..scraping.client import CircuitOpenError, HttpClient, describe_error
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers with the statuses queued on the server, then with 200"""
+
+    def do_GET(self):
+        self.server.requests += 1
+        status, headers = self.server.responses.pop(0) if self.server.responses else (200, {})
+        body = b"ok" if status == 200 else b"error"
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class TestHttpClient(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        self.server.responses = []
+        self.server.requests = 0
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/players/B/BrowAJ00.htm"
+
+        self.delays = []
+        self.client = HttpClient(timeout=2, max_retries=3, backoff=0.5, sleep=self.delays.append)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_retries_on_server_errors(self):
+        self.server.responses = [(503, {}), (429, {})]
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.server.requests, 3)
+        self.assertEqual(len(self.delays), 2)
+        # Jittered exponential backoff
+        self.assertTrue(0.25 <= self.delays[0] <= 0.5)
+        self.assertTrue(0.5 <= self.delays[1] <= 1.0)
+
+    def test_retry_after(self):
+        self.server.responses = [(429, {'Retry-After': '7'})]
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertEqual(self.delays, [7.0])
+
+    def test_gives_up(self):
+        self.server.responses = [(503, {})] * 10
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.server.requests, 4)
+
+    def test_client_errors_are_not_retried(self):
+        self.server.responses = [(404, {})]
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.assertEqual(self.server.requests, 1)
+
+    def test_connection_error(self):
+        url = f"http://127.0.0.1:{free_port()}/"
+        with self.assertRaises(requests.exceptions.ConnectionError) as context:
+            self.client.get(url)
+        self.assertEqual(len(self.delays), 3)
+        self.assertEqual(describe_error(context.exception), 'ConnectionError')
+
+    def test_circuit_breaker(self):
+        client = HttpClient(timeout=2, max_retries=0, breaker_threshold=2, sleep=self.delays.append)
+        self.server.responses = [(503, {})] * 2
+        client.get(self.url)
+        client.get(self.url)
+
+        with self.assertRaises(CircuitOpenError):
+            client.get(self.url)
+        self.assertEqual(self.server.requests, 2)
+
+        # After the cooldown, the next request goes through and closes the circuit
+        client.breaker(f"127.0.0.1:{self.server.server_port}").cooldown = 0
+        self.assertEqual(client.get(self.url).status_code, 200)
+        client.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
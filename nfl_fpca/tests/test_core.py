@@ -0,0 +1,107 @@
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+from concurrent.futures import ThreadPoolExecutor
+
+from ..core import parse_in_pool, run_reparse_pipeline
+from ..database import db_handling
+from ..database.db_model import init_db
+from ..scraping.result_cache import ResultCache
+
+PLAYER_PAGE = "nfl_fpca/tests/test_pages/player/player_full.html"
+
+
+class TestReparse(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        init_db(os.path.join(self.tmp, 'player.db'))
+        db_handling.reset()
+
+        # Saved pages, named after the player IDs
+        self.pages = os.path.join(self.tmp, 'pages')
+        os.makedirs(self.pages)
+        for pid in ('BrowAJ00', 'BarkSa00', 'BaunZa00'):
+            shutil.copy(PLAYER_PAGE, os.path.join(self.pages, f"{pid}.htm"))
+        self.checkpoint = os.path.join(self.tmp, 'reparse.checkpoint')
+
+    def tearDown(self):
+        init_db()
+        shutil.rmtree(self.tmp)
+
+    def test_directory(self):
+        parsed = run_reparse_pipeline(self.pages, workers=2, batch_size=2, checkpoint=self.checkpoint)
+
+        self.assertEqual(parsed, 3)
+        self.assertEqual(db_handling.get_all_pids(retired=0) | db_handling.get_all_pids(),
+                         {'BrowAJ00', 'BarkSa00', 'BaunZa00'})
+
+    def test_archive(self):
+        archive = os.path.join(self.tmp, 'pages.zip')
+        with zipfile.ZipFile(archive, 'w') as file:
+            file.write(PLAYER_PAGE, 'players/B/BrowAJ00.htm')
+
+        self.assertEqual(run_reparse_pipeline(archive, workers=1, checkpoint=self.checkpoint), 1)
+
+    def test_resume_from_checkpoint(self):
+        with open(self.checkpoint, 'w') as file:
+            file.write("BrowAJ00\nBarkSa00\n")
+
+        self.assertEqual(run_reparse_pipeline(self.pages, workers=1, checkpoint=self.checkpoint), 1)
+        with open(self.checkpoint) as file:
+            self.assertEqual(file.read().split(), ['BrowAJ00', 'BarkSa00', 'BaunZa00'])
+
+    def test_unchanged_pages_are_not_parsed(self):
+        results = os.path.join(self.tmp, 'results')
+        run_reparse_pipeline(self.pages, workers=1, checkpoint=self.checkpoint, results_dir=results)
+        stored = [player.to_dict() for chunk in db_handling.load_players(retired=None) for player in chunk]
+        self.assertEqual(len(stored), 3)
+
+        # Another run from scratch reuses the three players instead of parsing the pages again
+        self.assertEqual(run_reparse_pipeline(self.pages, wipe=True, workers=1, checkpoint=self.checkpoint,
+                                              results_dir=results), 3)
+        reloaded = [player.to_dict() for chunk in db_handling.load_players(retired=None) for player in chunk]
+        self.assertEqual(reloaded, stored)
+
+
+class TestParseInPool(unittest.TestCase):
+
+    class CountingPool(ThreadPoolExecutor):
+        submitted = 0
+
+        def submit(self, *args, **kwargs):
+            self.submitted += 1
+            return super().submit(*args, **kwargs)
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        with open(PLAYER_PAGE) as file:
+            self.page = file.read()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def parse(self, pages, results):
+        with self.CountingPool(max_workers=1) as pool:
+            players = dict(parse_in_pool(pool, pages, 2, results=results))
+        return players, pool.submitted
+
+    def test_result_cache(self):
+        results = ResultCache(self.tmp.name)
+        first, submitted = self.parse([('BrowAJ00', self.page)], results)
+        self.assertEqual(submitted, 1)
+
+        # Only the changed page is parsed again
+        changed = self.page.replace('</body>', '<!-- updated --></body>')
+        second, submitted = self.parse([('BrowAJ00', self.page), ('BrowAJ01', changed)], results)
+        self.assertEqual(submitted, 1)
+        self.assertEqual(second['BrowAJ00'].to_dict(), first['BrowAJ00'].to_dict())
+        self.assertEqual((results.hits, results.misses), (1, 2))
+        results.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
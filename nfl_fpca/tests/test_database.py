@@ -0,0 +1,204 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from unittest import mock
+
+from ..config import current_season
+from ..database import db_handling
+from ..database.db_model import SCHEMA_VERSION, PlayerInfo, SeasonStats, db, init_db
+from ..models.player import Player
+
+
+def make_player(pid, av=(3, 6, 12), start_year=2010, position_group='WR'):
+    player = Player(pid)
+    player.set_player_info("Test Player", position_group, position_group, 185, 100)
+    stats = {start_year + i: {'pos': position_group, 'gp': 16, 'gs': 10, 'av': val} for i, val in enumerate(av)}
+    player.set_career_info(start_year, 22, start_year + len(av) - 1, stats)
+    return player
+
+
+class DatabaseTestCase(unittest.TestCase):
+    """Runs each test against a fresh database in a temporary directory"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        init_db(os.path.join(self.tmp, 'player.db'))
+        db_handling.reset()
+
+    def tearDown(self):
+        db.close()
+        init_db()
+        shutil.rmtree(self.tmp)
+
+
+class TestAddPlayers(DatabaseTestCase):
+
+    def test_bulk_insert(self):
+        db_handling.add_players([make_player(f"P{i:04d}") for i in range(25)], chunk_size=10)
+
+        with db.connection_context():
+            self.assertEqual(PlayerInfo.select().count(), 25)
+            self.assertEqual(SeasonStats.select().count(), 75)
+
+    def test_upsert(self):
+        db_handling.add_players([make_player("P0001")])
+        db_handling.add_players([make_player("P0001", av=(4, 7, 13, 2))])
+
+        player = db_handling.load_player("P0001")
+        self.assertEqual(player.get_stats_array('av')[0]['av'], [4, 7, 13, 2])
+        with db.connection_context():
+            self.assertEqual(PlayerInfo.get_by_id("P0001").career_length, 4)
+
+    def test_removed_seasons(self):
+        db_handling.add_players([make_player("P0001", av=(4, 7, 13, 2))])
+        # The last season was a mistake on the page and is gone on the next scrape
+        db_handling.add_players([make_player("P0001", av=(4, 7, 13))])
+        self.assertEqual(db_handling.load_player("P0001").get_stats_array('av')[0]['av'], [4, 7, 13])
+
+    def test_statements_bind_few_values(self):
+        insert_many = SeasonStats.insert_many
+        sizes = []
+
+        def counting_insert_many(rows):
+            sizes.append(len(rows) * len(rows[0]))
+            return insert_many(rows)
+
+        with mock.patch.object(db_handling, 'SQLITE_MAX_VARIABLE_NUMBER', 100), \
+                mock.patch.object(SeasonStats, 'insert_many', counting_insert_many), \
+                mock.patch.object(db_handling.logger, 'exception') as exception:
+            db_handling.add_players([make_player(f"P{i:04d}") for i in range(25)])
+
+        exception.assert_not_called()
+        self.assertTrue(all(size <= 100 for size in sizes))
+        with db.connection_context():
+            self.assertEqual(SeasonStats.select().count(), 75)
+
+    def test_pragmas(self):
+        with db.connection_context():
+            self.assertEqual(db.execute_sql('PRAGMA journal_mode').fetchone()[0], 'wal')
+
+
+class TestUpdatePlayers(DatabaseTestCase):
+
+    def test_only_changed_seasons(self):
+        db_handling.add_players([make_player("P0001", av=(3, 6))])
+
+        # Stats of the second season were corrected, and a third season was played
+        written = db_handling.update_players([make_player("P0001", av=(3, 7, 12))])
+
+        self.assertEqual(written, 2)
+        self.assertEqual(db_handling.load_player("P0001").get_stats_array('av')[0]['av'], [3, 7, 12])
+        self.assertEqual(db_handling.get_active_pids(2012), {"P0001"})
+
+    def test_removed_seasons(self):
+        db_handling.add_players([make_player("P0001", av=(3, 6, 12))])
+        db_handling.update_players([make_player("P0001", av=(3, 6))])
+        self.assertEqual(db_handling.load_player("P0001").get_stats_array('av')[0]['av'], [3, 6])
+
+    def test_retired(self):
+        player = make_player("P0001", start_year=2000)
+        self.assertTrue(player.retired)
+        player.last_year = current_season()
+        self.assertFalse(player.retired)
+
+
+class TestLoadPlayers(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        players = [make_player(f"P{i:04d}", av=tuple(range(i % 5 + 1)), position_group='QB' if i % 2 else 'WR')
+                   for i in range(12)]
+        db_handling.add_players(players)
+
+    def test_chunks(self):
+        chunks = list(db_handling.load_players(chunk_size=5))
+        self.assertEqual([len(chunk) for chunk in chunks], [5, 5, 2])
+
+        players = {player.pid: player for chunk in chunks for player in chunk}
+        for i in range(12):
+            self.assertEqual(players[f"P{i:04d}"].get_stats_array('av')[0]['av'], list(range(i % 5 + 1)))
+
+    def test_matches_load_player(self):
+        for player in next(db_handling.load_players(positions=['QB'])):
+            reference = db_handling.load_player(player.pid)
+            self.assertEqual(player.to_dict(), reference.to_dict())
+            self.assertEqual(player.position_group, 'QB')
+
+    def test_columnar(self):
+        chunk = next(db_handling.load_players(positions=['WR'], columnar=True))
+        self.assertEqual(len(chunk['info']['pid']), 6)
+        self.assertEqual(len(chunk['seasons']['year']), sum(i % 5 + 1 for i in range(0, 12, 2)))
+
+
+class TestCohorts(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        players = [make_player("WR000001", av=(1, 8), start_year=1995),
+                   make_player("WR000002", av=(4, 5, 6, 7), start_year=2003),
+                   make_player("QB000001", start_year=2001, position_group='QB'),
+                   make_player("QB000002", start_year=current_season(), position_group='QB')]
+        players[0].set_combine_data(None, 4.41, None, None, None, None, None)
+        players[1].set_combine_data(None, 4.62, None, None, None, None, None)
+        players[2].set_combine_data(None, None, None, None, None, None, None)
+        db_handling.add_players(players)
+
+    def test_filters(self):
+        cohort = db_handling.get_cohort_pids
+        self.assertEqual(cohort(positions=['WR']), {"WR000001", "WR000002"})
+        self.assertEqual(cohort(start_year=2000, end_year=2009), {"WR000002", "QB000001"})
+        self.assertEqual(cohort(career_length=4), {"WR000002"})
+        self.assertEqual(cohort(max_career_length=2), {"WR000001"})
+        self.assertEqual(cohort(positions=['QB'], retired=None), {"QB000001", "QB000002"})
+        self.assertEqual(cohort(combine={'dash': (None, 4.5)}), {"WR000001"})
+        self.assertEqual(cohort(combine={'dash': (4.5, None)}), {"WR000002"})
+        with self.assertRaises(ValueError):
+            cohort(combine={'height': (None, 180)})
+
+    def test_load_cohort(self):
+        chunks = list(db_handling.load_cohort(chunk_size=1, positions=['WR'], start_year=2000))
+        self.assertEqual([[player.pid for player in chunk] for chunk in chunks], [["WR000002"]])
+
+    def test_query_plans(self):
+        with db.connection_context():
+            plans = {
+                'cohort': db_handling.cohort_query(['WR', 'QB'], 1990, 2009, 3, combine={'dash': (None, 4.5)}),
+                'era': db_handling.cohort_query(start_year=1990),
+                'seasons': SeasonStats.select().where(SeasonStats.pid == "WR000001").order_by(SeasonStats.year),
+            }
+            plans = {name: ' '.join(db_handling.query_plan(query)) for name, query in plans.items()}
+
+        self.assertIn('USING INDEX playerinfo_position_group_retired_start_year', plans['cohort'])
+        self.assertIn('USING INDEX playerinfo_retired_start_year', plans['era'])
+        # Served by the primary key, already sorted by year
+        self.assertIn('SEARCH', plans['seasons'])
+        self.assertNotIn('TEMP B-TREE', plans['seasons'])
+        for plan in plans.values():
+            self.assertNotIn('SCAN', plan)
+
+
+class TestMigration(DatabaseTestCase):
+
+    def test_old_database(self):
+        db_handling.add_players([make_player("P0001")])
+        # Database as written before the indexes existed
+        with db.connection_context():
+            for index in ('playerinfo_position_group_retired_start_year', 'playerinfo_retired_start_year'):
+                db.execute_sql(f"DROP INDEX {index}")
+            db.pragma('user_version', 0)
+
+        self.assertEqual(db_handling.migrate(), 0)
+        with db.connection_context():
+            indexes = {index.name for index in db.get_indexes('playerinfo')}
+            self.assertEqual(db_handling.schema_version(), SCHEMA_VERSION)
+        self.assertIn('playerinfo_position_group_retired_start_year', indexes)
+        self.assertEqual(db_handling.get_all_pids(retired=1), {"P0001"})
+
+        # Nothing left to do
+        self.assertEqual(db_handling.migrate(), SCHEMA_VERSION)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+import os
+import unittest
+
+from unittest import mock
+
+import numpy as np
+
+from ..analysis.career_matrix import build_career_matrix
+from ..database import db_handling, export
+from ..database.db_model import PlayerInfo, SeasonStats, db
+from .test_database import DatabaseTestCase, make_player
+
+
+class ExportTestCase(DatabaseTestCase):
+    fmt = 'npy'
+
+    def setUp(self):
+        super().setUp()
+        self.root = os.path.join(self.tmp, 'export')
+        players = [make_player("WR000001", av=(1, 8), start_year=1995),
+                   make_player("WR000002", av=(4, 5, 6), start_year=2003),
+                   make_player("QB000001", av=(3, 6, 12), start_year=2001, position_group='QB')]
+        players[0].set_combine_data(None, 4.41, None, 120, None, None, 36.5)
+        db_handling.add_players(players)
+
+    def test_partitions(self):
+        report = export.export_db(self.root, self.fmt)
+
+        self.assertEqual(report['written'], ['QB/2000', 'WR/1990', 'WR/2000'])
+        self.assertTrue(os.path.isdir(os.path.join(self.root, 'position_group=WR', 'decade=1990')))
+        self.assertEqual(export.read_manifest(self.root)['partitions']['WR/2000']['seasons'], 3)
+
+    def test_incremental(self):
+        export.export_db(self.root, self.fmt)
+        db_handling.add_players([make_player("WR000002", av=(4, 5, 7), start_year=2003)])
+        report = export.export_db(self.root, self.fmt)
+
+        self.assertEqual(report['written'], ['WR/2000'])
+        self.assertEqual(report['unchanged'], ['QB/2000', 'WR/1990'])
+        av = export.read_partition(self.root, ('WR', 2000), columns=['approx_value'])['approx_value']
+        np.testing.assert_array_equal(av, [4, 5, 7])
+
+    def test_removed_partition(self):
+        export.export_db(self.root, self.fmt)
+        with db.connection_context():
+            SeasonStats.delete().where(SeasonStats.pid == "QB000001").execute()
+            PlayerInfo.delete_by_id("QB000001")
+        report = export.export_db(self.root, self.fmt)
+
+        self.assertEqual(report['removed'], ['QB/2000'])
+        self.assertFalse(os.path.exists(export.partition_dir(self.root, ('QB', 2000))))
+
+    def test_load_columns(self):
+        export.export_db(self.root, self.fmt)
+        columns = export.load_columns(self.root, 'seasons', positions=['WR'], columns=['pid', 'year'])
+
+        self.assertEqual(sorted(columns['pid'].tolist()), ["WR000001"] * 2 + ["WR000002"] * 3)
+        years = export.load_columns(self.root, 'seasons', decades=[1990], columns=['year'])['year']
+        self.assertEqual(years.tolist(), [1995, 1996])
+
+    def test_group_with_slash(self):
+        db_handling.add_players([make_player("XX000001", av=(2, 3), start_year=2004, position_group='N/A')])
+        export.export_db(self.root, self.fmt)
+
+        self.assertTrue(os.path.isdir(os.path.join(self.root, 'position_group=N_A', 'decade=2000')))
+        columns = export.load_columns(self.root, 'seasons', positions=['N/A'], columns=['pid'])
+        self.assertEqual(columns['pid'].tolist(), ["XX000001"] * 2)
+        matrix = build_career_matrix(positions=['N/A'], start_year=2000, retired=1, export_dir=self.root)
+        self.assertEqual(matrix.pids.tolist(), ["XX000001"])
+
+    def test_round_trip(self):
+        export.export_db(self.root, self.fmt)
+        expected = {pid: db_handling.load_player(pid).to_dict() for pid in db_handling.get_stored_pids()}
+        db_handling.reset()
+
+        self.assertEqual(export.import_db(self.root), 3)
+        self.assertEqual({pid: db_handling.load_player(pid).to_dict() for pid in expected}, expected)
+
+    def test_career_matrix(self):
+        export.export_db(self.root, self.fmt)
+        expected = build_career_matrix(positions=['WR'], start_year=2000)
+        matrix = build_career_matrix(positions=['WR'], start_year=2000, export_dir=self.root)
+
+        np.testing.assert_array_equal(matrix.meta, expected.meta)
+        np.testing.assert_array_equal(matrix.av, expected.av)
+        np.testing.assert_array_equal(matrix.mask, expected.mask)
+
+
+class TestNpyExport(ExportTestCase):
+
+    def test_memory_mapped(self):
+        export.export_db(self.root, 'npy')
+        columns = export.read_partition(self.root, ('WR', 1990), 'players')
+
+        self.assertIsInstance(columns['start_year'], np.memmap)
+        self.assertTrue(np.isnan(columns['bench'][0]))
+        self.assertEqual(columns['position'][0], 'WR')
+
+    def test_format_change(self):
+        export.export_db(self.root, 'npy')
+        report = export.export_db(self.root, 'npy', force=True)
+        self.assertEqual(len(report['written']), 3)
+
+    def test_one_partition_at_a_time(self):
+        fetch = export._fetch_partition
+        fetched = []
+
+        def fetch_partition(key, groups):
+            player_rows, season_rows = fetch(key, groups)
+            fetched.append((key, sorted(row[0] for row in player_rows), len(season_rows)))
+            return player_rows, season_rows
+
+        with mock.patch.object(export, '_fetch_partition', fetch_partition):
+            export.export_db(self.root, 'npy')
+
+        self.assertEqual(fetched, [(('QB', 2000), ["QB000001"], 3), (('WR', 1990), ["WR000001"], 2),
+                                   (('WR', 2000), ["WR000002"], 3)])
+
+    def test_unknown_position_group(self):
+        player = make_player("XX000001", start_year=2004)
+        player.position_group = None
+        db_handling.add_players([player])
+
+        export.export_db(self.root, 'npy')
+        columns = export.read_partition(self.root, ('unknown', 2000), 'players', columns=['pid'])
+        self.assertEqual(columns['pid'].tolist(), ["XX000001"])
+
+    def test_missing_pyarrow(self):
+        if export.pa is None:
+            with self.assertRaises(ImportError):
+                export.export_db(self.root, 'parquet')
+        with self.assertRaises(ValueError):
+            export.export_db(self.root, 'csv')
+
+
+@unittest.skipUnless(export.pa, "pyarrow is not installed")
+class TestParquetExport(ExportTestCase):
+    fmt = 'parquet'
+
+
+@unittest.skipUnless(export.pa, "pyarrow is not installed")
+class TestArrowExport(ExportTestCase):
+    fmt = 'arrow'
+
+
+del ExportTestCase
+
+if __name__ == '__main__':
+    unittest.main()
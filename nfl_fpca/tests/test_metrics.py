@@ -0,0 +1,135 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from unittest import mock
+
+from .. import config
+from ..config import setup_logging
+from ..metrics import MetricsRegistry, PeriodicExporter, export_metrics, get_metrics
+from ..scraping.player_scrapper import scrape_player_page
+
+PLAYER_PAGE = "nfl_fpca/tests/test_pages/player/player_full.html"
+
+
+class TestMetricsRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = MetricsRegistry()
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_snapshot(self):
+        self.metrics.inc('bytes_downloaded', 100, host='a')
+        self.metrics.inc('bytes_downloaded', 50, host='a')
+        self.metrics.set('cache_hit_ratio', 0.5)
+        for value in (0.002, 0.02, 0.2):
+            self.metrics.observe('fetch_seconds', value, host='a')
+
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(snapshot['counters']['bytes_downloaded'], [{'labels': {'host': 'a'}, 'value': 150}])
+        self.assertEqual(snapshot['gauges']['cache_hit_ratio'][0]['value'], 0.5)
+
+        histogram = snapshot['histograms']['fetch_seconds'][0]['value']
+        self.assertEqual(histogram['count'], 3)
+        self.assertAlmostEqual(histogram['sum'], 0.222)
+        self.assertEqual((histogram['min'], histogram['max']), (0.002, 0.2))
+        self.assertEqual(histogram['buckets']['0.025'], 2)
+
+    def test_prometheus(self):
+        self.metrics.inc('http_responses', host='a', status=200)
+        self.metrics.observe('parse_seconds', 0.003, step='career')
+        text = self.metrics.to_prometheus()
+
+        self.assertIn('# TYPE nfl_fpca_http_responses counter', text)
+        self.assertIn('nfl_fpca_http_responses{host="a",status="200"} 1', text)
+        self.assertIn('nfl_fpca_parse_seconds_bucket{step="career",le="0.001"} 0', text)
+        self.assertIn('nfl_fpca_parse_seconds_bucket{step="career",le="0.005"} 1', text)
+        self.assertIn('nfl_fpca_parse_seconds_bucket{step="career",le="+Inf"} 1', text)
+        self.assertIn('nfl_fpca_parse_seconds_count{step="career"} 1', text)
+
+    def test_export(self):
+        self.metrics.inc('stage_items', 3, stage='player_fetch')
+        json_path = os.path.join(self.tmp.name, 'metrics.json')
+        prom_path = os.path.join(self.tmp.name, 'metrics.prom')
+        self.metrics.export(json_path)
+        self.metrics.export(prom_path)
+
+        with open(json_path) as file:
+            self.assertEqual(json.load(file)['counters']['stage_items'][0]['value'], 3)
+        with open(prom_path) as file:
+            self.assertIn('nfl_fpca_stage_items{stage="player_fetch"} 3', file.read())
+
+    def test_periodic_export(self):
+        path = os.path.join(self.tmp.name, 'metrics.json')
+        exporter = PeriodicExporter(self.metrics, path, interval=0.01).start()
+        time.sleep(0.1)
+        self.assertTrue(os.path.exists(path))
+
+        self.metrics.inc('db_players_written', 7)
+        exporter.stop()
+        with open(path) as file:
+            self.assertEqual(json.load(file)['counters']['db_players_written'][0]['value'], 7)
+
+    def test_export_metrics_resets(self):
+        path = os.path.join(self.tmp.name, 'metrics.json')
+        get_metrics().inc('leftover')
+        with export_metrics(path) as metrics:
+            metrics.inc('run')
+
+        with open(path) as file:
+            self.assertEqual(list(json.load(file)['counters']), ['run'])
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def test_parse_timings(self):
+        with open(PLAYER_PAGE) as page:
+            html = page.read()
+        timings = dict()
+        scrape_player_page(html, 'BrowAJ00', timings=timings)
+
+        self.assertEqual(set(timings), {'soup', 'index', 'header', 'career', 'combine'})
+        self.assertTrue(all(seconds >= 0 for seconds in timings.values()))
+
+    def test_logs_are_appended(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'logs', 'test.log')
+            for run in range(2):
+                logger = setup_logging(f"{__name__}.run{run}", path)
+                logger.debug(f"run {run}")
+                for handler in logger.handlers:
+                    handler.close()
+                logger.handlers.clear()
+
+            with open(path) as file:
+                self.assertEqual(len(file.readlines()), 2)
+
+    def test_loggers_share_file_handler(self):
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(config, 'LOG_MAX_BYTES', 2000):
+            path = os.path.join(tmp, 'shared.log')
+            first = setup_logging(f"{__name__}.first", path)
+            second = setup_logging(f"{__name__}.second", path)
+            self.assertEqual(first.handlers, second.handlers)
+
+            # Rotating from one logger does not make the other one write to the renamed file
+            for i in range(60):
+                (first if i % 2 else second).debug(f"record {i:02d}")
+            first.handlers[0].close()
+            for logger in (first, second):
+                logger.handlers.clear()
+
+            lines = []
+            for name in os.listdir(tmp):
+                with open(os.path.join(tmp, name)) as file:
+                    lines.extend(file.readlines())
+            self.assertGreater(len(os.listdir(tmp)), 1)
+            self.assertEqual(len(lines), 60)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+
+from ..scraping.parsers import FALLBACK_PARSER, available_parsers, get_parser, set_parser
+from ..scraping.player_scrapper import scrape_player_page
+from ..scraping.team_scrapper import scrape_player_ids
+
+PLAYER_PAGES = ["nfl_fpca/tests/test_pages/player/player_full.html",
+                "nfl_fpca/tests/test_pages/player/player_no_header.html"]
+TEAM_PAGE = "nfl_fpca/tests/test_pages/team/team.html"
+
+
+def read(path):
+    with open(path) as page:
+        return page.read()
+
+
+@unittest.skipUnless('lxml' in available_parsers(), "lxml is not installed")
+class TestParserParity(unittest.TestCase):
+    """Every backend must produce exactly the same players as the fallback one"""
+
+    def test_player_pages(self):
+        for path in PLAYER_PAGES:
+            page = read(path)
+            reference = scrape_player_page(page, 'TEST', parser=FALLBACK_PARSER).to_dict()
+            for parser in available_parsers():
+                with self.subTest(page=path, parser=parser):
+                    self.assertEqual(scrape_player_page(page, 'TEST', parser=parser).to_dict(), reference)
+
+    def test_team_page(self):
+        page = read(TEAM_PAGE)
+        reference = scrape_player_ids(page, {"BrowAJ00"}, parser=FALLBACK_PARSER)
+        for parser in available_parsers():
+            with self.subTest(parser=parser):
+                self.assertEqual(scrape_player_ids(page, {"BrowAJ00"}, parser=parser), reference)
+
+
+class TestParserSelection(unittest.TestCase):
+
+    def tearDown(self):
+        set_parser(None)
+
+    def test_set_parser(self):
+        set_parser(FALLBACK_PARSER)
+        self.assertEqual(get_parser(), FALLBACK_PARSER)
+
+    def test_unknown_parser(self):
+        with self.assertRaises(ValueError):
+            set_parser('selectolax')
+
+
+if __name__ == '__main__':
+    unittest.main()
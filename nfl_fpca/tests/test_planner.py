@@ -0,0 +1,203 @@
+import datetime
+import unittest
+
+from unittest import mock
+
+import requests
+
+from .. import core
+from ..config import current_season
+from ..database import db_handling
+from ..planner import JobPlanner, expand_roster_jobs
+from ..scraping import team_scrapper
+from ..scraping.player_scrapper import scrape_player_page
+from .test_database import DatabaseTestCase, make_player
+
+TEAM_PAGE = "nfl_fpca/tests/test_pages/team/team.html"
+PLAYER_PAGE = "nfl_fpca/tests/test_pages/player/player_full.html"
+
+
+def read(path):
+    with open(path) as page:
+        return page.read()
+
+
+class TestExpandRosterJobs(unittest.TestCase):
+
+    def test_franchise_years(self):
+        # The Ravens were founded in 1996, the Cardinals were already around
+        jobs = expand_roster_jobs(1994, 1997, teams=['rav', 'crd'])
+        self.assertEqual(jobs, [('crd', 1994), ('crd', 1995), ('crd', 1996), ('rav', 1996), ('crd', 1997),
+                                ('rav', 1997)])
+
+    def test_all_teams(self):
+        self.assertEqual(len(expand_roster_jobs(2010, 2010)), 32)
+
+    def test_future_seasons(self):
+        self.assertEqual(expand_roster_jobs(2100, 2101), [])
+
+
+class TestLeaguePipeline(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.year = datetime.date.today().year - 5
+        self.roster_calls = []
+        self.player_calls = []
+        self.failing = set()
+
+    def fetch_roster_page(self, team, year, **kwargs):
+        self.roster_calls.append((team, year))
+        return read(TEAM_PAGE)
+
+    def fetch_player_page(self, pid, **kwargs):
+        self.player_calls.append(pid)
+        if pid in self.failing:
+            raise requests.exceptions.ConnectionError(pid)
+        return read(PLAYER_PAGE)
+
+    def run_pipeline(self):
+        with mock.patch.object(team_scrapper, 'fetch_roster_page', self.fetch_roster_page), \
+                mock.patch.object(core, 'fetch_player_page', self.fetch_player_page):
+            core.run_league_pipeline(self.year, self.year + 1, teams=['crd', 'atl'], workers=1, cache_dir=None)
+
+    def test_players_are_deduplicated(self):
+        self.run_pipeline()
+
+        # Four rosters with the same three players
+        self.assertEqual(len(self.roster_calls), 4)
+        self.assertEqual(sorted(self.player_calls), ['BarkSa00', 'BaunZa00', 'BrowAJ00'])
+        self.assertEqual(db_handling.get_stored_pids(), {'BarkSa00', 'BaunZa00', 'BrowAJ00'})
+
+    def test_resume(self):
+        self.failing = {'BaunZa00'}
+        self.run_pipeline()
+        self.assertEqual(JobPlanner().pending_players(), ['BaunZa00'])
+        # The dead-letter pass tried it a second time before giving up
+        self.assertEqual(self.player_calls.count('BaunZa00'), 2)
+        self.assertEqual(JobPlanner().failed_players(), ['BaunZa00'])
+
+        # Second run: rosters are done, only the failed player is fetched again
+        self.failing = set()
+        self.roster_calls, self.player_calls = [], []
+        self.run_pipeline()
+
+        self.assertEqual(self.roster_calls, [])
+        self.assertEqual(self.player_calls, ['BaunZa00'])
+        self.assertEqual(JobPlanner().pending_players(), [])
+
+    def test_closed_rosters_are_not_requested_again(self):
+        self.run_pipeline()
+        self.assertEqual(len(self.roster_calls), 4)
+
+        # Even once the jobs are wiped, the roster index has the players of past seasons
+        JobPlanner.reset()
+        self.roster_calls, self.player_calls = [], []
+        self.run_pipeline()
+
+        self.assertEqual(self.roster_calls, [])
+        self.assertEqual(JobPlanner.indexed_roster('crd', self.year), {'BarkSa00', 'BaunZa00', 'BrowAJ00'})
+
+
+class TestRosterIndex(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.planner = JobPlanner()
+        self.page = read(TEAM_PAGE)
+        self.calls = []
+
+    def fetch(self, year):
+        def fetch_roster_page(team, year, **kwargs):
+            self.calls.append('fetch')
+            return self.page
+
+        def scrape_player_ids(page, pid_set, parser=None):
+            self.calls.append('parse')
+            return parse(page, pid_set, parser)
+
+        parse = team_scrapper.scrape_player_ids
+        with mock.patch.object(team_scrapper, 'fetch_roster_page', fetch_roster_page), \
+                mock.patch.object(team_scrapper, 'scrape_player_ids', scrape_player_ids):
+            return team_scrapper.fetch_roster_pids('crd', year, self.planner)
+
+    def test_closed_season(self):
+        self.assertEqual(self.fetch(2010), {'BarkSa00', 'BaunZa00', 'BrowAJ00'})
+        self.assertEqual(self.fetch(2010), {'BarkSa00', 'BaunZa00', 'BrowAJ00'})
+        self.assertEqual(self.calls, ['fetch', 'parse'])
+
+    def test_current_season(self):
+        season = current_season()
+        self.fetch(season)
+        self.fetch(season)
+        # Requested every time, but only parsed when the page changed
+        self.assertEqual(self.calls, ['fetch', 'parse', 'fetch'])
+
+        self.page = self.page.replace('BaunZa00', 'BaunZa01')
+        self.assertIn('BaunZa01', self.fetch(season))
+        self.assertEqual(self.calls[3:], ['fetch', 'parse'])
+
+    def test_season_closes(self):
+        # Indexed while the season was on, the roster is checked once more after it ended
+        with mock.patch('nfl_fpca.planner.current_season', lambda: 2010):
+            self.fetch(2010)
+        self.fetch(2010)
+        self.fetch(2010)
+        self.assertEqual(self.calls, ['fetch', 'parse', 'fetch'])
+
+    def test_empty_roster_not_indexed(self):
+        self.page = '<html><body></body></html>'
+        self.assertEqual(self.fetch(2010), set())
+        self.assertIsNone(JobPlanner.indexed_roster('crd', 2010))
+
+
+class TestUpdatePipeline(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # A.J. Brown as scraped before his 2023 season, and a long retired player
+        player = scrape_player_page(read(PLAYER_PAGE), 'BrowAJ00')
+        del player.stats[2023]
+        player.last_year = 2022
+        db_handling.add_players([player, make_player('OldGuy00', start_year=1990)])
+        self.player_calls = []
+
+    def fetch_player_page(self, pid, refresh=False, **kwargs):
+        self.player_calls.append(pid)
+        self.assertTrue(refresh)
+        return read(PLAYER_PAGE)
+
+    def test_update(self):
+        with mock.patch.object(team_scrapper, 'fetch_roster_page', lambda team, year, **kwargs: read(TEAM_PAGE)), \
+                mock.patch.object(core, 'fetch_player_page', self.fetch_player_page):
+            written = core.run_update_pipeline(season=2023, teams=['crd'], workers=1, cache_dir=None)
+
+        # Players on the current roster are refreshed, the retired one is left alone
+        self.assertEqual(sorted(self.player_calls), ['BarkSa00', 'BaunZa00', 'BrowAJ00'])
+        # One new season for A.J. Brown, four for each of the new players
+        self.assertEqual(written, 9)
+        self.assertEqual(db_handling.load_player('BrowAJ00').get_stats_array('av')[0]['av'], [3, 6, 12, 11])
+
+    def test_update_retry(self):
+        calls = []
+
+        def fetch_player_page(pid, refresh=False, **kwargs):
+            calls.append(pid)
+            self.assertTrue(refresh)
+            if pid == 'BrowAJ00' and calls.count(pid) == 1:
+                raise requests.exceptions.ConnectionError(pid)
+            return read(PLAYER_PAGE)
+
+        with mock.patch.object(team_scrapper, 'fetch_roster_page', lambda team, year, **kwargs: read(TEAM_PAGE)), \
+                mock.patch.object(core, 'fetch_player_page', fetch_player_page):
+            written = core.run_update_pipeline(season=2023, teams=['crd'], workers=1, cache_dir=None)
+
+        # A.J. Brown's new season is written by the retry pass, as an update, and he leaves the dead-letter queue
+        self.assertEqual(calls.count('BrowAJ00'), 2)
+        self.assertEqual(written, 9)
+        self.assertEqual(JobPlanner().failed_players(), [])
+        self.assertIn('BrowAJ00', JobPlanner().done_players())
+
+
+if __name__ == '__main__':
+    unittest.main()
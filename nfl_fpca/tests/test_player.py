@@ -0,0 +1,84 @@
+import pickle
+import random
+import unittest
+
+import numpy as np
+
+from ..models.player import Player, adjust_for_injuries_batch
+from .test_database import make_player
+
+
+def legacy_adjust_for_injuries(gp, threshold=3):
+    """Indices kept by the previous loop over the dict of seasons"""
+    dropped = {i for (i, val) in enumerate(gp[:-1]) if (val <= threshold) and (val <= max(gp[i:-1]))}
+    return [i for i in range(len(gp)) if i not in dropped]
+
+
+def random_player(rng, pid):
+    player = Player(pid)
+    gp = [rng.randint(0, 17) for _ in range(rng.randint(0, 10))]
+    player.stats = {2000 + i: {'pos': 'WR', 'gp': val, 'gs': 0, 'av': i} for i, val in enumerate(gp)}
+    return player, gp
+
+
+class TestSeasonStats(unittest.TestCase):
+
+    def setUp(self):
+        self.player = make_player("P0001", av=(3, 6, 12), start_year=2010)
+
+    def test_dict_view(self):
+        stats = self.player.stats
+        self.assertEqual(list(stats), [2010, 2011, 2012])
+        self.assertEqual(stats[2011], {'pos': 'WR', 'gp': 16, 'gs': 10, 'av': 6})
+        self.assertNotIn(2013, stats)
+
+        # Edits go to the underlying array, which stays sorted by year
+        del stats[2011]
+        stats[2009] = {'pos': 'TE', 'gp': 4, 'gs': 0, 'av': 1}
+        self.assertEqual(self.player.seasons['year'].tolist(), [2009, 2010, 2012])
+        self.assertEqual(self.player.seasons['pos'].tolist(), ['TE', 'WR', 'WR'])
+        with self.assertRaises(KeyError):
+            del stats[2011]
+
+    def test_get_stats_array(self):
+        stats, time = self.player.get_stats_array('av', 'pos')
+        self.assertEqual(stats, {'av': [3, 6, 12], 'pos': ['WR', 'WR', 'WR']})
+        self.assertEqual(time, [2010, 2011, 2012])
+
+        stats, time = self.player.get_stats_array('gp', as_arrays=True)
+        np.testing.assert_array_equal(stats['gp'], [16, 16, 16])
+        self.assertIsInstance(time, np.ndarray)
+
+        with self.assertRaises(ValueError):
+            self.player.get_stats_array('yards')
+
+    def test_slots(self):
+        with self.assertRaises(AttributeError):
+            self.player.nickname = "Test"
+        copy = pickle.loads(pickle.dumps(self.player))
+        self.assertEqual(copy.to_dict(), self.player.to_dict())
+
+
+class TestAdjustForInjuries(unittest.TestCase):
+
+    def test_matches_previous_implementation(self):
+        rng = random.Random(0)
+        for i in range(200):
+            player, gp = random_player(rng, f"P{i:04d}")
+            player.adjust_for_injuries()
+            self.assertEqual(list(player.stats), [2000 + j for j in legacy_adjust_for_injuries(gp)])
+
+    def test_batch(self):
+        rng = random.Random(1)
+        players, expected = [], []
+        for i in range(200):
+            player, gp = random_player(rng, f"P{i:04d}")
+            players.append(player)
+            expected.append([2000 + j for j in legacy_adjust_for_injuries(gp, threshold=5)])
+
+        adjust_for_injuries_batch(players, threshold=5)
+        self.assertEqual([list(player.stats) for player in players], expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import time
+import unittest
+
+from ..scraping.scheduler import HostRateLimiter, StageCounters, TokenBucket
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_burst(self):
+        bucket = TokenBucket(rate=1, capacity=3)
+        for _ in range(3):
+            self.assertEqual(bucket.try_acquire(), 0.0)
+        self.assertGreater(bucket.try_acquire(), 0.0)
+
+    def test_rate(self):
+        bucket = TokenBucket(rate=50, capacity=1)
+        start = time.monotonic()
+        for _ in range(6):
+            bucket.acquire()
+        # First token is free, the next five are spaced by 1/50 s
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+    def test_hosts_are_independent(self):
+        limiter = HostRateLimiter(rate=0.01)
+        limiter.acquire("https://a.example.com/page")
+        self.assertEqual(limiter.bucket("b.example.com").try_acquire(), 0.0)
+        self.assertGreater(limiter.bucket("a.example.com").try_acquire(), 0.0)
+
+
+class TestStageCounters(unittest.TestCase):
+
+    def test_summary(self):
+        counters = StageCounters()
+        counters.add('parse', count=4, elapsed=2.0)
+        with counters.time('fetch'):
+            pass
+
+        summary = counters.summary()
+        self.assertEqual(summary['parse']['count'], 4)
+        self.assertEqual(summary['parse']['per_second'], 2.0)
+        self.assertEqual(summary['fetch']['count'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
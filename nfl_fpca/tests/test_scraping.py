@@ -1,7 +1,14 @@
+import json
+import os
+import tempfile
 import unittest
 
+from bs4 import BeautifulSoup
+
 from ..scraping.team_scrapper import scrape_player_ids
 from ..scraping.player_scrapper import scrape_player_page
+from ..scraping.positions import PositionRegistry
+from ..scraping.utils import PageIndex, get_career_table
 
 
 class TestTeamScraping(unittest.TestCase):
@@ -57,5 +64,50 @@ class TestPlayerScraping(unittest.TestCase):
         self.assertEqual(self.player_full.vertical, 30.5)
 
 
+class TestPageIndex(unittest.TestCase):
+
+    def setUp(self):
+        with open("nfl_fpca/tests/test_pages/player/player_full.html") as full_page:
+            self.soup = BeautifulSoup(full_page, 'html.parser')
+        self.index = PageIndex(self.soup)
+
+    def test_tables(self):
+        # Visible table and table hidden in a comment
+        self.assertEqual(set(self.index.tables), {'receiving_and_rushing', 'combine'})
+        self.assertEqual(self.index.table('combine').name, 'table')
+        self.assertIs(self.index.table('div_combine'), self.index.table('combine'))
+        self.assertIsNone(self.index.table('passing'))
+
+    def test_career_table(self):
+        self.assertEqual(get_career_table(self.soup, self.index)['id'], 'receiving_and_rushing')
+
+
+class TestPositionRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = PositionRegistry()
+
+    def test_known(self):
+        self.assertEqual(self.registry.group('QB'), 'QB')
+        self.assertEqual(self.registry.group('C-G-T'), 'OL')
+
+    def test_unknown_codes(self):
+        self.assertEqual(self.registry.group('wr'), 'WR')
+        self.assertEqual(self.registry.group('LB-S'), 'LB')
+        self.assertEqual(self.registry.group('G/T'), 'OL')
+        self.assertEqual(self.registry.group('XX'), 'N/A')
+        self.assertEqual(self.registry.group(None), 'N/A')
+
+    def test_reload(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'position.json')
+            with open(path, 'w') as file:
+                json.dump({'QB': 'PASSER'}, file)
+
+            self.registry.group('QB')
+            self.registry.reload(path)
+            self.assertEqual(self.registry.group('QB'), 'PASSER')
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,94 @@
+import threading
+import time
+import unittest
+
+from ..database import db_handling
+from ..database.writer import StreamingWriter
+from .test_database import DatabaseTestCase, make_player
+
+
+class TestStreamingWriter(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.checkpoints = []
+
+    def test_size_batches(self):
+        with StreamingWriter(checkpoint=self.checkpoints.append, batch_size=3) as writer:
+            for i in range(7):
+                writer.put(f"P{i:04d}", make_player(f"P{i:04d}"))
+
+        self.assertEqual([len(pids) for pids in self.checkpoints], [3, 3, 1])
+        self.assertEqual(len(db_handling.get_stored_pids()), 7)
+
+    def test_time_batches(self):
+        with StreamingWriter(checkpoint=self.checkpoints.append, batch_size=100, max_delay=0.05) as writer:
+            writer.put("P0001", make_player("P0001"))
+            writer.put("P0002", make_player("P0002"))
+            time.sleep(0.3)
+            # Committed without waiting for a full batch
+            self.assertEqual(self.checkpoints, [["P0001", "P0002"]])
+            self.assertEqual(db_handling.get_stored_pids(), {"P0001", "P0002"})
+
+    def test_skipped_players(self):
+        with StreamingWriter(checkpoint=self.checkpoints.append) as writer:
+            writer.put("P0001", make_player("P0001"))
+            writer.put("P0002")
+
+        self.assertEqual(self.checkpoints, [["P0001", "P0002"]])
+        self.assertEqual(db_handling.get_stored_pids(), {"P0001"})
+
+    def test_counts(self):
+        db_handling.add_players([make_player("P0001", av=(3, 6))])
+        with StreamingWriter(db_handling.update_players) as writer:
+            writer.put("P0001", make_player("P0001", av=(3, 7, 12)))
+        self.assertEqual(writer.written, 2)
+
+    def test_failure_loses_one_batch(self):
+        calls = []
+
+        def write(players):
+            calls.append(len(players))
+            if len(calls) == 2:
+                raise IOError("disk full")
+            db_handling.add_players(players)
+
+        writer = StreamingWriter(write, checkpoint=self.checkpoints.append, batch_size=2).start()
+        with self.assertRaises(IOError):
+            for i in range(10):
+                writer.put(f"P{i:04d}", make_player(f"P{i:04d}"))
+                time.sleep(0.01)
+        with self.assertRaises(IOError):
+            writer.close()
+
+        self.assertEqual(self.checkpoints, [["P0000", "P0001"]])
+        self.assertEqual(db_handling.get_stored_pids(), {"P0000", "P0001"})
+
+    def test_bounded_queue(self):
+        release = threading.Event()
+        depths = []
+
+        def write(players):
+            depths.append(writer.queue.qsize())
+            release.wait()
+
+        def produce():
+            for i in range(20):
+                writer.put(f"P{i:04d}", object())
+
+        writer = StreamingWriter(write, batch_size=2, max_queue=3).start()
+        producer = threading.Thread(target=produce)
+        producer.start()
+        time.sleep(0.2)
+
+        # The producer waits on the stuck writer instead of filling memory
+        self.assertTrue(producer.is_alive())
+        self.assertLessEqual(writer.queue.qsize(), 3)
+        release.set()
+        producer.join()
+        writer.close()
+        self.assertTrue(all(depth <= 3 for depth in depths))
+
+
+if __name__ == '__main__':
+    unittest.main()